@@ -0,0 +1,95 @@
+"""Compara tamaño y tiempos de serialización de checkpoints.
+
+Construye un checkpoint representativo del grafo (historial de mensajes y
+lista de slots) y mide `JsonPlusSerializer` frente a `CompactSerializer`
+con y sin compresión.
+
+    python scripts/benchmark_serde.py --turns 20 --slots 120
+"""
+
+import argparse
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.graph.graph import get_initial_state
+from src.graph.serde import CompactSerializer
+
+
+def build_checkpoint(turns: int, slot_count: int) -> dict:
+    """Checkpoint sintético con `turns` intercambios y `slot_count` slots."""
+    state = get_initial_state("999888777")
+    state.update(patient_exists=True, patient_id=1, patient_name="Paciente Demo")
+    for turn in range(turns):
+        state["messages"].append(
+            HumanMessage(content=f"Tengo dolor en la muela, consulta {turn}", id=f"h{turn}")
+        )
+        state["messages"].append(
+            AIMessage(
+                content="Entiendo tu molestia. Te recomiendo agendar una revisión "
+                "para evaluar la pieza afectada y descartar una caries profunda.",
+                id=f"a{turn}",
+            )
+        )
+
+    start = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+    for i in range(slot_count):
+        doctor_id = i % 3 + 1
+        scheduled_at = start + timedelta(minutes=30 * (i // 3))
+        state["available_slots"].append(
+            {
+                "slot_id": f"{doctor_id}|{scheduled_at.isoformat()}",
+                "doctor_id": doctor_id,
+                "doctor_name": f"Dr. Demo {doctor_id}",
+                "specialty": "Odontología General",
+                "scheduled_at": scheduled_at,
+                "display": scheduled_at.strftime("%d/%m/%Y %H:%M"),
+            }
+        )
+    return {"v": 4, "id": "bench", "channel_values": state, "channel_versions": {}}
+
+
+def measure(name: str, serde, checkpoint: dict, repeat: int) -> dict:
+    typed = serde.dumps_typed(checkpoint)
+    encode = min(timeit.repeat(lambda: serde.dumps_typed(checkpoint), number=repeat, repeat=3))
+    decode = min(timeit.repeat(lambda: serde.loads_typed(typed), number=repeat, repeat=3))
+    return {
+        "serializer": name,
+        "type": typed[0],
+        "bytes": len(typed[1]),
+        "encode_us": encode / repeat * 1e6,
+        "decode_us": decode / repeat * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--slots", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    checkpoint = build_checkpoint(args.turns, args.slots)
+    results = [
+        measure("default", JsonPlusSerializer(), checkpoint, args.repeat),
+        measure("compact", CompactSerializer(compression_threshold=None), checkpoint, args.repeat),
+        measure("compact+zstd", CompactSerializer(), checkpoint, args.repeat),
+    ]
+
+    baseline = results[0]["bytes"]
+    print(f"{'serializer':<14}{'type':<15}{'bytes':>9}{'ratio':>8}{'encode µs':>12}{'decode µs':>12}")
+    for row in results:
+        print(
+            f"{row['serializer']:<14}{row['type']:<15}{row['bytes']:>9}"
+            f"{row['bytes'] / baseline:>8.2f}{row['encode_us']:>12.1f}{row['decode_us']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Perfil del tiempo de importación de un módulo.
+
+Ejecuta `python -X importtime` en un proceso limpio y agrupa el tiempo
+acumulado por paquete de primer nivel. Sirve para vigilar que abrir la
+página de Streamlit no cargue la pila del LLM.
+
+    python scripts/profile_imports.py src.main --top 15
+    python scripts/profile_imports.py src.main --forbid langgraph langchain_google_genai
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def profile(module: str) -> dict[str, float]:
+    """Milisegundos de importación por paquete de primer nivel importado por `module`."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    totals: dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        # Se suma el tiempo propio de cada módulo: el acumulado contaría
+        # dos veces los submódulos anidados.
+        package = fields[2].strip().split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(fields[0]) / 1000
+    return totals
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", nargs="?", default="src.main")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--forbid",
+        nargs="*",
+        default=[],
+        help="Paquetes que no deben cargarse; el script falla si aparecen",
+    )
+    args = parser.parse_args()
+
+    totals = profile(args.module)
+    print(f"{'paquete':<32}{'ms':>10}")
+    for package, ms in sorted(totals.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{package:<32}{ms:>10.1f}")
+    print(f"{'total':<32}{sum(totals.values()):>10.1f}")
+
+    loaded = [package for package in args.forbid if package in totals]
+    if loaded:
+        print(f"Paquetes prohibidos cargados: {', '.join(loaded)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,15 @@
 from typing import Literal
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
+from src.agents.llm import create_llm, invoke_llm
 from src.agents.prompts import CLASSIFIER_SYSTEM_PROMPT
-from src.settings import get_settings
+from src.tracing import current_span
 
 
 class MessageClassifier:
     def __init__(self):
-        settings = get_settings()
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.gemini_model,
-            google_api_key=settings.google_api_key,
-            temperature=0.0,
-        )
+        self.llm = create_llm(temperature=0.0)
 
     def classify(self, message: str) -> Literal["general", "urgency", "emergency"]:
         """Clasifica un mensaje del paciente en una de las tres categorías."""
@@ -23,11 +18,12 @@ class MessageClassifier:
             HumanMessage(content=message),
         ]
 
-        response = self.llm.invoke(messages)
+        response = invoke_llm(self.llm, messages, "classify")
         classification = response.content.strip().lower()
 
         valid_classifications = ["general", "urgency", "emergency"]
         if classification not in valid_classifications:
-            return "general"
+            classification = "general"
 
+        current_span().set_attribute("classification", classification)
         return classification
@@ -0,0 +1,56 @@
+"""Fábrica de modelos de chat usada por los agentes.
+
+Por defecto crea `ChatGoogleGenerativeAI`; `set_llm_factory` permite
+sustituirlo (por ejemplo por un modelo simulado en pruebas de carga).
+"""
+
+from typing import Any, Callable, Optional
+
+from langchain_core.messages import BaseMessage
+
+from src.settings import get_settings
+from src.tracing import get_tracer
+
+LLMFactory = Callable[[float], Any]
+
+_llm_factory: Optional[LLMFactory] = None
+
+
+def _gemini_factory(temperature: float):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    settings = get_settings()
+    return ChatGoogleGenerativeAI(
+        model=settings.gemini_model,
+        google_api_key=settings.google_api_key,
+        temperature=temperature,
+    )
+
+
+def create_llm(temperature: float):
+    """Crea el modelo de chat con la fábrica configurada."""
+    return (_llm_factory or _gemini_factory)(temperature)
+
+
+def set_llm_factory(factory: Optional[LLMFactory]) -> None:
+    """Reemplaza la fábrica de modelos; `None` restaura Gemini."""
+    global _llm_factory
+    _llm_factory = factory
+
+
+def invoke_llm(llm, messages: list[BaseMessage], name: str):
+    """Invoca el modelo dentro del span `llm.<name>` con tamaño de prompt y tokens."""
+    tracer = get_tracer()
+    if not tracer.enabled:
+        return llm.invoke(messages)
+    with tracer.span(
+        f"llm.{name}",
+        prompt_messages=len(messages),
+        prompt_chars=sum(len(str(message.content)) for message in messages),
+    ) as span:
+        response = llm.invoke(messages)
+        usage = getattr(response, "usage_metadata", None) or {}
+        span.set_attribute("input_tokens", usage.get("input_tokens"))
+        span.set_attribute("output_tokens", usage.get("output_tokens"))
+        span.set_attribute("response_chars", len(str(response.content)))
+        return response
@@ -1,22 +1,16 @@
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
+from src.agents.llm import create_llm, invoke_llm
 from src.agents.prompts import (
     DENTAL_ASSISTANT_SYSTEM_PROMPT,
     EMERGENCY_HANDLER_PROMPT,
     URGENCY_HANDLER_PROMPT,
 )
-from src.settings import get_settings
 
 
 class DentalResponder:
     def __init__(self):
-        settings = get_settings()
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.gemini_model,
-            google_api_key=settings.google_api_key,
-            temperature=0.7,
-        )
+        self.llm = create_llm(temperature=0.7)
 
     def respond_general_query(
         self,
@@ -43,7 +37,7 @@ Información del paciente:
 
         messages.append(HumanMessage(content=user_message))
 
-        response = self.llm.invoke(messages)
+        response = invoke_llm(self.llm, messages, "respond_general_query")
         return response.content
 
     def respond_urgency(
@@ -78,7 +72,7 @@ Un operador humano ha sido notificado para asistir.
             HumanMessage(content=user_message),
         ]
 
-        response = self.llm.invoke(messages)
+        response = invoke_llm(self.llm, messages, "respond_urgency")
         return response.content
 
     def respond_emergency(self, user_message: str, patient_name: str) -> str:
@@ -99,5 +93,5 @@ Por favor, llame a estos números INMEDIATAMENTE si su vida está en peligro.
             HumanMessage(content=user_message),
         ]
 
-        response = self.llm.invoke(messages)
+        response = invoke_llm(self.llm, messages, "respond_emergency")
         return response.content
@@ -0,0 +1,3 @@
+from src.analytics.export import COLUMNS, ConversationExporter, ExportResult, response_times
+
+__all__ = ["COLUMNS", "ConversationExporter", "ExportResult", "response_times"]
@@ -0,0 +1,53 @@
+"""Exportación incremental: `python -m src.analytics exports/ --format parquet`.
+
+Cada ejecución escribe en el directorio un archivo con las conversaciones
+terminadas (sin actividad durante `--idle-seconds`) desde la anterior; la
+marca de agua se guarda en `<dir>/.export_state.json`. Solo lee: no crea el
+esquema ni carga datos en la base.
+"""
+
+import argparse
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exporta conversaciones terminadas y sus citas")
+    parser.add_argument("output", type=Path, help="directorio de salida")
+    parser.add_argument("--format", choices=("jsonl", "csv", "parquet"), default="jsonl")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--state", type=Path, help="por defecto <output>/.export_state.json")
+    parser.add_argument(
+        "--idle-seconds",
+        type=float,
+        default=30 * 60.0,
+        help="inactividad tras la que una conversación se da por terminada",
+    )
+    args = parser.parse_args()
+
+    from src.analytics.export import ConversationExporter
+    from src.graph.checkpointer import SqliteCheckpointer
+    from src.graph.graph import create_dental_graph
+    from src.graph.serde import CompactSerializer
+    from src.settings import get_settings
+
+    settings = get_settings()
+    # Sin compactación: este proceso solo lee los checkpoints.
+    checkpointer = SqliteCheckpointer(
+        settings.checkpoint_db_path,
+        keep_last=settings.checkpoint_keep_last,
+        serde=CompactSerializer(settings.checkpoint_compression_threshold),
+    )
+    exporter = ConversationExporter(
+        create_dental_graph(checkpointer), checkpointer, args.chunk_size, args.idle_seconds
+    )
+    result = exporter.export(args.output, args.format, args.state)
+    checkpointer.close()
+
+    if result.path:
+        print(f"{result.rows} conversaciones en {result.path} ({result.threads_scanned} hilos revisados)")
+    else:
+        print(f"Sin conversaciones terminadas nuevas ({result.threads_scanned} hilos revisados)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Exportación de conversaciones terminadas y sus resultados para análisis.
+
+Recorre los hilos del `SqliteCheckpointer` por páginas de `updated_at`, lee
+el último estado de cada uno y une la cita agendada desde la base. Una
+conversación termina cuando lleva `idle_seconds` sin actividad, haya
+acabado en una respuesta o en un interrupt que el paciente no contestó
+(`pending_interrupt` indica cuál). Así todo hilo anterior a la marca de
+agua está terminado y se exporta; ninguno queda atrás.
+
+Cada fila es un hilo con columnas planas (`COLUMNS`), escritas por trozos a
+JSONL, CSV o Parquet (este último requiere `pyarrow`). No se exporta el
+teléfono ni el nombre del paciente, solo su id.
+
+Las ejecuciones son incrementales: el archivo de estado guarda la marca de
+agua (`updated_at`) hasta la que se exportó, que nunca pasa de
+`ahora - idle_seconds`; el margen cubre también los checkpoints aún sin
+confirmar en otro proceso. Si el paciente retoma un hilo ya exportado, el
+hilo vuelve a exportarse con sus totales completos: `thread_id` es la clave
+y la fila con el `last_activity_at` más reciente reemplaza a la anterior.
+Los hilos se borran tras `checkpoint_ttl_hours` de inactividad, así que
+`idle_seconds` debe ser menor y la exportación debe correr con más
+frecuencia.
+
+Las métricas de respuesta se calculan sobre los mensajes que conserva la
+retención; `turn_count` y los conteos de clasificación cubren todo el hilo.
+"""
+
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from src.database.connection import get_session
+from src.graph.checkpointer import SqliteCheckpointer
+from src.graph.state import SENT_AT_KEY
+from src.services.appointment_service import AppointmentService
+
+CLASSIFICATIONS = ("general", "urgency", "emergency")
+
+COLUMNS: tuple[tuple[str, type], ...] = (
+    ("thread_id", str),
+    ("patient_id", int),
+    ("started_at", str),
+    ("last_activity_at", str),
+    ("duration_s", float),
+    ("turn_count", int),
+    ("last_classification", str),
+    ("pending_interrupt", str),
+    *((f"classified_{name}", int) for name in CLASSIFICATIONS),
+    ("assigned_doctor_id", int),
+    ("assigned_doctor_name", str),
+    ("appointment_id", int),
+    ("slot_scheduled_at", str),
+    ("appointment_doctor_id", int),
+    ("appointment_status", str),
+    ("emergency_contacts_provided", bool),
+    ("responses_measured", int),
+    ("response_mean_ms", float),
+    ("response_max_ms", float),
+)
+
+FORMATS = ("jsonl", "csv", "parquet")
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_IDLE_SECONDS = 30 * 60.0
+
+
+@dataclass(frozen=True)
+class ExportResult:
+    path: Optional[Path]
+    rows: int
+    threads_scanned: int
+    watermark: float
+
+
+def response_times(messages: Iterable[BaseMessage]) -> list[float]:
+    """Segundos entre cada mensaje del paciente y la primera respuesta."""
+    times = []
+    asked_at = None
+    for message in messages:
+        sent_at = message.additional_kwargs.get(SENT_AT_KEY)
+        if isinstance(message, HumanMessage):
+            asked_at = sent_at
+        elif isinstance(message, AIMessage) and asked_at is not None and sent_at is not None:
+            times.append(sent_at - asked_at)
+            asked_at = None
+    return times
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class ConversationExporter:
+    """Exporta conversaciones terminadas por trozos de tamaño acotado."""
+
+    def __init__(
+        self,
+        graph,
+        checkpointer: SqliteCheckpointer,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        idle_seconds: float = DEFAULT_IDLE_SECONDS,
+    ) -> None:
+        self.graph = graph
+        self.checkpointer = checkpointer
+        self.chunk_size = chunk_size
+        self.idle_seconds = idle_seconds
+        self.threads_scanned = 0
+
+    def iter_chunks(self, since: float, until: float) -> Iterator[list[dict[str, Any]]]:
+        """Filas de los hilos con su última actividad en (since, until].
+
+        `until` debe quedar al menos `idle_seconds` en el pasado: todos esos
+        hilos están terminados.
+        """
+        for page in self.checkpointer.list_threads(since, until, self.chunk_size):
+            self.threads_scanned += len(page)
+            states = []
+            for thread_id, updated_at in page:
+                snapshot = self.graph.get_state({"configurable": {"thread_id": thread_id}})
+                if not snapshot.values:
+                    continue
+                pending = next(
+                    (
+                        pending.value.get("type")
+                        for pending in snapshot.interrupts
+                        if isinstance(pending.value, dict)
+                    ),
+                    None,
+                )
+                states.append((thread_id, updated_at, snapshot.values, pending))
+            if not states:
+                continue
+
+            appointment_ids = [
+                values["appointment_confirmed"]["id"]
+                for _, _, values, _ in states
+                if (values.get("appointment_confirmed") or {}).get("id")
+            ]
+            with get_session() as session:
+                appointments = {
+                    appointment_id: (
+                        appointment.doctor_id,
+                        appointment.status,
+                        appointment.scheduled_at,
+                    )
+                    for appointment_id, appointment in AppointmentService.get_appointments(
+                        session, appointment_ids
+                    ).items()
+                }
+            yield [self._row(*state, appointments) for state in states]
+
+    def export(
+        self,
+        output_dir: Path,
+        fmt: str = "jsonl",
+        state_path: Optional[Path] = None,
+    ) -> ExportResult:
+        """Escribe un archivo con las conversaciones terminadas desde la
+        última exportación.
+
+        La marca de agua se guarda solo cuando el archivo quedó completo; si
+        la ejecución falla, la siguiente vuelve a cubrir el mismo rango. Sin
+        filas nuevas no se crea archivo.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt} (use {', '.join(FORMATS)})")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        state_path = state_path or output_dir / ".export_state.json"
+        since = 0.0
+        if state_path.exists():
+            since = json.loads(state_path.read_text(encoding="utf-8"))["watermark"]
+        until = time.time() - self.idle_seconds
+        self.threads_scanned = 0
+
+        path = output_dir / f"conversations-{datetime.now():%Y%m%dT%H%M%S_%f}.{fmt}"
+        partial = path.with_name(path.name + ".tmp")
+        rows = _WRITERS[fmt](partial, self.iter_chunks(since, until))
+        if rows:
+            os.replace(partial, path)
+        else:
+            partial.unlink(missing_ok=True)
+
+        state_path.write_text(json.dumps({"watermark": max(since, until)}), encoding="utf-8")
+        return ExportResult(
+            path=path if rows else None,
+            rows=rows,
+            threads_scanned=self.threads_scanned,
+            watermark=max(since, until),
+        )
+
+    @staticmethod
+    def _row(
+        thread_id: str,
+        updated_at: float,
+        values: dict[str, Any],
+        pending_interrupt: Optional[str],
+        appointments: dict[int, tuple],
+    ) -> dict[str, Any]:
+        counts = values.get("classification_counts") or {}
+        doctor = values.get("assigned_doctor") or {}
+        confirmed = values.get("appointment_confirmed") or {}
+        doctor_id, status, scheduled_at = appointments.get(confirmed.get("id"), (None,) * 3)
+        started_at = values.get("started_at")
+        times = response_times(values.get("messages", []))
+        return {
+            "thread_id": thread_id,
+            "patient_id": values.get("patient_id"),
+            "started_at": _iso(started_at),
+            "last_activity_at": _iso(updated_at),
+            "duration_s": round(updated_at - started_at, 3) if started_at else None,
+            "turn_count": values.get("turn_count", 0),
+            "last_classification": values.get("classification"),
+            "pending_interrupt": pending_interrupt,
+            **{f"classified_{name}": counts.get(name, 0) for name in CLASSIFICATIONS},
+            "assigned_doctor_id": doctor.get("doctor_id"),
+            "assigned_doctor_name": doctor.get("doctor_name"),
+            "appointment_id": confirmed.get("id"),
+            "slot_scheduled_at": (
+                scheduled_at.isoformat() if scheduled_at else confirmed.get("scheduled_at")
+            ),
+            "appointment_doctor_id": doctor_id,
+            "appointment_status": status,
+            "emergency_contacts_provided": bool(values.get("emergency_contacts_provided")),
+            "responses_measured": len(times),
+            "response_mean_ms": round(sum(times) / len(times) * 1000, 1) if times else None,
+            "response_max_ms": round(max(times) * 1000, 1) if times else None,
+        }
+
+
+def _write_jsonl(path: Path, chunks: Iterator[list[dict]]) -> int:
+    rows = 0
+    with path.open("w", encoding="utf-8") as output:
+        for chunk in chunks:
+            output.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _write_csv(path: Path, chunks: Iterator[list[dict]]) -> int:
+    rows = 0
+    with path.open("w", encoding="utf-8", newline="") as output:
+        writer = csv.DictWriter(output, fieldnames=[name for name, _ in COLUMNS])
+        writer.writeheader()
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _write_parquet(path: Path, chunks: Iterator[list[dict]]) -> int:
+    """Un row group por trozo, con el esquema fijo de `COLUMNS`."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - dependencia opcional
+        raise RuntimeError("El formato parquet requiere el paquete `pyarrow`") from exc
+
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+    schema = pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+_WRITERS = {"jsonl": _write_jsonl, "csv": _write_csv, "parquet": _write_parquet}
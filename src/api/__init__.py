@@ -0,0 +1,3 @@
+from src.api.app import create_app
+
+__all__ = ["create_app"]
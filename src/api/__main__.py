@@ -0,0 +1,25 @@
+"""Arranca la API HTTP: `python -m src.api --host 0.0.0.0 --port 8000`.
+
+Un solo proceso: el estado compartido entre peticiones (buffer de
+checkpoints, idempotencia, lista de espera, despachador) vive en memoria.
+Para más capacidad se sube `API_MAX_CONCURRENCY`, no la cantidad de workers.
+"""
+
+import argparse
+
+import uvicorn
+
+from src.api.app import create_app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="API HTTP del asistente dental")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""API HTTP asíncrona sobre el grafo de conversación.
+
+Expone el mismo grafo compilado que usa Streamlit, con los hilos
+identificados por `thread_id`:
+
+- `POST /threads/{thread_id}/turns`: procesa un mensaje del paciente.
+- `POST /threads/{thread_id}/turns/stream`: igual, emitiendo NDJSON por nodo.
+  Con la cabecera `Idempotency-Key`, un reenvío del mismo mensaje retorna el
+  resultado del primero (en streaming, un único evento `replay`).
+- `POST /threads/{thread_id}/resume`: reanuda un interrupt pendiente
+  (`{"slot_id": ...}` o `{"retry": true}`). Con `Idempotency-Key`, un
+  reintento retorna el resultado de la primera reanudación sin reanudar el
+  siguiente interrupt.
+- `POST /threads/{thread_id}/end`: termina el chat y libera a su doctor.
+- `GET /threads/{thread_id}`: estado resumido del hilo.
+- `GET /threads/{thread_id}/slots?date=YYYY-MM-DD`: página de horarios de un
+  día para el interrupt `slot_selection` (`doctor_id`, `offset`, `limit`).
+
+La API corre en un solo proceso: el buffer del checkpointer, las claves de
+idempotencia, la lista de espera y el despachador viven en memoria del
+proceso y no se comparten entre workers.
+"""
+
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Any, Optional
+
+from langchain_core.messages import BaseMessage
+from langgraph.types import Command, Interrupt
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from src.database.connection import ensure_database, get_session
+from src.graph.dispatch import get_dispatcher
+from src.graph.graph import get_dental_graph, get_initial_state, get_turn_input
+from src.graph.idempotency import (
+    find_submission,
+    get_submission_guard,
+    submission_input,
+)
+from src.graph.nodes import slot_doctor_ids
+from src.services.appointment_service import AppointmentService
+from src.settings import get_settings
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convierte mensajes, interrupts y fechas del estado a tipos JSON."""
+    if isinstance(value, BaseMessage):
+        return {"id": value.id, "type": value.type, "content": value.content}
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, Interrupt):
+        return {"id": value.id, "value": to_jsonable(value.value)}
+    return value
+
+
+_DONE = object()
+
+RESUME_RESULTS_KEPT = 1024
+
+
+class GraphRunner:
+    """Ejecuta el grafo con concurrencia acotada y timeout por petición.
+
+    Cada ejecución corre en un hilo propio del runner y ocupa su permiso
+    hasta que ese hilo termina: un timeout libera la petición pero no el
+    permiso mientras el nodo síncrono (p. ej. una llamada lenta al LLM)
+    siga corriendo, así la cota se cumple también bajo LLMs lentos.
+    """
+
+    def __init__(self, graph, max_concurrency: int, timeout: float) -> None:
+        self.graph = graph
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="graph-run"
+        )
+        self._resumes: OrderedDict[tuple[str, str], dict] = OrderedDict()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def config(thread_id: str) -> dict:
+        return {"configurable": {"thread_id": thread_id}}
+
+    async def turn_input(
+        self,
+        thread_id: str,
+        message: str,
+        patient_phone: Optional[str],
+        submission_key: Optional[str] = None,
+    ):
+        """Estado inicial en el primer turno; solo el mensaje en los siguientes."""
+        snapshot = await self.graph.aget_state(self.config(thread_id))
+        if snapshot.values:
+            return get_turn_input(message, submission_key)
+        if not patient_phone:
+            raise HTTPException(422, "patient_phone es obligatorio en el primer turno")
+        state = get_initial_state(patient_phone)
+        return {**state, **get_turn_input(message, submission_key)}
+
+    @asynccontextmanager
+    async def submission(self, thread_id: str, key: Optional[str]):
+        """Sin clave no hace nada; con clave espera a otro envío igual en curso."""
+        if key is None:
+            yield
+            return
+        guard = get_submission_guard()
+        while (running := guard.claim(thread_id, key)) is not None:
+            await asyncio.wrap_future(running)
+        try:
+            yield
+        finally:
+            guard.release(thread_id, key)
+
+    async def stored_result(self, thread_id: str, key: Optional[str]) -> Optional[dict]:
+        """Resultado del envío con esta clave si ya se procesó."""
+        if key is None:
+            return None
+        snapshot = await self.graph.aget_state(self.config(thread_id))
+        stored = find_submission(
+            snapshot.values.get("messages", []), key, paused=bool(snapshot.interrupts)
+        )
+        if stored is None:
+            return None
+        return {
+            "thread_id": thread_id,
+            "messages": to_jsonable(stored.replies),
+            "interrupts": to_jsonable(snapshot.interrupts) if stored.is_latest else [],
+        }
+
+    async def submission_input(self, thread_id: str, key: Optional[str], graph_input):
+        """`graph_input`, o None para reanudar un envío que se cortó a medias."""
+        if key is None:
+            return graph_input
+        snapshot = await self.graph.aget_state(self.config(thread_id))
+        return submission_input(snapshot, key, graph_input)
+
+    def stored_resume(self, thread_id: str, key: Optional[str]) -> Optional[dict]:
+        """Resultado de la reanudación con esta clave si ya se hizo."""
+        if key is None:
+            return None
+        return self._resumes.get((thread_id, key))
+
+    def remember_resume(self, thread_id: str, key: Optional[str], result: dict) -> None:
+        if key is None:
+            return
+        self._resumes[(thread_id, key)] = result
+        while len(self._resumes) > RESUME_RESULTS_KEPT:
+            self._resumes.popitem(last=False)
+
+    async def resume_input(self, thread_id: str, payload: dict) -> Command:
+        snapshot = await self.graph.aget_state(self.config(thread_id))
+        if not snapshot.interrupts:
+            raise HTTPException(409, "El hilo no tiene un interrupt pendiente")
+        return Command(resume=payload)
+
+    async def stream(self, graph_input, thread_id: str) -> AsyncIterator[dict]:
+        """Emite un evento por nodo ejecutado y uno final con el interrupt."""
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except TimeoutError:
+            raise HTTPException(503, "Servidor ocupado, intenta nuevamente")
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        try:
+            worker = self._executor.submit(
+                self._stream_sync, graph_input, thread_id, loop, chunks, stop
+            )
+        except BaseException:
+            self._semaphore.release()
+            raise
+        worker.add_done_callback(lambda _: self._release_from_thread(loop))
+        try:
+            async with asyncio.timeout(self.timeout):
+                while (chunk := await chunks.get()) is not _DONE:
+                    if isinstance(chunk, BaseException):
+                        raise chunk
+                    for node, update in chunk.items():
+                        if node == "__interrupt__":
+                            yield {"event": "interrupt", "interrupts": to_jsonable(update)}
+                        else:
+                            yield {
+                                "event": "node",
+                                "node": node,
+                                "messages": to_jsonable((update or {}).get("messages", [])),
+                            }
+        finally:
+            # El hilo corta la ejecución al terminar el nodo en curso.
+            stop.set()
+
+    def _stream_sync(self, graph_input, thread_id: str, loop, chunks, stop) -> None:
+        def emit(item) -> None:
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        try:
+            for chunk in self.graph.stream(
+                graph_input, self.config(thread_id), stream_mode="updates"
+            ):
+                if stop.is_set():
+                    return
+                emit(chunk)
+        except BaseException as exc:
+            emit(exc)
+        else:
+            emit(_DONE)
+
+    def _release_from_thread(self, loop) -> None:
+        try:
+            loop.call_soon_threadsafe(self._semaphore.release)
+        except RuntimeError:
+            pass  # El event loop ya cerró: no queda nadie esperando el permiso.
+
+    async def run(self, graph_input, thread_id: str) -> dict:
+        """Ejecuta el turno completo y agrega los eventos en una respuesta."""
+        messages, interrupts = [], []
+        try:
+            async for event in self.stream(graph_input, thread_id):
+                if event["event"] == "interrupt":
+                    interrupts.extend(event["interrupts"])
+                else:
+                    messages.extend(m for m in event["messages"] if m["type"] == "ai")
+        except TimeoutError:
+            raise HTTPException(504, "La conversación excedió el tiempo máximo")
+        return {"thread_id": thread_id, "messages": messages, "interrupts": interrupts}
+
+
+async def _read_json(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(400, "El cuerpo debe ser JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(400, "El cuerpo debe ser un objeto JSON")
+    return body
+
+
+async def _turn_request(
+    request: Request,
+) -> tuple[GraphRunner, str, dict, Optional[str]]:
+    runner: GraphRunner = request.app.state.runner
+    thread_id = request.path_params["thread_id"]
+    body = await _read_json(request)
+    message = body.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise HTTPException(422, "message es obligatorio")
+    key = request.headers.get("idempotency-key") or None
+    graph_input = await runner.turn_input(
+        thread_id, message, body.get("patient_phone"), key
+    )
+    return runner, thread_id, graph_input, key
+
+
+async def start_turn(request: Request) -> Response:
+    runner, thread_id, graph_input, key = await _turn_request(request)
+    async with runner.submission(thread_id, key):
+        stored = await runner.stored_result(thread_id, key)
+        if stored is not None:
+            return JSONResponse(stored)
+        graph_input = await runner.submission_input(thread_id, key, graph_input)
+        return JSONResponse(await runner.run(graph_input, thread_id))
+
+
+async def stream_turn(request: Request) -> Response:
+    runner, thread_id, graph_input, key = await _turn_request(request)
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            async with runner.submission(thread_id, key):
+                stored = await runner.stored_result(thread_id, key)
+                if stored is not None:
+                    yield json.dumps({"event": "replay", **stored}, ensure_ascii=False) + "\n"
+                    return
+                run_input = await runner.submission_input(thread_id, key, graph_input)
+                async for event in runner.stream(run_input, thread_id):
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+        except TimeoutError:
+            yield json.dumps({"event": "error", "detail": "timeout"}) + "\n"
+        except HTTPException as exc:
+            yield json.dumps({"event": "error", "detail": exc.detail}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+async def resume(request: Request) -> Response:
+    runner: GraphRunner = request.app.state.runner
+    thread_id = request.path_params["thread_id"]
+    payload = await _read_json(request)
+    key = request.headers.get("idempotency-key") or None
+    async with runner.submission(thread_id, key and f"resume:{key}"):
+        stored = runner.stored_resume(thread_id, key)
+        if stored is not None:
+            return JSONResponse(stored)
+        command = await runner.resume_input(thread_id, payload)
+        result = await runner.run(command, thread_id)
+        runner.remember_resume(thread_id, key, result)
+        return JSONResponse(result)
+
+
+async def get_thread(request: Request) -> Response:
+    runner: GraphRunner = request.app.state.runner
+    thread_id = request.path_params["thread_id"]
+    snapshot = await runner.graph.aget_state(runner.config(thread_id))
+    if not snapshot.values:
+        raise HTTPException(404, "Hilo no encontrado")
+    values = snapshot.values
+    return JSONResponse(
+        {
+            "thread_id": thread_id,
+            "patient_id": values.get("patient_id"),
+            "patient_name": values.get("patient_name"),
+            "classification": values.get("classification"),
+            "appointment_confirmed": to_jsonable(values.get("appointment_confirmed")),
+            "messages": to_jsonable(values.get("messages", [])),
+            "interrupts": to_jsonable(snapshot.interrupts),
+        }
+    )
+
+
+async def end_chat(request: Request) -> Response:
+    thread_id = request.path_params["thread_id"]
+    released = await asyncio.to_thread(get_dispatcher().end_chat, thread_id)
+    return JSONResponse({"thread_id": thread_id, "released_doctors": released})
+
+
+def _query_int(request: Request, name: str, default: Optional[int] = None) -> Optional[int]:
+    raw = request.query_params.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise HTTPException(400, f"{name} debe ser un entero")
+    if value < 0:
+        raise HTTPException(400, f"{name} no puede ser negativo")
+    return value
+
+
+async def list_slots(request: Request) -> Response:
+    runner: GraphRunner = request.app.state.runner
+    thread_id = request.path_params["thread_id"]
+    try:
+        day = date.fromisoformat(request.query_params.get("date", ""))
+    except ValueError:
+        raise HTTPException(400, "date debe tener formato YYYY-MM-DD")
+    snapshot = await runner.graph.aget_state(runner.config(thread_id))
+    if not snapshot.values:
+        raise HTTPException(404, "Hilo no encontrado")
+
+    doctor_ids = slot_doctor_ids(snapshot.values)
+    doctor_id = _query_int(request, "doctor_id")
+    if doctor_id is not None:
+        if doctor_ids is not None and doctor_id not in doctor_ids:
+            raise HTTPException(422, "El doctor no está entre los ofrecidos al paciente")
+        doctor_ids = [doctor_id]
+    offset = _query_int(request, "offset", 0)
+    limit = min(_query_int(request, "limit", AppointmentService.SLOT_PAGE_SIZE), 100)
+
+    def load_page() -> dict:
+        with get_session() as session:
+            return AppointmentService.get_slot_page(
+                session, day, doctor_ids, offset=offset, limit=limit, chat_id=thread_id
+            )
+
+    return JSONResponse(to_jsonable(await asyncio.to_thread(load_page)))
+
+
+async def health(request: Request) -> Response:
+    return JSONResponse({"status": "ok"})
+
+
+async def _http_error(request: Request, exc: HTTPException) -> Response:
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+
+
+def create_app(
+    graph=None,
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Starlette:
+    """Crea la aplicación; por defecto usa el grafo compartido del proceso."""
+    settings = get_settings()
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        await asyncio.to_thread(ensure_database)
+        app.state.runner = GraphRunner(
+            graph or get_dental_graph(),
+            max_concurrency=max_concurrency or settings.api_max_concurrency,
+            timeout=timeout or settings.api_request_timeout_s,
+        )
+        yield
+        app.state.runner.close()
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/threads/{thread_id}", get_thread),
+            Route("/threads/{thread_id}/slots", list_slots),
+            Route("/threads/{thread_id}/turns", start_turn, methods=["POST"]),
+            Route("/threads/{thread_id}/turns/stream", stream_turn, methods=["POST"]),
+            Route("/threads/{thread_id}/resume", resume, methods=["POST"]),
+            Route("/threads/{thread_id}/end", end_chat, methods=["POST"]),
+        ],
+        exception_handlers={HTTPException: _http_error},
+        lifespan=lifespan,
+    )
@@ -1,4 +1,18 @@
-from src.database.connection import get_session, init_db, seed_demo_data
-from src.database.models import Doctor, MedicalHistory, Patient
+from src.database.connection import (
+    ensure_database,
+    get_session,
+    init_db,
+    seed_demo_data,
+)
+from src.database.models import Doctor, MedicalHistory, Patient, PatientContext
 
-__all__ = ["Patient", "MedicalHistory", "Doctor", "get_session", "init_db", "seed_demo_data"]
+__all__ = [
+    "Patient",
+    "PatientContext",
+    "MedicalHistory",
+    "Doctor",
+    "ensure_database",
+    "get_session",
+    "init_db",
+    "seed_demo_data",
+]
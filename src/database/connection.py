@@ -1,9 +1,12 @@
+import threading
 from contextlib import contextmanager
-from typing import Generator
+from typing import TYPE_CHECKING, Generator, Optional
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm import sessionmaker
 
+from src.database.fts import install_fts
+from src.database.instrumentation import get_query_monitor
 from src.database.models import (
     Base,
     Appointment,
@@ -14,8 +17,33 @@ from src.database.models import (
 )
 from src.settings import get_settings
 
+if TYPE_CHECKING:
+    from src.repositories import DataSession, InMemoryStore
+
+MEMORY_DATABASE_URL = "memory://"
+
+# Versión de los datos guardada en `PRAGMA user_version`; cada migración
+# única sube un número. 1: teléfonos de pacientes en su forma canónica.
+DATA_VERSION = 1
+
 _engine = None
 _SessionLocal = None
+_memory_store: Optional["InMemoryStore"] = None
+_bootstrapped_factory = None
+_bootstrap_lock = threading.Lock()
+
+
+def is_memory_backend() -> bool:
+    return get_settings().database_url == MEMORY_DATABASE_URL
+
+
+def get_memory_store() -> "InMemoryStore":
+    from src.repositories import InMemoryStore
+
+    global _memory_store
+    if _memory_store is None:
+        _memory_store = InMemoryStore()
+    return _memory_store
 
 
 def get_engine():
@@ -27,22 +55,33 @@ def get_engine():
             connect_args={"check_same_thread": False},
             echo=False,
         )
+        monitor = get_query_monitor()
+        monitor.configure(
+            settings.slow_query_threshold_ms, settings.slow_query_log_size
+        )
+        monitor.install(_engine)
     return _engine
 
 
 def get_session_factory():
     global _SessionLocal
     if _SessionLocal is None:
-        _SessionLocal = sessionmaker(
-            autocommit=False,
-            autoflush=False,
-            bind=get_engine(),
-        )
+        if is_memory_backend():
+            from src.repositories import InMemorySession
+
+            store = get_memory_store()
+            _SessionLocal = lambda: InMemorySession(store)
+        else:
+            _SessionLocal = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=get_engine(),
+            )
     return _SessionLocal
 
 
 @contextmanager
-def get_session() -> Generator[Session, None, None]:
+def get_session() -> Generator["DataSession", None, None]:
     SessionLocal = get_session_factory()
     session = SessionLocal()
     try:
@@ -56,21 +95,64 @@ def get_session() -> Generator[Session, None, None]:
 
 
 def init_db() -> None:
+    if is_memory_backend():
+        return
     engine = get_engine()
     Base.metadata.create_all(bind=engine)
-
-
-def _seed_doctor_schedules(session, doctors) -> None:
+    install_fts(engine)
+    _migrate_data(engine)
+
+
+def _migrate_data(engine) -> None:
+    """Aplica una sola vez las migraciones de datos pendientes según la
+    versión guardada en la base; una base ya migrada no se recorre."""
+    from src.services.patient_service import PatientService
+
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    if version >= DATA_VERSION:
+        return
+    if version < 1:
+        # Teléfonos guardados antes de normalizarlos al escribir
+        with get_session() as session:
+            PatientService.normalize_patient_phones(session)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {DATA_VERSION}")
+
+
+def ensure_database() -> None:
+    """Crea el esquema y carga los datos demo una sola vez por proceso.
+
+    Las sesiones de Streamlit y los workers de la API llaman a esta función
+    al arrancar; solo la primera hace el trabajo. Si la configuración cambia
+    a otra base (otra fábrica de sesiones) se vuelve a ejecutar.
+    """
+    global _bootstrapped_factory
+    factory = get_session_factory()
+    if _bootstrapped_factory is factory:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped_factory is not factory:
+            init_db()
+            seed_demo_data()
+            _bootstrapped_factory = factory
+
+
+def _seed_doctor_schedules(session: "DataSession", doctors) -> None:
     """Agrega horarios L-V 9-17 para doctores que no tengan."""
     from datetime import time
 
+    from src.repositories import get_repositories
+
+    if not doctors:
+        return
+    repos = get_repositories(session)
+    scheduled = {
+        schedule.doctor_id
+        for schedule in repos.doctors.list_schedules([doc.id for doc in doctors])
+    }
     for doc in doctors:
-        existing = (
-            session.query(DoctorSchedule)
-            .filter(DoctorSchedule.doctor_id == doc.id)
-            .first()
-        )
-        if not existing:
+        if doc.id not in scheduled:
             for day in range(5):
                 schedule = DoctorSchedule(
                     doctor_id=doc.id,
@@ -78,78 +160,88 @@ def _seed_doctor_schedules(session, doctors) -> None:
                     start_time=time(9, 0),
                     end_time=time(17, 0),
                 )
-                session.add(schedule)
+                repos.doctors.add_schedule(schedule)
 
 
 def seed_demo_data() -> None:
+    from src.repositories import get_repositories
+    from src.services.patient_service import PatientService
+
     # Siempre asegurar que doctores existentes tengan horarios
     with get_session() as session:
-        doctors = session.query(Doctor).all()
+        doctors = get_repositories(session).doctors.list_doctors()
         _seed_doctor_schedules(session, doctors)
 
     with get_session() as session:
-        existing_patient = session.query(Patient).filter_by(phone="999888777").first()
-        if existing_patient:
-            return
-
-        patient1 = Patient(
-            name="María García",
-            phone="999888777",
-            email="maria.garcia@email.com",
-        )
-        session.add(patient1)
-        session.flush()
-
-        history1 = MedicalHistory(
-            patient_id=patient1.id,
-            diagnosis="Caries en molar superior derecho",
-            treatment="Empaste dental con resina compuesta",
-            notes="Paciente con sensibilidad al frío. Recomendar pasta dental para sensibilidad.",
-        )
-        history2 = MedicalHistory(
-            patient_id=patient1.id,
-            diagnosis="Limpieza dental de rutina",
-            treatment="Profilaxis dental completa",
-            notes="Buena higiene general. Próxima cita en 6 meses.",
-        )
-        session.add_all([history1, history2])
-
-        patient2 = Patient(
-            name="Carlos López",
-            phone="999777666",
-            email="carlos.lopez@email.com",
-        )
-        session.add(patient2)
-        session.flush()
-
-        history3 = MedicalHistory(
-            patient_id=patient2.id,
-            diagnosis="Gingivitis leve",
-            treatment="Limpieza profunda y recomendaciones de higiene",
-            notes="Usar hilo dental diariamente. Control en 3 meses.",
-        )
-        session.add(history3)
+        if get_repositories(session).patients.get_by_phone("999888777") is None:
+            _seed_demo_records(session)
 
-        doctor1 = Doctor(
-            name="Dr. Roberto Mendoza",
-            specialty="Odontología General",
-            phone="999111222",
-            is_available=True,
-        )
-        doctor2 = Doctor(
-            name="Dra. Ana Castillo",
-            specialty="Endodoncia",
-            phone="999333444",
-            is_available=False,
-        )
-        doctor3 = Doctor(
-            name="Dr. Pedro Vargas",
-            specialty="Cirugía Oral",
-            phone="999555666",
-            is_available=True,
-        )
-        session.add_all([doctor1, doctor2, doctor3])
-        session.flush()
-
-        _seed_doctor_schedules(session, [doctor1, doctor2, doctor3])
-        session.commit()
+    # Pacientes creados antes de existir el snapshot de contexto
+    with get_session() as session:
+        PatientService.backfill_patient_contexts(session)
+
+
+def _seed_demo_records(session: "DataSession") -> None:
+    from src.repositories import get_repositories
+
+    repos = get_repositories(session)
+
+    patient1 = Patient(
+        name="María García",
+        phone="999888777",
+        email="maria.garcia@email.com",
+    )
+    repos.patients.add(patient1)
+
+    history1 = MedicalHistory(
+        patient_id=patient1.id,
+        diagnosis="Caries en molar superior derecho",
+        treatment="Empaste dental con resina compuesta",
+        notes="Paciente con sensibilidad al frío. Recomendar pasta dental para sensibilidad.",
+    )
+    history2 = MedicalHistory(
+        patient_id=patient1.id,
+        diagnosis="Limpieza dental de rutina",
+        treatment="Profilaxis dental completa",
+        notes="Buena higiene general. Próxima cita en 6 meses.",
+    )
+    repos.patients.add_history(history1)
+    repos.patients.add_history(history2)
+
+    patient2 = Patient(
+        name="Carlos López",
+        phone="999777666",
+        email="carlos.lopez@email.com",
+    )
+    repos.patients.add(patient2)
+
+    history3 = MedicalHistory(
+        patient_id=patient2.id,
+        diagnosis="Gingivitis leve",
+        treatment="Limpieza profunda y recomendaciones de higiene",
+        notes="Usar hilo dental diariamente. Control en 3 meses.",
+    )
+    repos.patients.add_history(history3)
+
+    doctor1 = Doctor(
+        name="Dr. Roberto Mendoza",
+        specialty="Odontología General",
+        phone="999111222",
+        is_available=True,
+    )
+    doctor2 = Doctor(
+        name="Dra. Ana Castillo",
+        specialty="Endodoncia",
+        phone="999333444",
+        is_available=False,
+    )
+    doctor3 = Doctor(
+        name="Dr. Pedro Vargas",
+        specialty="Cirugía Oral",
+        phone="999555666",
+        is_available=True,
+    )
+    for doctor in (doctor1, doctor2, doctor3):
+        repos.doctors.add(doctor)
+
+    _seed_doctor_schedules(session, [doctor1, doctor2, doctor3])
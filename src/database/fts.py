@@ -0,0 +1,130 @@
+"""Índice de texto completo (SQLite FTS5) sobre `medical_history`.
+
+La tabla virtual usa `medical_history` como contenido externo y se mantiene
+sincronizada con triggers, así que cualquier escritura al historial (ORM,
+SQL crudo o importaciones) queda indexada sin código adicional.
+"""
+
+import re
+import unicodedata
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+FTS_TABLE = "medical_history_fts"
+
+# Pesos bm25 por columna: patient_id solo filtra, el diagnóstico pesa más.
+BM25_WEIGHTS = (0.0, 4.0, 2.0, 1.0)
+
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        patient_id, diagnosis, treatment, notes,
+        content='medical_history', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS medical_history_fts_ai
+    AFTER INSERT ON medical_history BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, patient_id, diagnosis, treatment, notes)
+        VALUES (new.id, new.patient_id, new.diagnosis, new.treatment, new.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS medical_history_fts_ad
+    AFTER DELETE ON medical_history BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, patient_id, diagnosis, treatment, notes)
+        VALUES ('delete', old.id, old.patient_id, old.diagnosis, old.treatment, old.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS medical_history_fts_au
+    AFTER UPDATE ON medical_history BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, patient_id, diagnosis, treatment, notes)
+        VALUES ('delete', old.id, old.patient_id, old.diagnosis, old.treatment, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, patient_id, diagnosis, treatment, notes)
+        VALUES (new.id, new.patient_id, new.diagnosis, new.treatment, new.notes);
+    END
+    """,
+]
+
+STOPWORDS = frozenset(
+    """
+    a al algo como con cual cuando de del donde el ella en es esa ese esta
+    este esto estoy fue ha hay la las le lo los me mi mis muy no nos o para
+    pero por que qué se si sin sobre su sus te tengo tu un una uno unos y ya
+    """.split()
+)
+
+_fts_status: "WeakKeyDictionary[Engine, bool]" = WeakKeyDictionary()
+
+
+def install_fts(engine: Engine) -> bool:
+    """Crea la tabla FTS y sus triggers; reconstruye el índice si es nuevo."""
+    if engine.dialect.name != "sqlite":
+        _fts_status[engine] = False
+        return False
+    with engine.begin() as conn:
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+            {"name": FTS_TABLE},
+        ).first()
+        try:
+            for statement in _FTS_DDL:
+                conn.execute(text(statement))
+        except Exception:
+            # SQLite compilado sin FTS5: se usa la búsqueda de respaldo.
+            _fts_status[engine] = False
+            return False
+        if not existed:
+            conn.execute(
+                text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            )
+    _fts_status[engine] = True
+    return True
+
+
+def fts_available(engine: Engine) -> bool:
+    status = _fts_status.get(engine)
+    if status is None:
+        with engine.connect() as conn:
+            status = (
+                engine.dialect.name == "sqlite"
+                and conn.execute(
+                    text(
+                        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"
+                    ),
+                    {"name": FTS_TABLE},
+                ).first()
+                is not None
+            )
+        _fts_status[engine] = status
+    return status
+
+
+def fold_text(value: str) -> str:
+    """Minúsculas sin tildes, igual que el tokenizador del índice."""
+    normalized = unicodedata.normalize("NFKD", value.lower())
+    return "".join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def extract_search_terms(message: str, max_terms: int = 12) -> list[str]:
+    """Términos significativos del mensaje, sin tildes ni palabras vacías."""
+    terms: list[str] = []
+    for token in re.findall(r"\w+", fold_text(message)):
+        if len(token) < 3 or token in STOPWORDS or token.isdigit():
+            continue
+        if token not in terms:
+            terms.append(token)
+    return terms[:max_terms]
+
+
+def build_match_query(terms: list[str], patient_id: int | None = None) -> str:
+    """Expresión MATCH de FTS5 con prefijos y filtro opcional por paciente."""
+    expression = " OR ".join(f'"{term}"*' for term in terms)
+    if patient_id is not None:
+        return f'patient_id:"{patient_id}" AND ({expression})'
+    return expression
+
@@ -0,0 +1,241 @@
+"""Instrumentación de SQL basada en eventos del engine de SQLAlchemy.
+
+Atribuye número de sentencias, tiempo total y sentencias más lentas a la
+sección activa (nodo del grafo o bloque de la UI) y mantiene un log
+circular de consultas lentas.
+"""
+
+import heapq
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Generator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+UNATTRIBUTED_SECTION = "unattributed"
+
+_current_section: ContextVar[str] = ContextVar(
+    "sql_section", default=UNATTRIBUTED_SECTION
+)
+_active_captures: ContextVar[tuple["QueryCapture", ...]] = ContextVar(
+    "sql_captures", default=()
+)
+
+
+@dataclass
+class SlowQuery:
+    section: str
+    statement: str
+    duration_ms: float
+    recorded_at: datetime
+
+    def to_dict(self) -> dict:
+        return {
+            "section": self.section,
+            "statement": self.statement,
+            "duration_ms": round(self.duration_ms, 3),
+            "recorded_at": self.recorded_at.isoformat(),
+        }
+
+
+@dataclass
+class SectionStats:
+    """Acumulado de sentencias ejecutadas dentro de una sección."""
+
+    name: str
+    top_n: int = 5
+    statement_count: int = 0
+    total_ms: float = 0.0
+    _slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    def record(self, statement: str, duration_ms: float) -> None:
+        self.statement_count += 1
+        self.total_ms += duration_ms
+        entry = (duration_ms, statement)
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, entry)
+        elif duration_ms > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self) -> list[tuple[float, str]]:
+        return sorted(self._slowest, reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "section": self.name,
+            "statement_count": self.statement_count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.statement_count, 3)
+            if self.statement_count
+            else 0.0,
+            "slowest": [
+                {"duration_ms": round(ms, 3), "statement": stmt}
+                for ms, stmt in self.slowest
+            ],
+        }
+
+
+@dataclass
+class QueryCapture:
+    """Sentencias ejecutadas dentro de un bloque `QueryMonitor.capture()`."""
+
+    statements: list[str] = field(default_factory=list)
+    total_ms: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+class QueryMonitor:
+    """Recolecta métricas de SQL por sección a partir de eventos del engine."""
+
+    def __init__(
+        self,
+        slow_threshold_ms: float = 100.0,
+        slow_log_size: int = 200,
+        top_n: int = 5,
+    ):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._sections: dict[str, SectionStats] = {}
+        self._slow_log: deque[SlowQuery] = deque(maxlen=slow_log_size)
+
+    def configure(self, slow_threshold_ms: float, slow_log_size: int) -> None:
+        """Ajusta el umbral y el tamaño del log conservando las entradas recientes."""
+        with self._lock:
+            self.slow_threshold_ms = slow_threshold_ms
+            if self._slow_log.maxlen != slow_log_size:
+                self._slow_log = deque(self._slow_log, maxlen=slow_log_size)
+
+    def install(self, engine: Engine) -> None:
+        """Registra los listeners en el engine (idempotente).
+
+        Se consulta el propio engine y no un registro por `id()`: un engine
+        nuevo puede reutilizar el id de otro ya recolectado.
+        """
+        if event.contains(engine, "before_cursor_execute", self._before_execute):
+            return
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    def _after_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        start_times = conn.info.get("query_start_times")
+        if not start_times:
+            return
+        duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+        self.record(statement, duration_ms)
+
+    def record(self, statement: str, duration_ms: float) -> None:
+        """Registra una sentencia en la sección activa y en las capturas abiertas."""
+        section = _current_section.get()
+        with self._lock:
+            stats = self._sections.get(section)
+            if stats is None:
+                stats = SectionStats(name=section, top_n=self.top_n)
+                self._sections[section] = stats
+            stats.record(statement, duration_ms)
+            if duration_ms >= self.slow_threshold_ms:
+                self._slow_log.append(
+                    SlowQuery(
+                        section=section,
+                        statement=statement,
+                        duration_ms=duration_ms,
+                        recorded_at=datetime.now(),
+                    )
+                )
+        for capture in _active_captures.get():
+            capture.statements.append(statement)
+            capture.total_ms += duration_ms
+
+    @contextmanager
+    def capture(self) -> Generator[QueryCapture, None, None]:
+        """Captura las sentencias ejecutadas dentro del bloque."""
+        capture = QueryCapture()
+        token = _active_captures.set(_active_captures.get() + (capture,))
+        try:
+            yield capture
+        finally:
+            _active_captures.reset(token)
+
+    def summary(self) -> list[dict]:
+        """Secciones ordenadas por tiempo total descendente."""
+        with self._lock:
+            sections = [stats.to_dict() for stats in self._sections.values()]
+        return sorted(sections, key=lambda s: s["total_ms"], reverse=True)
+
+    def slow_queries(self) -> list[dict]:
+        with self._lock:
+            return [q.to_dict() for q in self._slow_log]
+
+    def format_summary(self) -> str:
+        """Resumen tabular legible de las métricas por sección."""
+        lines = [f"{'Sección':<32} {'Sentencias':>10} {'Total ms':>10} {'Prom ms':>9}"]
+        for section in self.summary():
+            lines.append(
+                f"{section['section']:<32} {section['statement_count']:>10} "
+                f"{section['total_ms']:>10.2f} {section['avg_ms']:>9.2f}"
+            )
+        return "\n".join(lines)
+
+    def report(self) -> dict:
+        return {
+            "generated_at": datetime.now().isoformat(),
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "sections": self.summary(),
+            "slow_queries": self.slow_queries(),
+        }
+
+    def export_report(self, path: str | Path) -> Path:
+        """Exporta resumen y log de consultas lentas como JSON."""
+        path = Path(path)
+        path.write_text(
+            json.dumps(self.report(), indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+        return path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sections.clear()
+            self._slow_log.clear()
+
+
+@contextmanager
+def track_section(name: str) -> Generator[None, None, None]:
+    """Atribuye las consultas ejecutadas dentro del bloque a la sección `name`."""
+    token = _current_section.set(name)
+    try:
+        yield
+    finally:
+        _current_section.reset(token)
+
+
+def current_section() -> str:
+    return _current_section.get()
+
+
+_monitor: Optional[QueryMonitor] = None
+
+
+def get_query_monitor() -> QueryMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = QueryMonitor()
+    return _monitor
@@ -117,3 +117,28 @@ class Appointment(Base):
 
     def __repr__(self) -> str:
         return f"<Appointment(id={self.id}, patient={self.patient_id}, doctor={self.doctor_id}, at={self.scheduled_at})>"
+
+
+class PatientContext(Base):
+    """Snapshot desnormalizado del contexto del paciente para lecturas en un paso.
+
+    Se actualiza en cada escritura de historial o citas del paciente.
+    """
+
+    __tablename__ = "patient_context"
+
+    patient_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("patients.id"), primary_key=True
+    )
+    phone: Mapped[str] = mapped_column(String(20), unique=True, index=True, nullable=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    history_summary: Mapped[str] = mapped_column(Text, nullable=False)
+    appointments_digest: Mapped[str] = mapped_column(
+        Text, default="[]", nullable=False
+    )  # JSON: [{"scheduled_at", "doctor_name", "status"}]
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return f"<PatientContext(patient_id={self.patient_id}, phone={self.phone})>"
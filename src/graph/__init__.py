@@ -1,4 +1,26 @@
-from src.graph.graph import create_dental_graph
-from src.graph.state import ConversationState
+"""Grafo de conversación.
 
-__all__ = ["ConversationState", "create_dental_graph"]
+Las exportaciones se resuelven al primer acceso: importar un submódulo
+ligero (por ejemplo `src.graph.transcript`) no carga LangGraph.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.graph.graph import create_dental_graph, get_dental_graph
+    from src.graph.state import ConversationState
+
+_EXPORTS = {
+    "ConversationState": "src.graph.state",
+    "create_dental_graph": "src.graph.graph",
+    "get_dental_graph": "src.graph.graph",
+}
+
+__all__ = ["ConversationState", "create_dental_graph", "get_dental_graph"]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_EXPORTS[name]), name)
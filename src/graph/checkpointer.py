@@ -0,0 +1,576 @@
+"""Checkpointer durable sobre SQLite con escrituras en lote y compactación.
+
+Reemplaza a `MemorySaver`: los checkpoints sobreviven a reinicios, solo se
+conservan los últimos N por hilo y los hilos inactivos más allá del TTL se
+eliminan en la compactación periódica.
+"""
+
+import asyncio
+import atexit
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from src.graph.serde import CompactSerializer
+from src.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Espera ante la base bloqueada: un flush que coincide con el VACUUM de la
+# compactación espera a que termine en lugar de fallar.
+BUSY_TIMEOUT_S = 60.0
+
+PruneListener = Callable[[Sequence[str]], None]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_updated_at ON threads(updated_at);
+"""
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """Checkpointer sobre un archivo SQLite local.
+
+    Las escrituras se acumulan en memoria y se confirman en una sola
+    transacción cuando el lote alcanza `batch_size`, cuando pasa
+    `flush_interval` segundos, antes de cualquier lectura y al cerrar.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        keep_last: int = 3,
+        ttl_seconds: Optional[float] = None,
+        batch_size: int = 64,
+        flush_interval: float = 1.0,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.path = str(path)
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, timeout=BUSY_TIMEOUT_S
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+        self._pending_checkpoints: list[tuple] = []
+        self._pending_writes: list[tuple[tuple, bool]] = []
+        self._touched: dict[tuple[str, str], float] = {}
+        self._flush_timer: Optional[threading.Timer] = None
+        self._compaction_stop: Optional[threading.Event] = None
+        self._prune_listeners: list[PruneListener] = []
+        self._closed = False
+        atexit.register(self.close)
+
+    # -- lotes -------------------------------------------------------------
+
+    def _schedule_flush(self) -> None:
+        if len(self._pending_checkpoints) + len(self._pending_writes) >= self.batch_size:
+            self.flush()
+        elif self._flush_timer is None and self.flush_interval > 0:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Confirma en una transacción todas las escrituras pendientes."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._closed or not (self._pending_checkpoints or self._pending_writes):
+                return
+            checkpoints, self._pending_checkpoints = self._pending_checkpoints, []
+            writes, self._pending_writes = self._pending_writes, []
+            touched, self._touched = self._touched, {}
+            try:
+                self._write_batch(checkpoints, writes, touched)
+            except sqlite3.Error:
+                # La transacción se revirtió: el lote vuelve al buffer.
+                self._pending_checkpoints = checkpoints + self._pending_checkpoints
+                self._pending_writes = writes + self._pending_writes
+                self._touched = {**touched, **self._touched}
+                raise
+
+    def _write_batch(
+        self,
+        checkpoints: list[tuple],
+        writes: list[tuple[tuple, bool]],
+        touched: dict[tuple[str, str], float],
+    ) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                checkpoints,
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row, replace in writes if not replace],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row, replace in writes if replace],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO threads VALUES (?, ?)",
+                {(thread_id, ts) for (thread_id, _), ts in touched.items()},
+            )
+            for thread_id, checkpoint_ns in touched:
+                self._apply_retention(thread_id, checkpoint_ns)
+
+    def _apply_retention(self, thread_id: str, checkpoint_ns: str) -> None:
+        if self.keep_last <= 0:
+            return
+        rows = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last),
+        ).fetchall()
+        if not rows:
+            return
+        # Los ids uuid6 ordenan cronológicamente: todo lo anterior al último
+        # conservado sobra, incluidas las escrituras pendientes asociadas.
+        cutoff = rows[0][0]
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id <= ?",
+                (thread_id, checkpoint_ns, cutoff),
+            )
+
+    # -- lectura -----------------------------------------------------------
+
+    def _row_to_tuple(self, row: tuple) -> CheckpointTuple:
+        (
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            parent_checkpoint_id,
+            type_,
+            checkpoint,
+            metadata_type,
+            metadata,
+        ) = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            self.flush()
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? "
+                    "AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? "
+                    "AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._row_to_tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                f"SELECT * FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params,
+            ).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                item = self._row_to_tuple(row)
+                if filter and not all(
+                    item.metadata.get(key) == value for key, value in filter.items()
+                ):
+                    continue
+                results.append(item)
+        yield from results
+
+    # -- escritura ---------------------------------------------------------
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._lock:
+            self._pending_checkpoints.append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized,
+                    metadata_type,
+                    serialized_metadata,
+                )
+            )
+            self._touched[(thread_id, checkpoint_ns)] = time.time()
+            self._schedule_flush()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append(
+                (
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint_id,
+                        task_id,
+                        WRITES_IDX_MAP.get(channel, idx),
+                        channel,
+                        type_,
+                        serialized,
+                        task_path,
+                    ),
+                    replace,
+                )
+            )
+        with self._lock:
+            self._pending_writes.extend(rows)
+            self._touched[(thread_id, checkpoint_ns)] = time.time()
+            self._schedule_flush()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.flush()
+            with self._conn:
+                for table in ("checkpoints", "writes", "threads"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,)
+                    )
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def list_threads(
+        self,
+        updated_after: float = 0.0,
+        updated_until: Optional[float] = None,
+        page_size: int = 500,
+    ) -> Iterator[Sequence[tuple[str, float]]]:
+        """Páginas de (thread_id, updated_at) con actividad en el rango.
+
+        Ordena por `updated_at` y pagina por clave, así cada página es una
+        consulta acotada y no se mantiene un cursor abierto entre páginas.
+        """
+        until = updated_until if updated_until is not None else time.time()
+        cursor = (updated_after, "")
+        while True:
+            with self._lock:
+                self.flush()
+                page = self._conn.execute(
+                    "SELECT thread_id, updated_at FROM threads "
+                    "WHERE (updated_at > ? OR (updated_at = ? AND thread_id > ?)) "
+                    "AND updated_at <= ? "
+                    "ORDER BY updated_at, thread_id LIMIT ?",
+                    (cursor[0], cursor[0], cursor[1], until, page_size),
+                ).fetchall()
+            if not page:
+                return
+            yield page
+            cursor = (page[-1][1], page[-1][0])
+
+    # -- mantenimiento -----------------------------------------------------
+
+    def add_prune_listener(self, listener: PruneListener) -> None:
+        """`listener(thread_ids)` recibe los hilos que poda cada `compact()`."""
+        with self._lock:
+            self._prune_listeners.append(listener)
+
+    def remove_prune_listener(self, listener: PruneListener) -> None:
+        with self._lock:
+            if listener in self._prune_listeners:
+                self._prune_listeners.remove(listener)
+
+    def prune_idle_threads(self, ttl_seconds: Optional[float] = None) -> Sequence[str]:
+        """Elimina los hilos sin actividad en los últimos `ttl_seconds` y
+        retorna sus ids, para que el llamador limpie lo que dependa de ellos."""
+        ttl_seconds = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        if ttl_seconds is None:
+            return []
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            self.flush()
+            idle = [
+                thread_id
+                for (thread_id,) in self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,)
+                )
+            ]
+            with self._conn:
+                for table in ("checkpoints", "writes", "threads"):
+                    self._conn.executemany(
+                        f"DELETE FROM {table} WHERE thread_id = ?",
+                        [(thread_id,) for thread_id in idle],
+                    )
+        return idle
+
+    def compact(self) -> dict[str, int]:
+        """Aplica retención a todos los hilos, poda por TTL y recupera espacio.
+
+        El VACUUM corre en una conexión propia y fuera del lock: mientras
+        dura, las escrituras siguen acumulándose en el buffer.
+        """
+        with self._lock:
+            self.flush()
+            threads = self._conn.execute(
+                "SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints"
+            ).fetchall()
+            with self._conn:
+                for thread_id, checkpoint_ns in threads:
+                    self._apply_retention(thread_id, checkpoint_ns)
+            pruned = self.prune_idle_threads()
+            listeners = list(self._prune_listeners)
+        for listener in listeners:
+            try:
+                listener(pruned)
+            except Exception:
+                logger.exception("Error notificando hilos podados")
+        self._vacuum()
+        with self._lock:
+            remaining = self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {"pruned_threads": len(pruned), "checkpoints": remaining}
+
+    def _vacuum(self) -> None:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_S)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    def start_compaction(self, interval_seconds: float) -> None:
+        """Ejecuta `compact()` periódicamente en un hilo daemon."""
+        if self._compaction_stop is not None:
+            return
+        stop = threading.Event()
+        self._compaction_stop = stop
+
+        def run() -> None:
+            while not stop.wait(interval_seconds):
+                try:
+                    self.compact()
+                except Exception:
+                    logger.exception("Error compactando checkpoints")
+
+        threading.Thread(target=run, name="checkpoint-compaction", daemon=True).start()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if self._compaction_stop is not None:
+            self._compaction_stop.set()
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._conn.close()
+
+    # -- async -------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer: Optional[SqliteCheckpointer] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> SqliteCheckpointer:
+    """Retorna el checkpointer del proceso, configurado desde settings."""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            settings = get_settings()
+            _checkpointer = SqliteCheckpointer(
+                settings.checkpoint_db_path,
+                keep_last=settings.checkpoint_keep_last,
+                ttl_seconds=settings.checkpoint_ttl_hours * 3600,
+                batch_size=settings.checkpoint_batch_size,
+                flush_interval=settings.checkpoint_flush_interval_s,
+                serde=CompactSerializer(settings.checkpoint_compression_threshold),
+            )
+            _checkpointer.start_compaction(settings.checkpoint_compaction_interval_s)
+        return _checkpointer
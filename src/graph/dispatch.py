@@ -0,0 +1,395 @@
+"""Cola de despacho de casos urgentes hacia los doctores disponibles.
+
+Los casos se atienden por severidad y, a igual severidad, por antigüedad.
+Cada asignación se confirma con `DoctorService.claim_doctor`, un
+compare-and-set sobre `Doctor.current_chat_id`, de modo que dos workers no
+pueden quedarse con el mismo doctor aunque lean la misma lista.
+
+El despachador es el único suscriptor de `DoctorAvailable`: primero reparte
+los doctores libres entre su cola y después avisa a sus oyentes (el
+`WaitlistResumer`) con los hilos que recibieron doctor, así estos solo ven
+los doctores que quedaron libres. Un caso nuevo también puede repartir
+doctores a otros hilos de la cola; a esos se les avisa igual.
+
+El doctor conectado a un chat lo atiende hasta que el chat termina
+(`end_chat`) o vence `chat_timeout_s`; entonces se libera con
+`DoctorService.release_doctor` y el evento reparte al siguiente caso.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from src.database.connection import get_session
+from src.repositories import DataSession
+from src.schemas.models import DoctorAvailability
+from src.services.doctor_service import DoctorService
+from src.services.notifications import DoctorAvailable, get_event_bus, run_after_commit
+from src.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DOCTOR_QUEUE_INTERRUPT_TYPE = "doctor_queue"
+
+# El evento es None cuando el despacho lo disparó un caso nuevo.
+Listener = Callable[[Optional[DoctorAvailable], list[str]], None]
+
+SEVERITY_BY_CLASSIFICATION = {"emergency": 0, "urgency": 1, "general": 2}
+
+# Signos de alarma: adelantan el caso un nivel de severidad.
+RED_FLAG_KEYWORDS = (
+    "sangr",
+    "hinchad",
+    "inflamad",
+    "fiebre",
+    "pus",
+    "no puedo abrir",
+    "no puedo tragar",
+)
+
+SPECIALTY_KEYWORDS = {
+    "Cirugía Oral": ("rompió", "roto", "fractura", "golpe", "juicio", "extracción"),
+    "Endodoncia": ("nervio", "conducto", "absceso", "hinchada", "sensibilidad"),
+}
+
+
+def infer_specialty(message: str) -> Optional[str]:
+    """Especialidad sugerida por el mensaje del paciente; None si no hay pista."""
+    text = message.lower()
+    for specialty, keywords in SPECIALTY_KEYWORDS.items():
+        if any(word in text for word in keywords):
+            return specialty
+    return None
+
+
+def infer_severity(classification: Optional[str], message: str) -> int:
+    """Severidad del caso (0 es la más alta): la de su clasificación, un nivel
+    más alta si el mensaje trae signos de alarma."""
+    severity = SEVERITY_BY_CLASSIFICATION.get(classification, 1)
+    text = message.lower()
+    if any(word in text for word in RED_FLAG_KEYWORDS):
+        severity = max(severity - 1, 0)
+    return severity
+
+
+@dataclass(frozen=True)
+class UrgentCase:
+    thread_id: str
+    severity: int = 1
+    specialty: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class DispatchQueue:
+    """Montículo de casos por (severidad, llegada) con borrado perezoso.
+
+    `push`, `pop` y `remove` son O(log n) amortizado: las entradas retiradas
+    o reemplazadas quedan en el montículo y se descartan al llegar a la cima.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, float, int, UrgentCase]] = []
+        self._live: dict[str, tuple[int, UrgentCase]] = {}
+        self._sequence = itertools.count()
+
+    def push(self, case: UrgentCase) -> UrgentCase:
+        """Encola el caso; si ya esperaba conserva la llegada y la mayor severidad."""
+        if case.thread_id in self._live:
+            previous = self._live[case.thread_id][1]
+            case = UrgentCase(
+                thread_id=case.thread_id,
+                severity=min(case.severity, previous.severity),
+                specialty=case.specialty or previous.specialty,
+                enqueued_at=previous.enqueued_at,
+            )
+            if case == previous:
+                return previous
+        sequence = next(self._sequence)
+        self._live[case.thread_id] = (sequence, case)
+        heapq.heappush(self._heap, (case.severity, case.enqueued_at, sequence, case))
+        self._compact()
+        return case
+
+    def peek(self) -> Optional[UrgentCase]:
+        self._drop_stale()
+        return self._heap[0][3] if self._heap else None
+
+    def pop(self) -> Optional[UrgentCase]:
+        self._drop_stale()
+        if not self._heap:
+            return None
+        case = heapq.heappop(self._heap)[3]
+        del self._live[case.thread_id]
+        return case
+
+    def remove(self, thread_id: str) -> None:
+        self._live.pop(thread_id, None)
+
+    def position(self, thread_id: str) -> Optional[int]:
+        """Posición 1-based del caso (O(n), solo para mostrarla al paciente)."""
+        if thread_id not in self._live:
+            return None
+        target = self._live[thread_id][1]
+        return 1 + sum(
+            1
+            for _, case in self._live.values()
+            if (case.severity, case.enqueued_at) < (target.severity, target.enqueued_at)
+        )
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self._live
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def _is_live(self, entry: tuple[int, float, int, UrgentCase]) -> bool:
+        live = self._live.get(entry[3].thread_id)
+        return live is not None and live[0] == entry[2]
+
+    def _drop_stale(self) -> None:
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._live) + 32:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+
+class DoctorDispatcher:
+    """Reparte doctores libres entre los casos de la cola.
+
+    Prefiere doctores de la especialidad del caso y, entre ellos, al que
+    menos casos ha recibido; la cola solo avanza cuando el compare-and-set
+    confirma la asignación, y la asignación solo se recuerda cuando la
+    sesión que la hizo confirma el commit (con rollback los casos vuelven a
+    la cola). Un doctor asignado a un caso que esperaba queda reservado
+    hasta que su hilo lo recoge; si el doctor se libera antes, la reserva se
+    descarta, y si nadie la recoge en `assignment_ttl_s` el doctor se libera.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[DispatchQueue] = None,
+        assignment_ttl_s: Optional[float] = None,
+        chat_timeout_s: Optional[float] = None,
+    ) -> None:
+        self.queue = queue or DispatchQueue()
+        self._assignment_ttl_s = assignment_ttl_s
+        self._chat_timeout_s = chat_timeout_s
+        self._lock = threading.Lock()
+        self._load: Counter[int] = Counter()
+        self._assigned: dict[str, tuple[float, dict]] = {}
+        self._chats: dict[str, tuple[float, int]] = {}
+        self._listeners: list[Listener] = []
+
+    def install(self) -> "DoctorDispatcher":
+        get_event_bus().subscribe(DoctorAvailable, self.on_doctor_available)
+        return self
+
+    def uninstall(self) -> None:
+        get_event_bus().unsubscribe(DoctorAvailable, self.on_doctor_available)
+
+    def add_listener(self, listener: Listener) -> None:
+        """`listener(evento, hilos)` corre tras cada despacho confirmado."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    @property
+    def assignment_ttl_s(self) -> float:
+        if self._assignment_ttl_s is None:
+            self._assignment_ttl_s = get_settings().dispatch_assignment_ttl_s
+        return self._assignment_ttl_s
+
+    @property
+    def chat_timeout_s(self) -> float:
+        if self._chat_timeout_s is None:
+            self._chat_timeout_s = get_settings().dispatch_chat_timeout_s
+        return self._chat_timeout_s
+
+    def request_doctor(self, session: DataSession, case: UrgentCase) -> Optional[dict]:
+        """Encola el caso y despacha; retorna el doctor si este caso lo obtuvo.
+
+        Un doctor asignado mientras el caso esperaba se entrega en la
+        siguiente llamada del mismo hilo. Los demás hilos que reciban doctor
+        en este despacho se avisan a los oyentes tras el commit de `session`.
+        """
+        with self._lock:
+            self._release_expired(session)
+            if case.thread_id in self._assigned:
+                doctor = self._assigned.pop(case.thread_id)[1]
+                self._chats[case.thread_id] = (time.monotonic(), doctor["doctor_id"])
+                return doctor
+            self.queue.push(case)
+            dispatched = self._dispatch(session)
+        doctor = None
+        others = []
+        for dispatched_case, assigned in dispatched:
+            if dispatched_case.thread_id == case.thread_id:
+                doctor = assigned
+            else:
+                others.append((dispatched_case, assigned))
+        self._commit_dispatch(session, dispatched, others)
+        if doctor is not None:
+            run_after_commit(session, lambda: self.hold(case.thread_id, doctor["doctor_id"]))
+        return doctor
+
+    def hold(self, thread_id: str, doctor_id: int) -> None:
+        """Registra que el doctor atiende el chat; vence en `chat_timeout_s`."""
+        with self._lock:
+            self._chats[thread_id] = (time.monotonic(), doctor_id)
+
+    def end_chat(self, thread_id: str) -> list[int]:
+        """Termina el chat del hilo: lo saca de la cola y libera a su doctor."""
+        return self.end_chats([thread_id])
+
+    def end_chats(self, thread_ids: Iterable[str]) -> list[int]:
+        thread_ids = list(thread_ids)
+        with self._lock:
+            for thread_id in thread_ids:
+                self.queue.remove(thread_id)
+                self._assigned.pop(thread_id, None)
+                self._chats.pop(thread_id, None)
+        with get_session() as session:
+            return DoctorService.release_chats(session, thread_ids)
+
+    def release_expired(self) -> None:
+        """Libera las reservas sin recoger y los chats que vencieron."""
+        with get_session() as session, self._lock:
+            self._release_expired(session)
+
+    def cancel(self, thread_id: str) -> None:
+        with self._lock:
+            self.queue.remove(thread_id)
+            self._assigned.pop(thread_id, None)
+
+    def position(self, thread_id: str) -> Optional[int]:
+        with self._lock:
+            return self.queue.position(thread_id)
+
+    def on_doctor_available(self, event: DoctorAvailable) -> None:
+        # La sesión envuelve al lock: los eventos del commit (incluidos los
+        # de doctores liberados por vencimiento) se publican ya sin el lock.
+        with get_session() as session:
+            with self._lock:
+                self._assigned = {
+                    thread_id: entry
+                    for thread_id, entry in self._assigned.items()
+                    if entry[1]["doctor_id"] != event.doctor_id
+                }
+                self._release_expired(session)
+                dispatched = self._dispatch(session)
+            self._commit_dispatch(session, dispatched, dispatched, event, notify_empty=True)
+
+    def _commit_dispatch(
+        self,
+        session: DataSession,
+        dispatched: list[tuple[UrgentCase, dict]],
+        reserved: list[tuple[UrgentCase, dict]],
+        event: Optional[DoctorAvailable] = None,
+        notify_empty: bool = False,
+    ) -> None:
+        """Guarda las reservas y avisa a los oyentes cuando `session` confirma;
+        con rollback devuelve los casos a la cola."""
+
+        def on_commit() -> None:
+            now = time.monotonic()
+            with self._lock:
+                for case, doctor in reserved:
+                    self._assigned[case.thread_id] = (now, doctor)
+                listeners = list(self._listeners)
+            if not reserved and not notify_empty:
+                return
+            thread_ids = [case.thread_id for case, _ in reserved]
+            for listener in listeners:
+                try:
+                    listener(event, thread_ids)
+                except Exception:
+                    logger.exception("Error notificando el despacho de %r", event)
+
+        def on_rollback() -> None:
+            with self._lock:
+                for case, doctor in dispatched:
+                    self._load[doctor["doctor_id"]] -= 1
+                    self.queue.push(case)
+
+        run_after_commit(session, on_commit, on_rollback)
+
+    def _release_expired(self, session: DataSession) -> None:
+        """Libera los doctores reservados para hilos que no los recogieron y
+        los de chats que superaron `chat_timeout_s`."""
+        now = time.monotonic()
+        expired = [
+            (thread_id, self._assigned.pop(thread_id)[1]["doctor_id"])
+            for thread_id, (assigned_at, _) in list(self._assigned.items())
+            if assigned_at < now - self.assignment_ttl_s
+        ]
+        expired += [
+            (thread_id, self._chats.pop(thread_id)[1])
+            for thread_id, (connected_at, _) in list(self._chats.items())
+            if connected_at < now - self.chat_timeout_s
+        ]
+        for thread_id, doctor_id in expired:
+            doctor = DoctorService.get_doctor_by_id(session, doctor_id)
+            if doctor is not None and doctor.current_chat_id == thread_id:
+                DoctorService.release_doctor(session, doctor_id)
+
+    def _rank(
+        self, doctors: list[DoctorAvailability], specialty: Optional[str]
+    ) -> list[DoctorAvailability]:
+        return sorted(
+            doctors,
+            key=lambda doc: (doc.specialty != specialty, self._load[doc.doctor_id], doc.doctor_id),
+        )
+
+    def _dispatch(self, session: DataSession) -> list[tuple[UrgentCase, dict]]:
+        """Asigna doctores a la cima de la cola mientras haya libres."""
+        free = DoctorService.get_available_doctors(session)
+        dispatched: list[tuple[UrgentCase, dict]] = []
+        while free and len(self.queue):
+            case = self.queue.peek()
+            doctor = None
+            for candidate in self._rank(free, case.specialty):
+                free.remove(candidate)
+                doctor = DoctorService.claim_doctor(session, candidate.doctor_id, case.thread_id)
+                if doctor is not None:
+                    break
+            if doctor is None:
+                break
+            self.queue.pop()
+            self._load[doctor.id] += 1
+            dispatched.append(
+                (
+                    case,
+                    {
+                        "doctor_id": doctor.id,
+                        "doctor_name": doctor.name,
+                        "specialty": doctor.specialty,
+                    },
+                )
+            )
+        return dispatched
+
+
+_dispatcher: Optional[DoctorDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> DoctorDispatcher:
+    """Despachador del proceso, suscrito a los eventos `DoctorAvailable`."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = DoctorDispatcher().install()
+    return _dispatcher
@@ -40,6 +40,28 @@ def route_after_urgency_check(
     return "wait_human_intervention"
 
 
+def route_after_slot_selection(
+    state: ConversationState,
+) -> Literal["connect_doctor", "end_conversation"]:
+    """Con la cita de urgencia confirmada, conecta al paciente con un doctor.
+
+    `handle_dental_urgency` limpia la cita al empezar cada urgencia, así
+    que solo cuenta la agendada en este caso.
+    """
+    if state.get("appointment_confirmed"):
+        return "connect_doctor"
+    return "end_conversation"
+
+
+def route_after_doctor_request(
+    state: ConversationState,
+) -> Literal["connect_doctor", "end_conversation"]:
+    """Mantiene al paciente en la cola de despacho hasta recibir doctor."""
+    if state.get("assigned_doctor"):
+        return "end_conversation"
+    return "connect_doctor"
+
+
 def should_continue_urgency_loop(
     state: ConversationState,
 ) -> Literal["check_availability", "end_conversation"]:
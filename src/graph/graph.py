@@ -1,39 +1,89 @@
-from langgraph.checkpoint.memory import MemorySaver
+import threading
+import time
+from typing import Callable
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, StateGraph
 
+from src.database.instrumentation import track_section
+from src.graph.checkpointer import get_checkpointer
 from src.graph.edges import (
     route_after_classification,
+    route_after_doctor_request,
     route_after_patient_check,
+    route_after_slot_selection,
     route_after_urgency_check,
 )
+from src.graph.idempotency import tag_submission
 from src.graph.nodes import (
     check_doctor_availability,
     classify_message,
+    connect_doctor,
     handle_dental_urgency,
     handle_general_query,
     handle_medical_emergency,
     register_patient,
     select_appointment_slot,
+    trim_history,
     verify_patient,
 )
-from src.graph.state import ConversationState
-
-
-def create_dental_graph():
-    """Crea y retorna el grafo de LangGraph para el asistente dental."""
+from src.graph.state import ConversationState, reset_turn_state, stamp_sent_at
+from src.graph.waitlist import WaitlistResumer
+from src.schemas.phone import normalize_phone
+from src.tracing import bind_thread_id, get_tracer
+
+NODES: dict[str, Callable[[ConversationState], ConversationState]] = {
+    "trim_history": trim_history,
+    "verify_patient": verify_patient,
+    "register_patient": register_patient,
+    "classify_message": classify_message,
+    "handle_general_query": handle_general_query,
+    "handle_dental_urgency": handle_dental_urgency,
+    "handle_medical_emergency": handle_medical_emergency,
+    "check_availability": check_doctor_availability,
+    "select_slot": select_appointment_slot,
+    "connect_doctor": connect_doctor,
+}
+
+
+def instrument_node(name: str, node: Callable) -> Callable:
+    """Ejecuta el nodo dentro del span `node.<name>` ligado al `thread_id`.
+
+    Las consultas SQL del nodo se atribuyen además a la sección `node.<name>`
+    y los mensajes que emite quedan marcados con su hora de envío.
+    """
+
+    def wrapper(state: ConversationState, config: RunnableConfig) -> ConversationState:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        with bind_thread_id(thread_id), get_tracer().span(f"node.{name}"):
+            with track_section(f"node.{name}"):
+                update = node(state)
+        if update and update.get("messages"):
+            stamp_sent_at(update["messages"])
+        return update
+
+    # Sin `functools.wraps`: LangGraph inspeccionaría la firma del nodo
+    # original y dejaría de pasar `config` al wrapper.
+    wrapper.__name__ = node.__name__
+    wrapper.__doc__ = node.__doc__
+    return wrapper
+
+
+def create_dental_graph(checkpointer: BaseCheckpointSaver | None = None):
+    """Crea y retorna el grafo de LangGraph para el asistente dental.
+
+    Por defecto persiste los checkpoints en el SQLite configurado en settings.
+    """
 
     graph = StateGraph(ConversationState)
 
-    graph.add_node("verify_patient", verify_patient)
-    graph.add_node("register_patient", register_patient)
-    graph.add_node("classify_message", classify_message)
-    graph.add_node("handle_general_query", handle_general_query)
-    graph.add_node("handle_dental_urgency", handle_dental_urgency)
-    graph.add_node("handle_medical_emergency", handle_medical_emergency)
-    graph.add_node("check_availability", check_doctor_availability)
-    graph.add_node("select_slot", select_appointment_slot)
+    for name, node in NODES.items():
+        graph.add_node(name, instrument_node(name, node))
 
-    graph.set_entry_point("verify_patient")
+    graph.set_entry_point("trim_history")
+    graph.add_edge("trim_history", "verify_patient")
 
     graph.add_conditional_edges(
         "verify_patient",
@@ -78,34 +128,76 @@ def create_dental_graph():
         },
     )
 
-    graph.add_edge("select_slot", END)
+    graph.add_conditional_edges(
+        "select_slot",
+        route_after_slot_selection,
+        {
+            "connect_doctor": "connect_doctor",
+            "end_conversation": END,
+        },
+    )
+
+    graph.add_conditional_edges(
+        "connect_doctor",
+        route_after_doctor_request,
+        {
+            "connect_doctor": "connect_doctor",
+            "end_conversation": END,
+        },
+    )
 
     graph.add_edge("handle_medical_emergency", END)
 
-    memory = MemorySaver()
-    compiled_graph = graph.compile(checkpointer=memory)
+    compiled_graph = graph.compile(checkpointer=checkpointer or get_checkpointer())
 
     return compiled_graph
 
 
+_dental_graph = None
+_dental_graph_lock = threading.Lock()
+
+
+def get_dental_graph():
+    """Retorna el grafo compilado compartido por todo el proceso.
+
+    Las sesiones se aíslan por `thread_id`; el grafo se compila una sola vez,
+    en el primer uso, aunque varias sesiones lleguen a la vez. Al crearlo se
+    suscribe al despachador el `WaitlistResumer` que reanuda las urgencias
+    en espera y los hilos de la cola de despacho.
+    """
+    global _dental_graph
+    if _dental_graph is None:
+        with _dental_graph_lock:
+            if _dental_graph is None:
+                _dental_graph = create_dental_graph()
+                WaitlistResumer(_dental_graph).install()
+    return _dental_graph
+
+
 def get_initial_state(patient_phone: str | None = None) -> ConversationState:
     """Retorna el estado inicial para una nueva conversación."""
     return {
         "messages": [],
-        "patient_phone": patient_phone,
+        "patient_phone": patient_phone and normalize_phone(patient_phone),
         "patient_id": None,
         "patient_exists": False,
         "patient_name": None,
-        "classification": None,
-        "medical_history": None,
-        "awaiting_human": False,
-        "awaiting_slot_selection": False,
-        "available_doctors": [],
-        "available_slots": [],
-        "selected_slot": None,
         "assigned_doctor": None,
         "appointment_confirmed": None,
         "emergency_contacts_provided": False,
-        "from_check_availability": False,
-        "human_response": None,
+        "started_at": time.time(),
+        **reset_turn_state(),
     }
+
+
+def get_turn_input(
+    user_message: str, submission_key: str | None = None
+) -> ConversationState:
+    """Entrada de un turno posterior: el mensaje nuevo y los campos de turno.
+
+    El resto del estado se recupera del checkpoint del hilo. La clave de
+    idempotencia, si se indica, queda guardada en el mensaje.
+    """
+    message = tag_submission(HumanMessage(content=user_message), submission_key)
+    stamp_sent_at([message])
+    return {**reset_turn_state(), "messages": [message], "turn_count": 1}
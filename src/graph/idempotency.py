@@ -0,0 +1,142 @@
+"""Envío idempotente de mensajes del paciente.
+
+Cada mensaje enviado lleva una clave de idempotencia que se guarda con el
+hilo, en `additional_kwargs["submission_key"]` del `HumanMessage`. Antes de
+ejecutar un turno se busca la clave en el historial: si ya se procesó, se
+retorna el resultado guardado (las respuestas de ese turno y, si es el
+último, su interrupt) sin volver a llamar al LLM ni repetir escrituras.
+Si el mensaje quedó guardado pero su ejecución se cortó antes de responder,
+el turno se reanuda desde el checkpoint en lugar de repetirse.
+
+`SubmissionGuard` cubre los duplicados que llegan mientras el primero aún
+se ejecuta: dentro del proceso solo un envío por clave corre a la vez y
+los demás esperan a que termine para leer su resultado.
+"""
+
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Optional, TypeVar
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+SUBMISSION_KEY = "submission_key"
+
+T = TypeVar("T")
+
+
+def tag_submission(message: HumanMessage, key: Optional[str]) -> HumanMessage:
+    """Marca el mensaje con su clave de idempotencia (si la hay)."""
+    if key:
+        message.additional_kwargs[SUBMISSION_KEY] = key
+    return message
+
+
+@dataclass(frozen=True)
+class StoredSubmission:
+    """Resultado guardado de un envío ya procesado."""
+
+    replies: list[AIMessage]
+    is_latest: bool
+
+
+def _locate(messages: list[BaseMessage], key: str) -> Optional[StoredSubmission]:
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if not (
+            isinstance(message, HumanMessage)
+            and message.additional_kwargs.get(SUBMISSION_KEY) == key
+        ):
+            continue
+        replies = []
+        for following in messages[index + 1 :]:
+            if isinstance(following, HumanMessage):
+                return StoredSubmission(replies, is_latest=False)
+            if isinstance(following, AIMessage):
+                replies.append(following)
+        return StoredSubmission(replies, is_latest=True)
+    return None
+
+
+def find_submission(
+    messages: list[BaseMessage], key: str, paused: bool = False
+) -> Optional[StoredSubmission]:
+    """Busca la clave desde el final del historial; None si no se procesó.
+
+    Las respuestas son los mensajes del asistente hasta el siguiente mensaje
+    del paciente. Un turno ya descartado por la retención no se encuentra.
+    El último turno sin respuestas solo cuenta como procesado si el hilo
+    quedó detenido en un interrupt (`paused`), que es su resultado.
+    """
+    stored = _locate(messages, key)
+    if stored is None or stored.replies or not stored.is_latest or paused:
+        return stored
+    return None
+
+
+def submission_input(snapshot, key: Optional[str], graph_input):
+    """Entrada con la que ejecutar el envío.
+
+    None (reanudar desde el checkpoint) si el mensaje con esta clave ya está
+    en el hilo y su turno quedó con nodos pendientes sin interrupt, es decir,
+    la ejecución se cortó; si no, `graph_input`.
+    """
+    if key is None or not snapshot.next or snapshot.interrupts:
+        return graph_input
+    stored = _locate(snapshot.values.get("messages", []), key)
+    if stored is not None and stored.is_latest and not stored.replies:
+        return None
+    return graph_input
+
+
+class SubmissionGuard:
+    """Un solo envío en curso por (thread_id, clave) dentro del proceso."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple[str, str], Future] = {}
+
+    def claim(self, thread_id: str, key: str) -> Optional[Future]:
+        """None si el llamador pasa a ejecutar el envío; si no, el `Future`
+        que se resuelve cuando termine el envío en curso."""
+        with self._lock:
+            running = self._in_flight.get((thread_id, key))
+            if running is not None:
+                return running
+            self._in_flight[(thread_id, key)] = Future()
+            return None
+
+    def release(self, thread_id: str, key: str) -> None:
+        with self._lock:
+            running = self._in_flight.pop((thread_id, key), None)
+        if running is not None:
+            running.set_result(None)
+
+    def run(
+        self,
+        thread_id: str,
+        key: str,
+        lookup: Callable[[], Optional[T]],
+        execute: Callable[[], T],
+    ) -> T:
+        """Retorna el resultado guardado por `lookup` o, si no hay, ejecuta."""
+        while (running := self.claim(thread_id, key)) is not None:
+            running.result()
+        try:
+            stored = lookup()
+            return stored if stored is not None else execute()
+        finally:
+            self.release(thread_id, key)
+
+
+_guard: Optional[SubmissionGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_submission_guard() -> SubmissionGuard:
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = SubmissionGuard()
+    return _guard
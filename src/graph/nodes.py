@@ -1,46 +1,67 @@
 from datetime import datetime
 
 from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.config import get_config
 from langgraph.types import interrupt
 
 from src.agents.classifier import MessageClassifier
 from src.agents.responder import DentalResponder
 from src.database.connection import get_session
-from src.graph.state import ConversationState
+from src.graph.dispatch import (
+    DOCTOR_QUEUE_INTERRUPT_TYPE,
+    UrgentCase,
+    get_dispatcher,
+    infer_severity,
+    infer_specialty,
+)
+from src.graph.state import ConversationState, evict_old_turns
+from src.graph.waitlist import WAITING_INTERRUPT_TYPE, get_waitlist
 from src.services.appointment_service import AppointmentService
 from src.services.doctor_service import DoctorService
 from src.services.patient_service import PatientService
+from src.services.read_cache import get_identity_cache
+from src.settings import get_settings
+
+
+def _current_thread_id() -> str | None:
+    """`thread_id` del hilo en ejecución; None si el nodo corre fuera del grafo."""
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+def trim_history(state: ConversationState) -> ConversationState:
+    """Descarta los turnos más antiguos según la política de retención."""
+    max_turns = get_settings().conversation_max_turns
+    removals = evict_old_turns(state.get("messages", []), max_turns)
+    return {"messages": removals} if removals else {}
 
 
 def verify_patient(state: ConversationState) -> ConversationState:
-    """Verifica si el paciente existe en el sistema."""
+    """Verifica si el paciente existe en el sistema (con caché de identidad)."""
     patient_phone = state.get("patient_phone")
 
     if not patient_phone:
         return {
-            **state,
             "patient_exists": False,
             "patient_id": None,
             "patient_name": None,
         }
 
-    with get_session() as session:
-        patient = PatientService.get_patient_by_phone(session, patient_phone)
-
-        if patient:
-            return {
-                **state,
-                "patient_exists": True,
-                "patient_id": patient.id,
-                "patient_name": patient.name,
-            }
-        else:
-            return {
-                **state,
-                "patient_exists": False,
-                "patient_id": None,
-                "patient_name": None,
-            }
+    identity = get_identity_cache().resolve(patient_phone)
+    if identity:
+        return {
+            "patient_exists": True,
+            "patient_id": identity.patient_id,
+            "patient_name": identity.name,
+        }
+    else:
+        return {
+            "patient_exists": False,
+            "patient_id": None,
+            "patient_name": None,
+        }
 
 
 def register_patient(state: ConversationState) -> ConversationState:
@@ -49,9 +70,7 @@ def register_patient(state: ConversationState) -> ConversationState:
 
     if not patient_phone:
         return {
-            **state,
-            "messages": state["messages"]
-            + [
+            "messages": [
                 AIMessage(
                     content="Para poder atenderte mejor, necesito tu número de teléfono. "
                     "Por favor, indícalo en el panel lateral."
@@ -65,15 +84,12 @@ def register_patient(state: ConversationState) -> ConversationState:
             name=f"Paciente {patient_phone}",
             phone=patient_phone,
         )
-        session.commit()
 
         return {
-            **state,
             "patient_exists": True,
             "patient_id": patient.id,
             "patient_name": patient.name,
-            "messages": state["messages"]
-            + [
+            "messages": [
                 AIMessage(
                     content=f"Te he registrado como nuevo paciente. "
                     f"¡Bienvenido/a a MuelAI!"
@@ -93,12 +109,15 @@ def classify_message(state: ConversationState) -> ConversationState:
             break
 
     if not last_human_message:
-        return {**state, "classification": "general"}
-
-    classifier = MessageClassifier()
-    classification = classifier.classify(last_human_message)
+        classification = "general"
+    else:
+        classifier = MessageClassifier()
+        classification = classifier.classify(last_human_message)
 
-    return {**state, "classification": classification}
+    return {
+        "classification": classification,
+        "classification_counts": {classification: 1},
+    }
 
 
 def handle_general_query(state: ConversationState) -> ConversationState:
@@ -106,13 +125,6 @@ def handle_general_query(state: ConversationState) -> ConversationState:
     patient_id = state.get("patient_id")
     patient_name = state.get("patient_name", "Paciente")
 
-    medical_history = "No hay historial médico disponible."
-    if patient_id:
-        with get_session() as session:
-            medical_history = PatientService.get_medical_history_summary(
-                session, patient_id
-            )
-
     messages = state.get("messages", [])
     last_human_message = ""
     for msg in reversed(messages):
@@ -120,6 +132,13 @@ def handle_general_query(state: ConversationState) -> ConversationState:
             last_human_message = msg.content
             break
 
+    medical_history = "No hay historial médico disponible."
+    if patient_id:
+        with get_session() as session:
+            medical_history = PatientService.get_relevant_history_summary(
+                session, patient_id, last_human_message
+            )
+
     responder = DentalResponder()
     response = responder.respond_general_query(
         user_message=last_human_message,
@@ -129,12 +148,44 @@ def handle_general_query(state: ConversationState) -> ConversationState:
     )
 
     return {
-        **state,
         "medical_history": medical_history,
-        "messages": state["messages"] + [AIMessage(content=response)],
+        "messages": [AIMessage(content=response)],
     }
 
 
+def _urgency_doctors(
+    thread_id: str | None, requested: list[int] | None = None
+) -> tuple[list[dict], dict | None]:
+    """Doctores que se ofrecen a la urgencia y el asignado por un operador.
+
+    Un doctor reclamado para este hilo (`OperatorConsole.assign`) es el único
+    que se ofrece, en cualquier rama del nodo; si no hay, se ofrecen los
+    disponibles, limitados a `requested` cuando se indica.
+    """
+    with get_session() as session:
+        roster = DoctorService.get_all_doctors(session)
+    claimed = [doc for doc in roster if thread_id and doc.current_chat_id == thread_id]
+    offered = claimed or [
+        doc
+        for doc in roster
+        if doc.is_available and (requested is None or doc.doctor_id in requested)
+    ]
+    doctors_list = [
+        {
+            "doctor_id": doc.doctor_id,
+            "doctor_name": doc.doctor_name,
+            "specialty": doc.specialty,
+        }
+        for doc in offered
+    ]
+    return doctors_list, doctors_list[0] if claimed else None
+
+
+# Una urgencia nueva no hereda la cita ni el doctor de una anterior del hilo:
+# `route_after_slot_selection` y `connect_doctor` deciden con lo de este caso.
+NEW_URGENCY = {"appointment_confirmed": None, "assigned_doctor": None}
+
+
 def handle_dental_urgency(state: ConversationState) -> ConversationState:
     """Maneja urgencias dentales: obtiene doctores y pasa a agendar cita."""
     patient_name = state.get("patient_name", "Paciente")
@@ -145,69 +196,74 @@ def handle_dental_urgency(state: ConversationState) -> ConversationState:
             last_human_message = msg.content
             break
 
-    with get_session() as session:
-        available_doctors = DoctorService.get_available_doctors(session)
-        doctors_list = [
-            {
-                "doctor_id": doc.doctor_id,
-                "doctor_name": doc.doctor_name,
-                "specialty": doc.specialty,
-            }
-            for doc in available_doctors
-        ]
+    thread_id = _current_thread_id()
+    doctors_list, assigned_doctor = _urgency_doctors(thread_id)
 
     if doctors_list:
+        # Al reanudar el interrupt el nodo se re-ejecuta desde el inicio y,
+        # si ya hay doctores, no pasa por el `discard` posterior al interrupt.
+        if thread_id:
+            get_waitlist().discard(thread_id)
         responder = DentalResponder()
         response = responder.respond_urgency(
             user_message=last_human_message,
             available_doctors=doctors_list,
             patient_name=patient_name,
         )
-        return {
-            **state,
+        update = {
+            **NEW_URGENCY,
             "available_doctors": doctors_list,
             "awaiting_human": False,
             "from_check_availability": False,
-            "messages": state["messages"] + [AIMessage(content=response)],
+            "messages": [AIMessage(content=response)],
         }
+        if assigned_doctor:
+            update["assigned_doctor"] = assigned_doctor
+        return update
     else:
         initial_response = (
             f"Entiendo que tienes una urgencia dental, {patient_name}. "
             "En este momento no hay doctores disponibles. "
             "Por favor, haz clic en 'Verificar disponibilidad' cuando esté listo."
         )
+        if thread_id:
+            # La espera se ordena con la misma severidad que la cola de despacho.
+            get_waitlist().register(
+                thread_id,
+                priority=infer_severity(state.get("classification"), last_human_message),
+                patient_phone=state.get("patient_phone"),
+            )
         human_input = interrupt(
             {
-                "type": "urgency_no_doctors",
+                "type": WAITING_INTERRUPT_TYPE,
                 "message": f"URGENCIA DENTAL - Paciente: {patient_name}\nMensaje: {last_human_message}",
                 "patient_phone": state.get("patient_phone"),
                 "required_action": "update_availability",
             }
         )
+        if thread_id:
+            get_waitlist().discard(thread_id)
         if human_input and human_input.get("retry"):
-            with get_session() as session:
-                available_doctors = DoctorService.get_available_doctors(session)
-                doctors_list = [
-                    {
-                        "doctor_id": doc.doctor_id,
-                        "doctor_name": doc.doctor_name,
-                        "specialty": doc.specialty,
-                    }
-                    for doc in available_doctors
-                ]
+            # Un operador puede reanudar el hilo con doctores concretos.
+            doctors_list, assigned_doctor = _urgency_doctors(
+                thread_id, human_input.get("doctor_ids")
+            )
             if doctors_list:
-                return {
-                    **state,
+                update = {
+                    **NEW_URGENCY,
                     "available_doctors": doctors_list,
                     "awaiting_human": False,
                     "from_check_availability": False,
                 }
+                if assigned_doctor:
+                    update["assigned_doctor"] = assigned_doctor
+                return update
         return {
-            **state,
+            **NEW_URGENCY,
             "available_doctors": [],
             "awaiting_human": True,
             "from_check_availability": False,
-            "messages": state["messages"] + [AIMessage(content=initial_response)],
+            "messages": [AIMessage(content=initial_response)],
         }
 
 
@@ -225,13 +281,18 @@ def check_doctor_availability(state: ConversationState) -> ConversationState:
         ]
 
     return {
-        **state,
         "available_doctors": doctors_list,
         "awaiting_human": False,
         "from_check_availability": True,
     }
 
 
+def slot_doctor_ids(state: ConversationState) -> list[int] | None:
+    """Doctores cuyos slots se ofrecen; None equivale a todos los disponibles."""
+    available_doctors = state.get("available_doctors", [])
+    return [d["doctor_id"] for d in available_doctors] if available_doctors else None
+
+
 def select_appointment_slot(state: ConversationState) -> ConversationState:
     """
     Human-in-the-loop: muestra slots disponibles y espera que el paciente seleccione.
@@ -242,22 +303,19 @@ def select_appointment_slot(state: ConversationState) -> ConversationState:
 
     if not patient_id:
         return {
-            **state,
-            "messages": state["messages"]
-            + [AIMessage(content="Necesito tu número de teléfono para agendar. Indícalo en el panel lateral.")],
+            "messages": [AIMessage(content="Necesito tu número de teléfono para agendar. Indícalo en el panel lateral.")],
         }
 
-    available_doctors = state.get("available_doctors", [])
-    doctor_ids = [d["doctor_id"] for d in available_doctors] if available_doctors else None
+    doctor_ids = slot_doctor_ids(state)
 
     with get_session() as session:
-        slots = AppointmentService.get_available_slots(session, doctor_ids)
+        summary = AppointmentService.get_slot_summary(
+            session, doctor_ids, chat_id=_current_thread_id()
+        )
 
-    if not slots:
+    if not summary["total"]:
         return {
-            **state,
-            "messages": state["messages"]
-            + [
+            "messages": [
                 AIMessage(
                     content="Lo siento, no hay horarios disponibles en este momento. "
                     "Por favor, intenta más tarde o contacta con nosotros."
@@ -266,10 +324,12 @@ def select_appointment_slot(state: ConversationState) -> ConversationState:
             "available_slots": [],
         }
 
+    # El interrupt lleva solo el resumen (conteo por día y los próximos
+    # slots); la interfaz pide cada día con `get_slot_page` al mostrarlo.
     selected = interrupt(
         {
             "type": "slot_selection",
-            "slots": slots,
+            **summary,
             "message": "Selecciona un horario disponible para tu cita",
         }
     )
@@ -288,18 +348,13 @@ def select_appointment_slot(state: ConversationState) -> ConversationState:
                 scheduled_at = datetime.fromisoformat(parts[1])
 
                 with get_session() as session:
-                    from src.database.models import Doctor as DoctorModel
-
                     appointment = AppointmentService.create_appointment(
                         session, patient_id, doctor_id, scheduled_at
                     )
                     appointment_id = appointment.id
-                    doctor_obj = (
-                        session.query(DoctorModel)
-                        .filter(DoctorModel.id == doctor_id)
-                        .first()
+                    doctor_name = (
+                        appointment.doctor.name if appointment.doctor else "Doctor"
                     )
-                    doctor_name = doctor_obj.name if doctor_obj else "Doctor"
 
                 display_time = scheduled_at.strftime("%d/%m/%Y a las %H:%M")
                 response = (
@@ -308,21 +363,18 @@ def select_appointment_slot(state: ConversationState) -> ConversationState:
                     f"con {doctor_name}. Te esperamos."
                 )
                 return {
-                    **state,
                     "appointment_confirmed": {
                         "id": appointment_id,
                         "scheduled_at": scheduled_at.isoformat(),
                         "doctor_name": doctor_name,
                     },
-                    "messages": state["messages"] + [AIMessage(content=response)],
+                    "messages": [AIMessage(content=response)],
                 }
         except (ValueError, IndexError):
             pass
 
     return {
-        **state,
-        "messages": state["messages"]
-        + [
+        "messages": [
             AIMessage(
                 content="Lo siento, hubo un error al agendar. Por favor, selecciona un horario de la lista."
             )
@@ -331,23 +383,51 @@ def select_appointment_slot(state: ConversationState) -> ConversationState:
 
 
 def connect_doctor(state: ConversationState) -> ConversationState:
-    """Conecta al paciente con un doctor disponible."""
-    available_doctors = state.get("available_doctors", [])
+    """Conecta al paciente con un doctor a través de la cola de despacho.
+
+    Si no hay doctor libre el hilo se interrumpe en la cola; al reanudarlo
+    (automáticamente cuando el despachador le asigna uno) el nodo recoge la
+    asignación o vuelve a esperar. Un doctor ya asignado al chat (por un
+    operador) no pasa por la cola, pero su atención vence igual.
+    """
     patient_name = state.get("patient_name", "Paciente")
+    assigned_doctor = state.get("assigned_doctor")
+    if assigned_doctor:
+        thread_id = _current_thread_id()
+        if thread_id:
+            get_dispatcher().hold(thread_id, assigned_doctor["doctor_id"])
+        return {}
 
-    if not available_doctors:
-        return {
-            **state,
-            "messages": state["messages"]
-            + [
-                AIMessage(
-                    content="Lo siento, en este momento no hay doctores disponibles. "
-                    "Por favor, espere mientras nuestro equipo gestiona su caso."
-                )
-            ],
-        }
+    messages = state.get("messages", [])
+    last_human_message = ""
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            last_human_message = msg.content
+            break
+
+    thread_id = _current_thread_id() or f"patient-{state.get('patient_phone')}"
+    case = UrgentCase(
+        thread_id=thread_id,
+        severity=infer_severity(state.get("classification"), last_human_message),
+        specialty=infer_specialty(last_human_message),
+    )
+    dispatcher = get_dispatcher()
+    with get_session() as session:
+        selected_doctor = dispatcher.request_doctor(session, case)
 
-    selected_doctor = available_doctors[0]
+    if selected_doctor is None:
+        position = dispatcher.position(thread_id)
+        interrupt(
+            {
+                "type": DOCTOR_QUEUE_INTERRUPT_TYPE,
+                "message": f"Estás en la posición {position} de la fila; "
+                "te conectaremos con el primer doctor que se libere.",
+                "position": position,
+                "patient_phone": state.get("patient_phone"),
+            }
+        )
+        # Reanudado sin doctor: `route_after_doctor_request` vuelve al nodo.
+        return {}
 
     response = (
         f"¡Buenas noticias, {patient_name}! "
@@ -357,9 +437,8 @@ def connect_doctor(state: ConversationState) -> ConversationState:
     )
 
     return {
-        **state,
         "assigned_doctor": selected_doctor,
-        "messages": state["messages"] + [AIMessage(content=response)],
+        "messages": [AIMessage(content=response)],
     }
 
 
@@ -396,7 +475,6 @@ def handle_medical_emergency(state: ConversationState) -> ConversationState:
     full_response = response + emergency_info
 
     return {
-        **state,
         "emergency_contacts_provided": True,
-        "messages": state["messages"] + [AIMessage(content=full_response)],
+        "messages": [AIMessage(content=full_response)],
     }
@@ -0,0 +1,126 @@
+"""Consola de operador: urgencias en espera y carga de los doctores.
+
+Lee la lista de espera en memoria (`AvailabilityWaitlist`) y el roster
+cacheado del panel lateral, así que refrescarla no recorre checkpoints ni
+consulta la base mientras no haya escrituras. Las acciones masivas liberan
+doctores en una sola transacción o reanudan hilos con un doctor concreto.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from langgraph.types import Command
+
+from src.database.connection import get_session
+from src.graph.waitlist import (
+    WAITING_INTERRUPT_TYPE,
+    AvailabilityWaitlist,
+    get_waitlist,
+    pending_interrupt_type,
+)
+from src.schemas.models import DoctorAvailability
+from src.services.doctor_service import DoctorService
+from src.services.read_cache import SidebarCache, get_sidebar_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WaitingCase:
+    thread_id: str
+    patient_phone: Optional[str]
+    priority: int
+    waited_s: float
+
+
+@dataclass(frozen=True)
+class ConsoleSnapshot:
+    waiting: list[WaitingCase]
+    doctors: list[DoctorAvailability]
+
+    @property
+    def busy_doctors(self) -> list[DoctorAvailability]:
+        return [doc for doc in self.doctors if doc.current_chat_id]
+
+    @property
+    def free_doctors(self) -> list[DoctorAvailability]:
+        return [doc for doc in self.doctors if doc.is_available and not doc.current_chat_id]
+
+
+class OperatorConsole:
+    """Vista y acciones del operador sobre la cola de urgencias."""
+
+    def __init__(
+        self,
+        graph,
+        waitlist: Optional[AvailabilityWaitlist] = None,
+        cache: Optional[SidebarCache] = None,
+    ) -> None:
+        self.graph = graph
+        self.waitlist = waitlist if waitlist is not None else get_waitlist()
+        self.cache = cache or get_sidebar_cache()
+
+    def snapshot(self) -> ConsoleSnapshot:
+        """Hilos en espera (el que más espera primero a igual prioridad) y roster."""
+        now = time.monotonic()
+        waiting = [
+            WaitingCase(
+                thread_id=entry.thread_id,
+                patient_phone=entry.patient_phone,
+                priority=entry.priority,
+                waited_s=now - entry.enqueued_at,
+            )
+            for entry in self.waitlist.ordered()
+        ]
+        return ConsoleSnapshot(waiting=waiting, doctors=self.cache.doctor_roster())
+
+    def release_doctors(self, doctor_ids: Iterable[int]) -> list[int]:
+        """Libera los doctores en una transacción; retorna los liberados.
+
+        Cada doctor liberado publica `DoctorAvailable`, así que el
+        `WaitlistResumer` reanuda los hilos en espera sin más pasos.
+        """
+        with get_session() as session:
+            return [
+                doctor_id
+                for doctor_id in doctor_ids
+                if DoctorService.release_doctor(session, doctor_id) is not None
+            ]
+
+    def assign(self, assignments: dict[str, int]) -> list[str]:
+        """Reanuda cada hilo en espera con el doctor indicado ya reclamado.
+
+        El doctor se reclama para el hilo con `DoctorService.claim_doctor`
+        antes de reanudarlo, así el nodo de urgencia solo le ofrece ese
+        doctor y ningún otro hilo puede recibirlo. Se omiten los hilos que ya
+        no esperan, los doctores ocupados o fuera de turno y los que ya se
+        asignaron en esta misma llamada. Retorna los hilos reanudados.
+        """
+        free = {doc.doctor_id for doc in self.snapshot().free_doctors}
+        assigned = []
+        for thread_id, doctor_id in assignments.items():
+            if doctor_id not in free or thread_id not in self.waitlist:
+                continue
+            if pending_interrupt_type(self.graph, thread_id) != WAITING_INTERRUPT_TYPE:
+                self.waitlist.discard(thread_id)
+                continue
+            with get_session() as session:
+                claimed = DoctorService.claim_doctor(session, doctor_id, thread_id)
+            free.discard(doctor_id)
+            if claimed is None:
+                continue
+            config = {"configurable": {"thread_id": thread_id}}
+            try:
+                self.graph.invoke(
+                    Command(resume={"retry": True, "doctor_ids": [doctor_id]}), config
+                )
+            except Exception:
+                logger.exception("No se pudo asignar el doctor %s al hilo %s", doctor_id, thread_id)
+                with get_session() as session:
+                    DoctorService.release_doctor(session, doctor_id)
+                continue
+            self.waitlist.discard(thread_id)
+            assigned.append(thread_id)
+        return assigned
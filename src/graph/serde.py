@@ -0,0 +1,195 @@
+"""Serializador compacto para los checkpoints de la conversación.
+
+Codifica con msgpack los tipos que dominan el estado (mensajes, slots de
+citas y fechas) en extensiones propias de pocos bytes y delega el resto en
+`JsonPlusSerializer`. Los payloads grandes se comprimen con zstd si el
+paquete `zstandard` está instalado.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import ormsgpack
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+TYPE_COMPACT = "cmsgpack"
+TYPE_COMPACT_ZSTD = "cmsgpack+zstd"
+
+# Los códigos 0-31 se reservan para las extensiones de JsonPlusSerializer.
+EXT_MESSAGE = 32
+EXT_SLOTS = 33
+EXT_DATETIME = 34
+EXT_FALLBACK = 35
+
+_MESSAGE_KINDS: dict[type, int] = {HumanMessage: 0, AIMessage: 1, SystemMessage: 2}
+_MESSAGE_CLASSES = {kind: cls for cls, kind in _MESSAGE_KINDS.items()}
+_MESSAGE_FIELDS = 6
+
+_SLOT_KEYS = {"slot_id", "doctor_id", "doctor_name", "specialty", "scheduled_at", "display"}
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+_PACK_OPTIONS = (
+    ormsgpack.OPT_NON_STR_KEYS
+    | ormsgpack.OPT_PASSTHROUGH_DATETIME
+    | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+    | ormsgpack.OPT_PASSTHROUGH_ENUM
+    | ormsgpack.OPT_PASSTHROUGH_UUID
+    | ormsgpack.OPT_PASSTHROUGH_SUBCLASS
+)
+
+
+def _is_slot(value: Any) -> bool:
+    """Indica si el dict tiene exactamente la forma de un slot de cita."""
+    if type(value) is not dict or value.keys() != _SLOT_KEYS:
+        return False
+    scheduled_at = value["scheduled_at"]
+    return (
+        type(scheduled_at) is datetime
+        and scheduled_at.tzinfo is None
+        and not scheduled_at.microsecond
+    )
+
+
+def _pack_slots(slots: list[dict]) -> bytes:
+    """Codifica la lista por columnas, con los doctores deduplicados."""
+    doctors: dict[tuple, int] = {}
+    doctor_index, seconds, slot_ids, displays = [], [], [], []
+    for slot in slots:
+        key = (slot["doctor_id"], slot["doctor_name"], slot["specialty"])
+        doctor_index.append(doctors.setdefault(key, len(doctors)))
+        seconds.append((slot["scheduled_at"] - _EPOCH) // _SECOND)
+        slot_ids.append(slot["slot_id"])
+        displays.append(slot["display"])
+    return ormsgpack.packb([list(doctors), doctor_index, seconds, slot_ids, displays])
+
+
+def _unpack_slots(data: bytes) -> list[dict]:
+    doctors, *columns = ormsgpack.unpackb(data)
+    slots = []
+    for index, offset, slot_id, display in zip(*columns):
+        doctor_id, doctor_name, specialty = doctors[index]
+        slots.append(
+            {
+                "slot_id": slot_id,
+                "doctor_id": doctor_id,
+                "doctor_name": doctor_name,
+                "specialty": specialty,
+                "scheduled_at": _EPOCH + timedelta(seconds=offset),
+                "display": display,
+            }
+        )
+    return slots
+
+
+class CompactSerializer(SerializerProtocol):
+    """Serializador msgpack con codificación específica del estado del grafo.
+
+    `compression_threshold` es el tamaño en bytes a partir del cual se
+    comprime con zstd; `None` desactiva la compresión.
+    """
+
+    def __init__(
+        self,
+        compression_threshold: Optional[int] = 1024,
+        compression_level: int = 3,
+    ) -> None:
+        self.compression_threshold = (
+            compression_threshold if zstandard is not None else None
+        )
+        self._fallback = JsonPlusSerializer()
+        if self.compression_threshold is not None:
+            self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        if zstandard is not None:
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    # -- codificación ------------------------------------------------------
+
+    def _pack(self, value: Any) -> bytes:
+        return ormsgpack.packb(self._compact(value), default=self._default, option=_PACK_OPTIONS)
+
+    def _compact(self, value: Any) -> Any:
+        """Reemplaza las listas de slots de citas por su extensión columnar."""
+        if isinstance(value, dict):
+            return {key: self._compact(item) for key, item in value.items()}
+        if isinstance(value, list):
+            if value and all(_is_slot(item) for item in value):
+                return ormsgpack.Ext(EXT_SLOTS, _pack_slots(value))
+            return [self._compact(item) for item in value]
+        return value
+
+    def _default(self, obj: Any) -> ormsgpack.Ext:
+        kind = _MESSAGE_KINDS.get(type(obj))
+        if kind is not None and not (
+            kind == _MESSAGE_KINDS[AIMessage]
+            and (obj.tool_calls or obj.invalid_tool_calls or obj.usage_metadata)
+        ):
+            fields = [
+                kind,
+                obj.content,
+                obj.id,
+                obj.name,
+                obj.additional_kwargs or None,
+                obj.response_metadata or None,
+            ]
+            while fields[-1] is None:
+                fields.pop()
+            return ormsgpack.Ext(EXT_MESSAGE, self._pack(fields))
+        if type(obj) is datetime:
+            return ormsgpack.Ext(EXT_DATETIME, obj.isoformat().encode())
+        _, data = self._fallback.dumps_typed(obj)
+        return ormsgpack.Ext(EXT_FALLBACK, data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if obj is None or isinstance(obj, bytes):
+            return self._fallback.dumps_typed(obj)
+        data = self._pack(obj)
+        if self.compression_threshold is not None and len(data) > self.compression_threshold:
+            return TYPE_COMPACT_ZSTD, self._compressor.compress(data)
+        return TYPE_COMPACT, data
+
+    # -- decodificación ----------------------------------------------------
+
+    def _unpack(self, data: bytes) -> Any:
+        return ormsgpack.unpackb(data, ext_hook=self._ext_hook, option=ormsgpack.OPT_NON_STR_KEYS)
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code == EXT_MESSAGE:
+            fields = self._unpack(data)
+            fields += [None] * (_MESSAGE_FIELDS - len(fields))
+            kind, content, message_id, name, additional_kwargs, response_metadata = fields
+            return _MESSAGE_CLASSES[kind](
+                content=content,
+                id=message_id,
+                name=name,
+                additional_kwargs=additional_kwargs or {},
+                response_metadata=response_metadata or {},
+            )
+        if code == EXT_SLOTS:
+            return _unpack_slots(data)
+        if code == EXT_DATETIME:
+            return datetime.fromisoformat(data.decode())
+        if code == EXT_FALLBACK:
+            return self._fallback.loads_typed(("msgpack", data))
+        raise ValueError(f"Extensión msgpack desconocida: {code}")
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == TYPE_COMPACT:
+            return self._unpack(payload)
+        if type_ == TYPE_COMPACT_ZSTD:
+            if zstandard is None:
+                raise RuntimeError(
+                    "El checkpoint está comprimido con zstd y el paquete "
+                    "`zstandard` no está instalado"
+                )
+            return self._unpack(self._decompressor.decompress(payload))
+        # Checkpoints escritos con el serializador por defecto.
+        return self._fallback.loads_typed(data)
@@ -1,12 +1,35 @@
-from typing import Annotated, Any, Literal, Optional
+import operator
+import time
+from typing import Annotated, Any, Iterable, Literal, Optional
 
 from langgraph.graph.message import add_messages
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
 from typing_extensions import TypedDict
 
 
-class ConversationState(TypedDict, total=False):
-    """Estado de la conversación en el grafo de LangGraph."""
+# Los mensajes con `additional_kwargs["pinned"]` nunca se descartan.
+PINNED_KEY = "pinned"
+
+# Marca de tiempo (epoch en segundos) de cada mensaje, para métricas de respuesta.
+SENT_AT_KEY = "sent_at"
+
+
+def add_counts(current: Optional[dict[str, int]], update: dict[str, int]) -> dict[str, int]:
+    """Reducer que suma contadores por clave."""
+    merged = dict(current or {})
+    for key, count in update.items():
+        merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+class PersistedState(TypedDict, total=False):
+    """Campos que se conservan entre turnos de la conversación."""
 
     messages: Annotated[list[BaseMessage], add_messages]
 
@@ -15,6 +38,20 @@ class ConversationState(TypedDict, total=False):
     patient_exists: bool
     patient_name: Optional[str]
 
+    assigned_doctor: Optional[dict]
+    appointment_confirmed: Optional[dict]
+
+    emergency_contacts_provided: bool
+
+    # Métricas del hilo: sobreviven a la retención de mensajes.
+    started_at: Optional[float]
+    turn_count: Annotated[int, operator.add]
+    classification_counts: Annotated[dict[str, int], add_counts]
+
+
+class TurnState(TypedDict, total=False):
+    """Campos de trabajo de un turno; se reinician al llegar un mensaje nuevo."""
+
     classification: Optional[Literal["general", "urgency", "emergency"]]
 
     medical_history: Optional[str]
@@ -26,11 +63,61 @@ class ConversationState(TypedDict, total=False):
     available_slots: list[dict]
     selected_slot: Optional[dict]
 
-    assigned_doctor: Optional[dict]
-    appointment_confirmed: Optional[dict]
-
-    emergency_contacts_provided: bool
-
     from_check_availability: bool
 
     human_response: Optional[Any]
+
+
+class ConversationState(PersistedState, TurnState, total=False):
+    """Estado de la conversación en el grafo de LangGraph.
+
+    Los nodos retornan solo las claves que modifican; `messages` recibe
+    únicamente los mensajes nuevos y el reducer los añade al historial.
+    """
+
+
+def reset_turn_state() -> TurnState:
+    """Valores iniciales de los campos de trabajo de un turno."""
+    return {
+        "classification": None,
+        "medical_history": None,
+        "awaiting_human": False,
+        "awaiting_slot_selection": False,
+        "available_doctors": [],
+        "available_slots": [],
+        "selected_slot": None,
+        "from_check_availability": False,
+        "human_response": None,
+    }
+
+
+def is_pinned(message: BaseMessage) -> bool:
+    """Los mensajes de sistema y los marcados como fijos se conservan siempre."""
+    return isinstance(message, SystemMessage) or bool(
+        message.additional_kwargs.get(PINNED_KEY)
+    )
+
+
+def evict_old_turns(messages: list[BaseMessage], max_turns: int) -> list[RemoveMessage]:
+    """Retorna las eliminaciones que dejan solo los últimos `max_turns` turnos.
+
+    Un turno empieza con cada `HumanMessage`. El resultado se aplica a través
+    del reducer `add_messages`, que borra los mensajes por id.
+    """
+    turn_starts = [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+    if max_turns <= 0 or len(turn_starts) <= max_turns:
+        return []
+    cutoff = turn_starts[-max_turns]
+    return [
+        RemoveMessage(id=msg.id)
+        for msg in messages[:cutoff]
+        if msg.id is not None and not is_pinned(msg)
+    ]
+
+
+def stamp_sent_at(messages: Iterable[BaseMessage], now: Optional[float] = None) -> None:
+    """Marca con la hora actual los mensajes que aún no la tienen."""
+    now = time.time() if now is None else now
+    for message in messages:
+        if isinstance(message, (HumanMessage, AIMessage)):
+            message.additional_kwargs.setdefault(SENT_AT_KEY, now)
@@ -0,0 +1,50 @@
+"""Sincronización incremental del historial del grafo con el chat visible.
+
+Los mensajes del estado llegan en orden y el reducer `add_messages` les
+asigna un id estable. `TranscriptSync` recorre el historial desde el final
+hasta el primer id ya visto, así cada turno cuesta O(mensajes nuevos) y dos
+respuestas con el mismo texto se muestran ambas. No importa LangChain en
+tiempo de carga: la página lo usa antes del primer mensaje.
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+
+class TranscriptSync:
+    """Recuerda qué mensajes del hilo ya se mostraron, por id."""
+
+    def __init__(self) -> None:
+        self._seen: set[str] = set()
+
+    def new_messages(self, messages: list["BaseMessage"]) -> list["BaseMessage"]:
+        """Retorna, en orden, los mensajes posteriores al último ya visto.
+
+        Los turnos descartados por la política de retención no afectan: solo
+        se eliminan mensajes anteriores a los ya sincronizados.
+        """
+        fresh = []
+        for msg in reversed(messages):
+            if msg.id is not None and msg.id in self._seen:
+                break
+            fresh.append(msg)
+        fresh.reverse()
+        self._seen.update(msg.id for msg in fresh if msg.id is not None)
+        return fresh
+
+    def new_assistant_entries(self, messages: list["BaseMessage"]) -> list[dict]:
+        """Entradas de chat para las respuestas nuevas del asistente.
+
+        Los mensajes del paciente ya se muestran al enviarlos, así que solo
+        se marcan como vistos.
+        """
+        return [
+            {"role": "assistant", "content": content}
+            for msg in self.new_messages(messages)
+            if msg.type == "ai" and (content := (msg.content or "").strip())
+        ]
+
+    def __len__(self) -> int:
+        return len(self._seen)
@@ -0,0 +1,255 @@
+"""Conversaciones de urgencia en espera de un doctor disponible.
+
+`handle_dental_urgency` registra el hilo antes de interrumpirse y
+`WaitlistResumer` lo reanuda en cuanto un servicio publica `DoctorAvailable`,
+sin que el paciente tenga que pulsar "Verificar disponibilidad". El evento
+llega a través del `DoctorDispatcher`, después de que este reparta doctores
+entre su propia cola; el resumer reanuda también los hilos de esa cola que
+recibieron doctor. Los hilos que poda la compactación del checkpointer
+salen de la espera y terminan su chat: ya no hay checkpoint que reanudar.
+Cada compactación libera además los doctores de chats vencidos.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Optional
+
+from langgraph.types import Command
+
+from src.database.connection import get_session
+from src.graph.checkpointer import SqliteCheckpointer
+from src.graph.dispatch import DOCTOR_QUEUE_INTERRUPT_TYPE, DoctorDispatcher, get_dispatcher
+from src.services.doctor_service import DoctorService
+from src.services.notifications import DoctorAvailable
+from src.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+WAITING_INTERRUPT_TYPE = "urgency_no_doctors"
+
+
+@dataclass(frozen=True)
+class WaitingThread:
+    thread_id: str
+    priority: int
+    enqueued_at: float
+    patient_phone: Optional[str] = None
+
+    @property
+    def sort_key(self) -> tuple[int, float]:
+        return (self.priority, self.enqueued_at)
+
+
+class AvailabilityWaitlist:
+    """Registro de hilos en espera; menor `priority` se atiende primero y,
+    a igual prioridad, el que lleva más tiempo esperando."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[str, WaitingThread] = {}
+
+    def register(
+        self, thread_id: str, priority: int = 0, patient_phone: Optional[str] = None
+    ) -> WaitingThread:
+        """Registra el hilo; si ya esperaba conserva su antigüedad."""
+        with self._lock:
+            previous = self._entries.get(thread_id)
+            entry = WaitingThread(
+                thread_id=thread_id,
+                priority=priority,
+                enqueued_at=previous.enqueued_at if previous else time.monotonic(),
+                patient_phone=patient_phone,
+            )
+            self._entries[thread_id] = entry
+            return entry
+
+    def discard(self, thread_id: str) -> None:
+        with self._lock:
+            self._entries.pop(thread_id, None)
+
+    def ordered(self) -> list[WaitingThread]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return sorted(entries, key=lambda entry: entry.sort_key)
+
+    def __contains__(self, thread_id: str) -> bool:
+        with self._lock:
+            return thread_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_waitlist: Optional[AvailabilityWaitlist] = None
+_waitlist_lock = threading.Lock()
+
+
+def get_waitlist() -> AvailabilityWaitlist:
+    global _waitlist
+    if _waitlist is None:
+        with _waitlist_lock:
+            if _waitlist is None:
+                _waitlist = AvailabilityWaitlist()
+    return _waitlist
+
+
+def pending_interrupt_type(graph, thread_id: str) -> Optional[str]:
+    """Tipo del interrupt pendiente del hilo; None si no está interrumpido."""
+    snapshot = graph.get_state({"configurable": {"thread_id": thread_id}})
+    for task in snapshot.tasks:
+        for pending in task.interrupts:
+            if isinstance(pending.value, dict):
+                return pending.value.get("type")
+    return None
+
+
+class WaitlistResumer:
+    """Reanuda hilos en espera cuando se libera un doctor.
+
+    Los eventos se atienden en un hilo coordinador de fondo, así el commit
+    que libera al doctor no espera al grafo. Los eventos que llegan mientras
+    hay un drenado pendiente se agrupan en ese drenado: un cambio de turno
+    que abre veinte doctores dispara una sola pasada. Cada pasada reanuda,
+    en orden de prioridad, tantos hilos como doctores haya disponibles, en
+    lotes de a lo sumo `max_concurrency` ejecuciones simultáneas del grafo.
+    """
+
+    def __init__(
+        self,
+        graph,
+        waitlist: Optional[AvailabilityWaitlist] = None,
+        max_concurrency: Optional[int] = None,
+        dispatcher: Optional[DoctorDispatcher] = None,
+    ) -> None:
+        self.graph = graph
+        self.waitlist = waitlist if waitlist is not None else get_waitlist()
+        self.dispatcher = dispatcher or get_dispatcher()
+        self._max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="waitlist")
+        self._workers: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._drain_pending = False
+        self._dispatched: set[str] = set()
+        self._last: Optional[Future] = None
+
+    def install(self) -> "WaitlistResumer":
+        self.dispatcher.add_listener(self.on_doctor_available)
+        if isinstance(self._checkpointer, SqliteCheckpointer):
+            self._checkpointer.add_prune_listener(self.on_threads_pruned)
+        return self
+
+    def uninstall(self) -> None:
+        self.dispatcher.remove_listener(self.on_doctor_available)
+        if isinstance(self._checkpointer, SqliteCheckpointer):
+            self._checkpointer.remove_prune_listener(self.on_threads_pruned)
+
+    @property
+    def _checkpointer(self):
+        return getattr(self.graph, "checkpointer", None)
+
+    def on_threads_pruned(self, thread_ids: Iterable[str]) -> None:
+        """Un hilo podado ya no tiene checkpoint que reanudar: sale de la
+        espera y libera a su doctor."""
+        thread_ids = list(thread_ids)
+        for thread_id in thread_ids:
+            self.waitlist.discard(thread_id)
+        if thread_ids:
+            self.dispatcher.end_chats(thread_ids)
+        self.dispatcher.release_expired()
+
+    def on_doctor_available(
+        self, event: Optional[DoctorAvailable], dispatched: Iterable[str] = ()
+    ) -> None:
+        with self._lock:
+            self._dispatched.update(dispatched)
+            if self._drain_pending:
+                return
+            self._drain_pending = True
+            self._last = self._executor.submit(self._coalesced_drain)
+
+    def _coalesced_drain(self) -> list[str]:
+        with self._lock:
+            self._drain_pending = False
+        return self.drain()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Espera a que termine el último drenado encolado."""
+        if self._last is not None:
+            self._last.result(timeout)
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency or get_settings().waitlist_resume_concurrency
+
+    def _worker_pool(self) -> ThreadPoolExecutor:
+        # Se crea en el primer drenado: compilar el grafo no lee la configuración.
+        with self._lock:
+            if self._workers is None:
+                self._max_concurrency = self.max_concurrency
+                self._workers = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="waitlist-resume"
+                )
+            return self._workers
+
+    def drain(self) -> list[str]:
+        """Reanuda los hilos que pueden atenderse; retorna sus ids.
+
+        Primero los de la cola de despacho que ya tienen doctor y luego los
+        de la lista de espera, tantos como doctores sigan libres.
+        """
+        workers = self._worker_pool()
+        with self._lock:
+            dispatched, self._dispatched = list(self._dispatched), set()
+        resumed = [
+            thread_id
+            for thread_id, ok in zip(dispatched, workers.map(self._resume_dispatched, dispatched))
+            if ok
+        ]
+
+        with get_session() as session:
+            capacity = len(DoctorService.get_available_doctors(session))
+        waiting: list[str] = []
+        entries = iter(self.waitlist.ordered())
+        while len(waiting) < capacity:
+            batch = list(islice(entries, min(self.max_concurrency, capacity - len(waiting))))
+            if not batch:
+                break
+            outcomes = workers.map(self._resume, batch)
+            waiting.extend(
+                entry.thread_id for entry, ok in zip(batch, outcomes) if ok
+            )
+        return resumed + waiting
+
+    def _resume_dispatched(self, thread_id: str) -> bool:
+        """Reanuda un hilo de la cola de despacho para que recoja su doctor."""
+        try:
+            if pending_interrupt_type(self.graph, thread_id) != DOCTOR_QUEUE_INTERRUPT_TYPE:
+                return False
+            config = {"configurable": {"thread_id": thread_id}}
+            self.graph.invoke(Command(resume={"retry": True}), config)
+        except Exception:
+            logger.exception("No se pudo reanudar el hilo %s", thread_id)
+            return False
+        return True
+
+    def _resume(self, entry: WaitingThread) -> bool:
+        try:
+            if pending_interrupt_type(self.graph, entry.thread_id) != WAITING_INTERRUPT_TYPE:
+                self.waitlist.discard(entry.thread_id)
+                return False
+            config = {"configurable": {"thread_id": entry.thread_id}}
+            self.graph.invoke(Command(resume={"retry": True}), config)
+        except Exception:
+            logger.exception("No se pudo reanudar el hilo %s", entry.thread_id)
+            return False
+        self.waitlist.discard(entry.thread_id)
+        return True
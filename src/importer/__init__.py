@@ -0,0 +1,3 @@
+from src.importer.pipeline import ImportProgress, PatientImporter, read_records
+
+__all__ = ["ImportProgress", "PatientImporter", "read_records"]
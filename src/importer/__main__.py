@@ -0,0 +1,50 @@
+"""Importación masiva: `python -m src.importer pacientes.csv --batch-size 2000`.
+
+Guarda el avance en `<archivo>.checkpoint.json`; si se interrumpe, volver a
+ejecutar el mismo comando continúa desde el último lote confirmado.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Importa pacientes e historial desde CSV o JSONL")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", type=Path, help="por defecto <source>.checkpoint.json")
+    parser.add_argument("--database-url", help="por defecto la de la configuración")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from src.database.connection import ensure_database
+    from src.importer.pipeline import ImportProgress, PatientImporter
+
+    def report(progress: ImportProgress) -> None:
+        print(
+            f"{progress.records} registros ({progress.records_per_s:.0f}/s): "
+            f"{progress.created} nuevos, {progress.updated} actualizados, "
+            f"{progress.history_added} historiales, {progress.rejected} rechazados",
+            flush=True,
+        )
+
+    ensure_database()
+    checkpoint = args.checkpoint or args.source.with_name(args.source.name + ".checkpoint.json")
+    importer = PatientImporter(args.batch_size, checkpoint, on_progress=report)
+    progress = importer.run(args.source)
+
+    for number, message in progress.errors:
+        print(f"registro {number}: {message}", file=sys.stderr)
+    if progress.rejected > len(progress.errors):
+        print(f"... y {progress.rejected - len(progress.errors)} rechazos más", file=sys.stderr)
+    if progress.emails_skipped:
+        print(f"{progress.emails_skipped} emails ya pertenecían a otro paciente", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
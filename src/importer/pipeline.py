@@ -0,0 +1,170 @@
+"""Importación masiva de pacientes e historial desde CSV o JSONL.
+
+El archivo se lee en streaming y se escribe por lotes: cada lote se valida
+con `PatientImport`, se inserta con `PatientService.import_patients` en una
+transacción y recién entonces se guarda el checkpoint. La memoria depende
+del tamaño del lote, no del archivo.
+
+Formatos:
+
+- JSONL: un paciente por línea, `{"name", "phone", "email", "history": [...]}`
+  con `{"diagnosis", "treatment", "notes", "date"}` en cada registro.
+- CSV: columnas `name, phone, email, diagnosis, treatment, notes, date`; una
+  fila por registro de historial. Las filas del mismo teléfono se combinan
+  y una fila sin diagnóstico ni tratamiento solo carga el paciente.
+
+Si la importación se interrumpe, volver a ejecutarla con el mismo
+checkpoint salta los registros ya confirmados. Un corte entre el commit y
+el checkpoint reaplica a lo sumo un lote, que el upsert vuelve inofensivo.
+"""
+
+import csv
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from pydantic import ValidationError
+
+from src.database.connection import get_session
+from src.schemas.models import PatientImport
+from src.services.patient_service import PatientService
+
+HISTORY_COLUMNS = ("diagnosis", "treatment", "notes", "date")
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportProgress:
+    """Totales acumulados; también es el contenido del checkpoint."""
+
+    source: str
+    source_size: int
+    records: int = 0
+    created: int = 0
+    updated: int = 0
+    history_added: int = 0
+    emails_skipped: int = 0
+    rejected: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    @property
+    def records_per_s(self) -> float:
+        return self.records / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def read_records(path: Path) -> Iterator[tuple[int, Any]]:
+    """(número de registro, datos crudos) en el orden del archivo.
+
+    Una línea JSONL ilegible se entrega como la excepción que produjo, para
+    reportarla sin cortar la importación.
+    """
+    suffix = path.suffix.lower()
+    with path.open(encoding="utf-8", newline="") as source:
+        if suffix == ".csv":
+            for number, row in enumerate(csv.DictReader(source), start=1):
+                yield number, _csv_record(row)
+        elif suffix in (".jsonl", ".ndjson"):
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield number, exc
+        else:
+            raise ValueError(f"Formato no soportado: {path.suffix} (use .csv o .jsonl)")
+
+
+def _csv_record(row: dict[str, Optional[str]]) -> dict[str, Any]:
+    values = {key: (value or "").strip() or None for key, value in row.items() if key}
+    history = {column: values.get(column) for column in HISTORY_COLUMNS}
+    return {
+        "name": values.get("name"),
+        "phone": values.get("phone"),
+        "email": values.get("email"),
+        "history": [history] if history["diagnosis"] or history["treatment"] else [],
+    }
+
+
+class PatientImporter:
+    """Importa un archivo por lotes con progreso y checkpoint reanudable."""
+
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        checkpoint_path: Optional[Path] = None,
+        on_progress: Optional[Callable[[ImportProgress], None]] = None,
+    ) -> None:
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.on_progress = on_progress
+
+    def run(self, source: Path) -> ImportProgress:
+        """Importa `source`; reanuda desde el checkpoint si existe."""
+        progress = self._load_checkpoint(source)
+        started = time.perf_counter() - progress.elapsed_s
+        records = islice(read_records(source), progress.records, None)
+
+        while batch := list(islice(records, self.batch_size)):
+            valid = []
+            for number, raw in batch:
+                try:
+                    if isinstance(raw, Exception):
+                        raise ValueError(f"JSON inválido: {raw}")
+                    valid.append(PatientImport.model_validate(raw))
+                except (ValueError, ValidationError) as exc:
+                    progress.rejected += 1
+                    if len(progress.errors) < MAX_REPORTED_ERRORS:
+                        progress.errors.append((number, _error_message(exc)))
+
+            with get_session() as session:
+                result = PatientService.import_patients(session, valid)
+
+            progress.records += len(batch)
+            progress.created += result.created
+            progress.updated += result.updated
+            progress.history_added += result.history_added
+            progress.emails_skipped += result.emails_skipped
+            progress.elapsed_s = time.perf_counter() - started
+            self._save_checkpoint(progress)
+            if self.on_progress:
+                self.on_progress(progress)
+
+        if self.checkpoint_path:
+            self.checkpoint_path.unlink(missing_ok=True)
+        return progress
+
+    def _load_checkpoint(self, source: Path) -> ImportProgress:
+        fresh = ImportProgress(source=str(source), source_size=source.stat().st_size)
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return fresh
+        data = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        saved = ImportProgress(**{**data, "errors": [tuple(e) for e in data["errors"]]})
+        if (saved.source, saved.source_size) != (fresh.source, fresh.source_size):
+            raise ValueError(
+                f"El checkpoint {self.checkpoint_path} corresponde a otro archivo "
+                f"({saved.source}); bórrelo para empezar de nuevo"
+            )
+        return saved
+
+    def _save_checkpoint(self, progress: ImportProgress) -> None:
+        if not self.checkpoint_path:
+            return
+        partial = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        partial.write_text(json.dumps(asdict(progress)), encoding="utf-8")
+        os.replace(partial, self.checkpoint_path)
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        )
+    return str(exc)
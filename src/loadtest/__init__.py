@@ -0,0 +1,13 @@
+from src.loadtest.runner import ConversationReplayer, PhaseResult, format_report
+from src.loadtest.scenarios import SCENARIOS, Scenario
+from src.loadtest.stub_llm import StubChatModel, stub_llm_factory
+
+__all__ = [
+    "ConversationReplayer",
+    "PhaseResult",
+    "SCENARIOS",
+    "Scenario",
+    "StubChatModel",
+    "format_report",
+    "stub_llm_factory",
+]
@@ -0,0 +1,61 @@
+"""Prueba de carga sin conexión: `python -m src.loadtest --rate 10 --conversations 200`.
+
+Usa el backend de datos en memoria y un LLM simulado, salvo que se indique
+otra `--database-url`.
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reproduce conversaciones contra el grafo")
+    parser.add_argument("--conversations", type=int, default=100, help="por fase")
+    parser.add_argument("--rate", type=float, default=10.0, help="llegadas por segundo")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--phases", default="open,closed", help="open, closed o ambas")
+    parser.add_argument("--database-url", default="memory://")
+    parser.add_argument("--checkpoints", help="archivo SQLite; por defecto en memoria")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", type=Path, help="guarda el reporte en JSON")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("GOOGLE_API_KEY", "loadtest")
+
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from src.agents.llm import set_llm_factory
+    from src.database.connection import init_db, seed_demo_data
+    from src.graph.checkpointer import SqliteCheckpointer
+    from src.graph.graph import create_dental_graph
+    from src.graph.serde import CompactSerializer
+    from src.loadtest.runner import ConversationReplayer, format_report
+    from src.loadtest.stub_llm import stub_llm_factory
+
+    set_llm_factory(stub_llm_factory(args.llm_latency_ms / 1000))
+    init_db()
+    seed_demo_data()
+    checkpointer = (
+        SqliteCheckpointer(args.checkpoints, serde=CompactSerializer())
+        if args.checkpoints
+        else InMemorySaver()
+    )
+    replayer = ConversationReplayer(create_dental_graph(checkpointer), seed=args.seed)
+
+    reports = [
+        replayer.run_phase(
+            roster.strip(), args.conversations, args.rate, args.concurrency
+        ).report()
+        for roster in args.phases.split(",")
+    ]
+    print(format_report(reports))
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
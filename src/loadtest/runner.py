@@ -0,0 +1,215 @@
+"""Reproduce conversaciones guionadas contra el grafo a una tasa objetivo."""
+
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from langgraph.types import Command
+
+from src.database.connection import get_session
+from src.graph.dispatch import get_dispatcher
+from src.graph.graph import get_initial_state, get_turn_input
+from src.loadtest.scenarios import Resume, Say, Scenario, scenarios_for_roster
+from src.services.doctor_service import DoctorService
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentil por rango más cercano; 0 si no hay muestras."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyRecorder:
+    """Acumula latencias por nombre de forma segura entre hilos."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: dict[str, list[float]] = defaultdict(list)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+        return [
+            {
+                "name": name,
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+            for name, values in sorted(samples.items())
+        ]
+
+
+@dataclass
+class PhaseResult:
+    roster: str
+    conversations: int = 0
+    turns: int = 0
+    errors: list[str] = field(default_factory=list)
+    wall_s: float = 0.0
+    nodes: LatencyRecorder = field(default_factory=LatencyRecorder)
+    turn_latency: LatencyRecorder = field(default_factory=LatencyRecorder)
+    queue_wait: LatencyRecorder = field(default_factory=LatencyRecorder)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count_turn(self) -> None:
+        with self._lock:
+            self.turns += 1
+
+    def count_conversation(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            if error is None:
+                self.conversations += 1
+            else:
+                self.errors.append(error)
+
+    def report(self) -> dict[str, Any]:
+        wall = self.wall_s or 1e-9
+        return {
+            "roster": self.roster,
+            "conversations": self.conversations,
+            "turns": self.turns,
+            "errors": len(self.errors),
+            "wall_s": round(self.wall_s, 3),
+            "conversations_per_s": round(self.conversations / wall, 2),
+            "turns_per_s": round(self.turns / wall, 2),
+            "turn_latency": self.turn_latency.stats(),
+            "nodes": self.nodes.stats(),
+            "queue_wait": self.queue_wait.stats(),
+        }
+
+
+def set_roster(roster: str) -> None:
+    """Marca a todos los doctores como disponibles (`open`) o no (`closed`)."""
+    with get_session() as session:
+        DoctorService.set_clinic_availability(session, roster == "open")
+
+
+class ConversationReplayer:
+    """Ejecuta los guiones sobre un grafo compilado y mide cada nodo y turno."""
+
+    def __init__(self, graph, seed: Optional[int] = None) -> None:
+        self.graph = graph
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _choose(self, scenarios: list[Scenario]) -> Scenario:
+        with self._random_lock:
+            return self._random.choices(scenarios, weights=[s.weight for s in scenarios])[0]
+
+    def _run_step(self, graph_input, config: dict, result: PhaseResult) -> Optional[dict]:
+        """Ejecuta un turno; retorna el valor del interrupt si quedó pendiente.
+
+        La latencia de cada nodo se mide entre actualizaciones consecutivas del
+        stream, por lo que incluye la lectura y escritura del checkpoint.
+        """
+        pending = None
+        last = time.perf_counter()
+        for chunk in self.graph.stream(graph_input, config, stream_mode="updates"):
+            now = time.perf_counter()
+            for node, _ in chunk.items():
+                if node == "__interrupt__":
+                    pending = chunk[node][0].value
+                else:
+                    result.nodes.record(node, now - last)
+            last = now
+        return pending
+
+    def run_conversation(self, scenario: Scenario, phone: str, result: PhaseResult) -> None:
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        pending: Optional[dict] = None
+        for index, step in enumerate(scenario.steps):
+            if isinstance(step, Say):
+                graph_input = get_turn_input(step.text)
+                if index == 0:
+                    graph_input = {**get_initial_state(phone), **graph_input}
+                label = f"{scenario.name}.{index}.message"
+            elif isinstance(step, Resume):
+                if pending is None:
+                    raise RuntimeError(f"{scenario.name}: no hay interrupt que reanudar")
+                graph_input = Command(resume=step.factory(pending))
+                label = f"{scenario.name}.{index}.{step.label}"
+            started = time.perf_counter()
+            pending = self._run_step(graph_input, config, result)
+            elapsed = time.perf_counter() - started
+            result.turn_latency.record(label, elapsed)
+            result.turn_latency.record("all", elapsed)
+            result.count_turn()
+        # El paciente cierra el chat, como lo haría la interfaz.
+        get_dispatcher().end_chat(config["configurable"]["thread_id"])
+
+    def run_phase(
+        self,
+        roster: str,
+        conversations: int,
+        rate: float,
+        concurrency: int,
+    ) -> PhaseResult:
+        """Lanza `conversations` conversaciones a `rate` llegadas por segundo (Poisson)."""
+        set_roster(roster)
+        scenarios = scenarios_for_roster(roster)
+        result = PhaseResult(roster=roster)
+
+        def task(scenario: Scenario, phone: str, scheduled: float) -> None:
+            result.queue_wait.record(scenario.name, time.perf_counter() - scheduled)
+            try:
+                self.run_conversation(scenario, phone, result)
+            except Exception as exc:
+                result.count_conversation(error=f"{scenario.name}: {exc!r}")
+            else:
+                result.count_conversation()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            next_arrival = started
+            for _ in range(conversations):
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                phone = f"7{uuid.uuid4().int % 10**8:08d}"
+                futures.append(
+                    executor.submit(task, self._choose(scenarios), phone, time.perf_counter())
+                )
+                if rate > 0:
+                    with self._random_lock:
+                        next_arrival += self._random.expovariate(rate)
+            wait(futures)
+        result.wall_s = time.perf_counter() - started
+        return result
+
+
+def format_report(phases: list[dict[str, Any]]) -> str:
+    """Tabla de texto con el rendimiento y las latencias de cada fase."""
+    lines = []
+    header = f"{'':<40}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    for phase in phases:
+        lines.append(
+            f"== Fase {phase['roster']}: {phase['conversations']} conversaciones, "
+            f"{phase['turns']} turnos en {phase['wall_s']} s "
+            f"({phase['turns_per_s']} turnos/s, {phase['errors']} errores)"
+        )
+        for title in ("turn_latency", "nodes", "queue_wait"):
+            lines.append(f"-- {title}")
+            lines.append(header)
+            for row in phase[title]:
+                lines.append(
+                    f"{row['name']:<40}{row['count']:>6}{row['p50_ms']:>10}"
+                    f"{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                )
+    return "\n".join(lines)
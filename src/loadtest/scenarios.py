@@ -0,0 +1,87 @@
+"""Conversaciones guionadas que recorren cada flujo del grafo."""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Union
+
+ResumeFactory = Callable[[dict], Any]
+
+
+@dataclass(frozen=True)
+class Say:
+    """Turno del paciente con un mensaje nuevo."""
+
+    text: str
+
+
+@dataclass(frozen=True)
+class Resume:
+    """Reanuda el interrupt pendiente con el valor que calcula `factory`."""
+
+    factory: ResumeFactory
+    label: str = "resume"
+
+
+Step = Union[Say, Resume]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Guion de conversación; `roster` limita la fase en la que tiene sentido."""
+
+    name: str
+    steps: list[Step]
+    weight: float = 1.0
+    roster: Optional[str] = None
+
+
+def pick_first_slot(payload: dict) -> dict:
+    slots = payload.get("slots") or []
+    return {"slot_id": slots[0]["slot_id"] if slots else None}
+
+
+def retry_availability(payload: dict) -> dict:
+    return {"retry": True}
+
+
+GENERAL = Scenario(
+    "general",
+    [
+        Say("Hola, ¿cuánto cuesta una limpieza dental?"),
+        Say("¿Cada cuánto debo ir al dentista?"),
+        Say("¿Qué tratamientos ofrecen para blanqueamiento?"),
+    ],
+    weight=5,
+)
+
+URGENCY_WITH_SLOT = Scenario(
+    "urgency_slot",
+    [
+        Say("Tengo un dolor muy fuerte en la muela que no me deja dormir"),
+        Resume(pick_first_slot, "slot_selection"),
+    ],
+    weight=3,
+    roster="open",
+)
+
+URGENCY_NO_DOCTORS = Scenario(
+    "urgency_no_doctors",
+    [
+        Say("Se me rompió un diente y me duele mucho"),
+        Resume(retry_availability, "availability_retry"),
+    ],
+    weight=3,
+    roster="closed",
+)
+
+EMERGENCY = Scenario(
+    "emergency",
+    [Say("Tuve un accidente y no paro de sangrar de la boca")],
+    weight=1,
+)
+
+SCENARIOS = [GENERAL, URGENCY_WITH_SLOT, URGENCY_NO_DOCTORS, EMERGENCY]
+
+
+def scenarios_for_roster(roster: str) -> list[Scenario]:
+    """Guiones compatibles con la fase: doctores disponibles (`open`) o no (`closed`)."""
+    return [s for s in SCENARIOS if s.roster in (None, roster)]
@@ -0,0 +1,50 @@
+"""Modelo de chat simulado para ejecutar el grafo sin conexión."""
+
+import random
+import time
+from dataclasses import dataclass
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from src.agents.prompts import CLASSIFIER_SYSTEM_PROMPT
+
+EMERGENCY_KEYWORDS = ("respirar", "sangrar", "mareado", "inconsciente", "fiebre")
+URGENCY_KEYWORDS = ("dolor", "rompió", "hinchada", "absceso", "sangra")
+
+
+def classify_by_keywords(message: str) -> str:
+    text = message.lower()
+    if any(word in text for word in EMERGENCY_KEYWORDS):
+        return "emergency"
+    if any(word in text for word in URGENCY_KEYWORDS):
+        return "urgency"
+    return "general"
+
+
+@dataclass
+class StubChatModel:
+    """Responde como Gemini sin red, con latencia simulada.
+
+    Clasifica por palabras clave cuando recibe el prompt del clasificador y
+    retorna una respuesta fija en cualquier otro caso.
+    """
+
+    latency_s: float = 0.0
+    jitter: float = 0.2
+
+    def invoke(self, messages: list[BaseMessage]) -> AIMessage:
+        if self.latency_s:
+            spread = self.latency_s * self.jitter
+            time.sleep(max(0.0, random.uniform(self.latency_s - spread, self.latency_s + spread)))
+        if messages and messages[0].content == CLASSIFIER_SYSTEM_PROMPT:
+            return AIMessage(content=classify_by_keywords(messages[-1].content))
+        return AIMessage(content="Gracias por tu consulta. Te ayudamos enseguida.")
+
+
+def stub_llm_factory(latency_s: float = 0.0):
+    """Fábrica compatible con `set_llm_factory`."""
+
+    def factory(temperature: float) -> StubChatModel:
+        return StubChatModel(latency_s=latency_s)
+
+    return factory
@@ -3,17 +3,20 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import json
 import uuid
+from datetime import date
 
 import streamlit as st
-from langchain_core.messages import AIMessage, HumanMessage
-from langgraph.types import Command
 
-from src.database.connection import get_session, init_db, seed_demo_data
-from src.graph.graph import create_dental_graph, get_initial_state
+from src.database.connection import ensure_database, get_session
+from src.database.instrumentation import get_query_monitor, track_section
+from src.graph.transcript import TranscriptSync
+from src.schemas.phone import normalize_phone
 from src.services.appointment_service import AppointmentService
 from src.services.doctor_service import DoctorService
 from src.services.patient_service import PatientService
+from src.services.read_cache import get_sidebar_cache
 
 # Branding
 BRAND_NAME = "MuelAI"
@@ -145,18 +148,23 @@ def inject_custom_css():
 
 
 def initialize_app():
-    """Inicializa la aplicación y la base de datos."""
-    if "initialized" not in st.session_state:
-        init_db()
-        seed_demo_data()
-        st.session_state.initialized = True
+    """Inicializa la base de datos una sola vez por proceso.
+
+    LangChain, LangGraph y el cliente de Gemini no se importan aquí: se
+    cargan con el primer mensaje (ver `get_graph`).
+    """
+    ensure_database()
+
+
+def get_graph():
+    """Grafo compartido del proceso; importa la pila del LLM en el primer uso."""
+    from src.graph.graph import get_dental_graph
+
+    return get_dental_graph()
 
 
 def initialize_session():
     """Inicializa el estado de la sesión de Streamlit."""
-    if "graph" not in st.session_state:
-        st.session_state.graph = create_dental_graph()
-
     if "thread_id" not in st.session_state:
         st.session_state.thread_id = str(uuid.uuid4())
 
@@ -172,9 +180,15 @@ def initialize_session():
     if "messages_display" not in st.session_state:
         st.session_state.messages_display = []
 
+    if "transcript" not in st.session_state:
+        st.session_state.transcript = TranscriptSync()
+
     if "pending_interrupt" not in st.session_state:
         st.session_state.pending_interrupt = None
 
+    if "pending_submission" not in st.session_state:
+        st.session_state.pending_submission = None
+
 
 def render_sidebar():
     """Renderiza el panel lateral con información y controles."""
@@ -186,57 +200,50 @@ def render_sidebar():
     st.sidebar.markdown("---")
 
     st.sidebar.subheader("Identificación del Paciente")
-    phone = st.sidebar.text_input(
-        "Número de Teléfono",
-        value=st.session_state.patient_phone,
-        placeholder="Ej: 999888777",
-        help="Ingresa tu número de teléfono para identificarte",
+    phone = normalize_phone(
+        st.sidebar.text_input(
+            "Número de Teléfono",
+            value=st.session_state.patient_phone,
+            placeholder="Ej: 999888777",
+            help="Ingresa tu número de teléfono para identificarte",
+        )
     )
 
     if phone != st.session_state.patient_phone:
+        end_current_chat()
         st.session_state.patient_phone = phone
         st.session_state.thread_id = str(uuid.uuid4())
         st.session_state.conversation_state = None
         st.session_state.messages_display = []
+        st.session_state.transcript = TranscriptSync()
+        st.session_state.pending_submission = None
         st.rerun()
 
     st.sidebar.markdown("---")
 
     if st.session_state.patient_phone:
-        with get_session() as session:
-            patient = PatientService.get_patient_by_phone(
-                session, st.session_state.patient_phone
-            )
-            if patient:
-                st.sidebar.success(f"Paciente: {patient.name}")
+        with track_section("sidebar.patient"):
+            context = get_sidebar_cache().patient_context(st.session_state.patient_phone)
+        if context:
+            st.sidebar.success(f"Paciente: {context.name}")
+
+            appointments = context.upcoming_appointments
+            with st.sidebar.expander("📅 Mis Citas Agendadas"):
+                if appointments:
+                    for apt in appointments[:5]:
+                        dt_str = apt.scheduled_at.strftime("%d/%m/%Y %H:%M")
+                        st.markdown(
+                            f"- **{dt_str}** con {apt.doctor_name} ({apt.status})"
+                        )
+                    if len(appointments) > 5:
+                        st.caption(f"+ {len(appointments) - 5} más")
+                else:
+                    st.caption("No tienes citas agendadas")
 
-                appointments = AppointmentService.get_patient_appointments(
-                    session, patient.id
-                )
-                with st.sidebar.expander("📅 Mis Citas Agendadas"):
-                    if appointments:
-                        for apt in appointments[:5]:
-                            dt = apt.scheduled_at
-                            dt_str = (
-                                dt.strftime("%d/%m/%Y %H:%M")
-                                if hasattr(dt, "strftime")
-                                else str(dt)
-                            )
-                            st.markdown(
-                                f"- **{dt_str}** con {apt.doctor.name} ({apt.status})"
-                            )
-                        if len(appointments) > 5:
-                            st.caption(f"+ {len(appointments) - 5} más")
-                    else:
-                        st.caption("No tienes citas agendadas")
-
-                history = PatientService.get_medical_history_summary(
-                    session, patient.id
-                )
-                with st.sidebar.expander("Ver Historial Clínico"):
-                    st.markdown(history)
-            else:
-                st.sidebar.info("Paciente no registrado (se creará automáticamente)")
+            with st.sidebar.expander("Ver Historial Clínico"):
+                st.markdown(context.history_summary)
+        else:
+            st.sidebar.info("Paciente no registrado (se creará automáticamente)")
 
     st.sidebar.markdown("---")
     st.sidebar.subheader("Estado del Sistema")
@@ -274,59 +281,269 @@ def render_sidebar():
     st.sidebar.subheader("Panel de Administración")
 
     with st.sidebar.expander("Gestionar Doctores"):
-        with get_session() as session:
-            doctors = DoctorService.get_all_doctors(session)
+        with track_section("sidebar.doctors"):
+            doctors = get_sidebar_cache().doctor_roster()
 
+        with st.form("doctor_availability"):
+            availability = {}
             for doc in doctors:
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    status = "🟢" if doc.is_available else "🔴"
-                    st.markdown(f"{status} **{doc.doctor_name}**")
-                    st.caption(doc.specialty)
-
-                with col2:
-                    if st.button(
-                        "Cambiar",
-                        key=f"toggle_{doc.doctor_id}",
-                        help="Activar/Desactivar disponibilidad",
-                    ):
-                        DoctorService.set_doctor_availability(
-                            session, doc.doctor_id, not doc.is_available
-                        )
-                        session.commit()
-                        st.rerun()
+                # La clave incluye el estado: tras un cambio masivo el
+                # checkbox se recrea con el valor nuevo.
+                availability[doc.doctor_id] = st.checkbox(
+                    doc.doctor_name,
+                    value=doc.is_available,
+                    key=f"available_{doc.doctor_id}_{doc.is_available}",
+                    help=doc.specialty,
+                )
+            if st.form_submit_button("Aplicar cambios"):
+                with get_session() as session:
+                    DoctorService.set_availability_bulk(session, availability)
+                st.rerun()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            open_clinic = st.button("Abrir clínica", key="open_clinic")
+        with col2:
+            close_clinic = st.button("Cerrar clínica", key="close_clinic")
+        if open_clinic or close_clinic:
+            with get_session() as session:
+                DoctorService.set_clinic_availability(session, open_clinic)
+            st.rerun()
+
+    render_operator_console()
+    render_history_search()
+    render_query_metrics()
 
     if st.sidebar.button("Nueva Conversación", type="secondary"):
+        end_current_chat()
         st.session_state.thread_id = str(uuid.uuid4())
         st.session_state.conversation_state = None
         st.session_state.messages_display = []
+        st.session_state.transcript = TranscriptSync()
+        st.session_state.pending_submission = None
         st.session_state.awaiting_human = False
         st.session_state.pending_interrupt = None
         st.rerun()
 
 
+def end_current_chat():
+    """Termina el chat que se abandona: su doctor queda libre para otros."""
+    if st.session_state.conversation_state is None:
+        return
+    from src.graph.dispatch import get_dispatcher
+
+    get_dispatcher().end_chat(st.session_state.thread_id)
+
+
+def render_operator_console():
+    """Consola del operador; el grafo solo se carga al activarla."""
+    if not st.sidebar.toggle("Consola de operador", key="operator_console"):
+        return
+    with st.sidebar:
+        operator_console_fragment()
+
+
+def format_wait(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes} min {seconds:02d} s"
+
+
+@st.fragment(run_every=5)
+def operator_console_fragment():
+    """Urgencias en espera y doctores ocupados; se refresca sin rerun completo."""
+    from src.graph.operator_console import OperatorConsole
+
+    console = OperatorConsole(get_graph())
+    snapshot = console.snapshot()
+    names = {doc.doctor_id: doc.doctor_name for doc in snapshot.doctors}
+
+    st.caption(
+        f"{len(snapshot.waiting)} en espera · "
+        f"{len(snapshot.busy_doctors)} doctores ocupados · "
+        f"{len(snapshot.free_doctors)} libres"
+    )
+    if snapshot.waiting:
+        st.dataframe(
+            [
+                {
+                    "Hilo": case.thread_id[:8],
+                    "Teléfono": case.patient_phone or "-",
+                    "Espera": format_wait(case.waited_s),
+                }
+                for case in snapshot.waiting
+            ],
+            hide_index=True,
+        )
+
+    if snapshot.busy_doctors:
+        st.dataframe(
+            [
+                {"Doctor": doc.doctor_name, "Chat": doc.current_chat_id[:8]}
+                for doc in snapshot.busy_doctors
+            ],
+            hide_index=True,
+        )
+        to_release = st.multiselect(
+            "Liberar doctores",
+            [doc.doctor_id for doc in snapshot.busy_doctors],
+            format_func=names.get,
+            key="operator_release",
+        )
+        if to_release and st.button("Liberar seleccionados"):
+            released = console.release_doctors(to_release)
+            st.toast(f"{len(released)} doctores liberados")
+            st.rerun(scope="fragment")
+
+    if snapshot.waiting and snapshot.free_doctors:
+        free_ids = [doc.doctor_id for doc in snapshot.free_doctors]
+        with st.form("operator_assign"):
+            assignments = {}
+            for case in snapshot.waiting:
+                choice = st.selectbox(
+                    f"{case.thread_id[:8]} ({case.patient_phone or '-'})",
+                    [None, *free_ids],
+                    format_func=lambda i: "Sin asignar" if i is None else names[i],
+                    key=f"operator_assign_{case.thread_id}",
+                )
+                if choice is not None:
+                    assignments[case.thread_id] = choice
+            if st.form_submit_button("Asignar doctores") and assignments:
+                assigned = console.assign(assignments)
+                st.toast(f"{len(assigned)} conversaciones reanudadas")
+                st.rerun(scope="fragment")
+
+
+def render_history_search():
+    """Búsqueda de texto completo en los historiales clínicos (personal)."""
+    with st.sidebar.expander("Buscar en Historiales"):
+        query = st.text_input("Términos", key="history_search", placeholder="Ej: caries")
+        if not query:
+            return
+        with track_section("sidebar.history_search"), get_session() as session:
+            results = [
+                (record.patient_id, record.date, record.diagnosis, record.treatment)
+                for record in PatientService.search_medical_history(
+                    session, query, limit=10
+                )
+            ]
+        if not results:
+            st.caption("Sin resultados")
+        for patient_id, date, diagnosis, treatment in results:
+            st.markdown(
+                f"- **{diagnosis}** (paciente #{patient_id}, {date.strftime('%d/%m/%Y')})"
+            )
+            st.caption(treatment)
+
+
+def render_query_metrics():
+    """Muestra las métricas de SQL por sección y el log de consultas lentas."""
+    monitor = get_query_monitor()
+    with st.sidebar.expander("Métricas SQL"):
+        summary = monitor.summary()
+        if not summary:
+            st.caption("Sin consultas registradas")
+            return
+        st.dataframe(
+            [
+                {
+                    "Sección": s["section"],
+                    "Sentencias": s["statement_count"],
+                    "Total ms": s["total_ms"],
+                }
+                for s in summary
+            ],
+            hide_index=True,
+        )
+        slow_queries = monitor.slow_queries()
+        st.caption(
+            f"Consultas lentas (≥ {monitor.slow_threshold_ms:.0f} ms): {len(slow_queries)}"
+        )
+        for query in slow_queries[-5:]:
+            st.code(f"[{query['section']}] {query['duration_ms']} ms\n{query['statement']}")
+        st.download_button(
+            "Exportar reporte",
+            data=json.dumps(monitor.report(), indent=2, ensure_ascii=False),
+            file_name="sql_report.json",
+            mime="application/json",
+        )
+
+
+def sync_transcript(messages):
+    """Añade al chat solo las respuestas del asistente que aún no se mostraron."""
+    st.session_state.messages_display.extend(
+        st.session_state.transcript.new_assistant_entries(messages)
+    )
+
+
 def resume_graph(resume_value):
     """Reanuda el grafo tras un interrupt con el valor proporcionado."""
+    from langgraph.types import Command
+
     config = {"configurable": {"thread_id": st.session_state.thread_id}}
-    result = st.session_state.graph.invoke(Command(resume=resume_value), config)
+    result = get_graph().invoke(Command(resume=resume_value), config)
     st.session_state.conversation_state = result
-    st.session_state.pending_interrupt = None
+    interrupts = result.get("__interrupt__") or None
+    st.session_state.pending_interrupt = interrupts
+    st.session_state.awaiting_human = bool(interrupts) or bool(result.get("awaiting_human"))
+    sync_transcript(result.get("messages", []))
 
-    for msg in result.get("messages", []):
-        if isinstance(msg, AIMessage):
-            already_displayed = any(
-                m["content"] == msg.content and m["role"] == "assistant"
-                for m in st.session_state.messages_display
-            )
-            if not already_displayed:
-                st.session_state.messages_display.append(
-                    {"role": "assistant", "content": msg.content}
-                )
+
+def sync_auto_resumed_thread():
+    """Recoge el estado si el hilo fue reanudado al liberarse un doctor."""
+    config = {"configurable": {"thread_id": st.session_state.thread_id}}
+    snapshot = get_graph().get_state(config)
+    interrupts = [i for task in snapshot.tasks for i in task.interrupts]
+    current = st.session_state.pending_interrupt or []
+    if [i.id for i in interrupts] == [getattr(i, "id", None) for i in current]:
+        return
+
+    st.session_state.conversation_state = snapshot.values
+    st.session_state.pending_interrupt = interrupts or None
+    st.session_state.awaiting_human = bool(interrupts) or bool(
+        snapshot.values.get("awaiting_human")
+    )
+    sync_transcript(snapshot.values.get("messages", []))
+
+
+def stored_submission_result(config: dict, key: str):
+    """Estado del hilo si el envío con esta clave ya se procesó; si no, None."""
+    from src.graph.idempotency import find_submission
+
+    snapshot = get_graph().get_state(config)
+    stored = find_submission(
+        snapshot.values.get("messages", []), key, paused=bool(snapshot.interrupts)
+    )
+    if stored is None:
+        return None
+    interrupts = snapshot.interrupts if stored.is_latest else ()
+    return {**snapshot.values, "__interrupt__": list(interrupts)}
+
+
+def execute_submission(config: dict, key: str, graph_input: dict):
+    """Ejecuta el envío; reanuda su turno si se cortó tras guardar el mensaje."""
+    from src.graph.idempotency import submission_input
+
+    graph = get_graph()
+    return graph.invoke(submission_input(graph.get_state(config), key, graph_input), config)
 
 
 def process_message(user_input: str):
-    """Procesa un mensaje del usuario a través del grafo."""
-    st.session_state.messages_display.append({"role": "user", "content": user_input})
+    """Procesa un mensaje del usuario a través del grafo.
+
+    El envío en curso se guarda en `pending_submission` con su clave de
+    idempotencia: si un rerun o un doble envío repite el mensaje antes de
+    que termine, se reutiliza la clave y se retorna el resultado del primero.
+    """
+    pending = st.session_state.pending_submission
+    if pending and pending["content"] == user_input:
+        submission_key = pending["key"]
+    else:
+        submission_key = str(uuid.uuid4())
+        st.session_state.pending_submission = {
+            "key": submission_key,
+            "content": user_input,
+        }
+        st.session_state.messages_display.append({"role": "user", "content": user_input})
 
     if not st.session_state.patient_phone:
         st.session_state.messages_display.append(
@@ -336,24 +553,32 @@ def process_message(user_input: str):
                 "Es necesario para identificarte y gestionar tu consulta.",
             }
         )
+        st.session_state.pending_submission = None
         return
 
+    from src.graph.graph import get_initial_state, get_turn_input
+    from src.graph.idempotency import get_submission_guard
+
     if st.session_state.conversation_state is None:
         initial_state = get_initial_state(st.session_state.patient_phone)
-        initial_state["messages"] = [HumanMessage(content=user_input)]
+        initial_state.update(get_turn_input(user_input, submission_key))
     else:
-        initial_state = st.session_state.conversation_state.copy()
-        initial_state["messages"] = initial_state["messages"] + [
-            HumanMessage(content=user_input)
-        ]
+        initial_state = get_turn_input(user_input, submission_key)
 
-    config = {"configurable": {"thread_id": st.session_state.thread_id}}
+    thread_id = st.session_state.thread_id
+    config = {"configurable": {"thread_id": thread_id}}
 
     try:
         with st.spinner("Procesando tu consulta..."):
-            result = st.session_state.graph.invoke(initial_state, config)
+            result = get_submission_guard().run(
+                thread_id,
+                submission_key,
+                lookup=lambda: stored_submission_result(config, submission_key),
+                execute=lambda: execute_submission(config, submission_key, initial_state),
+            )
 
         st.session_state.conversation_state = result
+        st.session_state.pending_submission = None
 
         if "__interrupt__" in result and result["__interrupt__"]:
             st.session_state.pending_interrupt = result["__interrupt__"]
@@ -361,18 +586,7 @@ def process_message(user_input: str):
         else:
             st.session_state.pending_interrupt = None
 
-        for msg in result.get("messages", []):
-            if isinstance(msg, AIMessage):
-                content = (msg.content or "").strip()
-                if content:
-                    already_displayed = any(
-                        m.get("content") == content and m.get("role") == "assistant"
-                        for m in st.session_state.messages_display
-                    )
-                    if not already_displayed:
-                        st.session_state.messages_display.append(
-                            {"role": "assistant", "content": content}
-                        )
+        sync_transcript(result.get("messages", []))
 
         if result.get("awaiting_human"):
             st.session_state.awaiting_human = True
@@ -385,9 +599,81 @@ def process_message(user_input: str):
         st.session_state.messages_display.append(
             {"role": "assistant", "content": error_msg}
         )
+        st.session_state.pending_submission = None
         st.error(f"Error: {str(e)}")
 
 
+def render_slot_buttons(slots: list[dict], key_prefix: str):
+    """Un botón por slot en una grilla de tres columnas."""
+    cols = st.columns(3)
+    for i, slot in enumerate(slots):
+        with cols[i % 3]:
+            if st.button(
+                f"📅 {slot['display']} - {slot['doctor_name']}",
+                key=f"{key_prefix}_{slot['slot_id']}",
+            ):
+                resume_graph({"slot_id": slot["slot_id"]})
+                st.rerun()
+
+
+def render_slot_picker(payload: dict):
+    """Selector de horarios: los próximos slots del interrupt y, bajo demanda,
+    las páginas de un día y doctor consultadas a la base de datos."""
+    from src.graph.nodes import slot_doctor_ids
+
+    st.markdown("**Selecciona un horario disponible para tu cita:**")
+    render_slot_buttons(payload.get("slots", []), key_prefix="next")
+
+    days = payload.get("days", [])
+    if not days:
+        return
+
+    with st.expander(f"Ver todos los horarios ({payload.get('total', 0)})"):
+        day_labels = {
+            day["date"]: f"{date.fromisoformat(day['date']).strftime('%d/%m/%Y')} "
+            f"({day['count']} horarios)"
+            for day in days
+        }
+        day = st.selectbox(
+            "Día", list(day_labels), format_func=day_labels.get, key="slot_day"
+        )
+
+        doctor_ids = slot_doctor_ids(st.session_state.conversation_state or {})
+        doctor_names = {
+            doc.doctor_id: doc.doctor_name
+            for doc in get_sidebar_cache().doctor_roster()
+            if (doc.is_available or doc.current_chat_id == st.session_state.thread_id)
+            and (doctor_ids is None or doc.doctor_id in doctor_ids)
+        }
+        doctor_id = st.selectbox(
+            "Doctor",
+            [None, *doctor_names],
+            format_func=lambda i: "Todos" if i is None else doctor_names[i],
+            key="slot_doctor",
+        )
+
+        page_key = (day, doctor_id)
+        if st.session_state.get("slot_page_key") != page_key:
+            st.session_state.slot_page_key = page_key
+            st.session_state.slot_page_limit = AppointmentService.SLOT_PAGE_SIZE
+
+        with track_section("chat.slot_page"), get_session() as session:
+            page = AppointmentService.get_slot_page(
+                session,
+                date.fromisoformat(day),
+                [doctor_id] if doctor_id is not None else doctor_ids,
+                limit=st.session_state.slot_page_limit,
+                chat_id=st.session_state.thread_id,
+            )
+
+        if not page["slots"]:
+            st.caption("No quedan horarios libres para este filtro")
+        render_slot_buttons(page["slots"], key_prefix="page")
+        if page["has_more"] and st.button("Más horarios"):
+            st.session_state.slot_page_limit += AppointmentService.SLOT_PAGE_SIZE
+            st.rerun()
+
+
 def render_chat():
     """Renderiza la interfaz de chat."""
     if not st.session_state.patient_phone:
@@ -403,6 +689,13 @@ def render_chat():
     )
     st.markdown("<br>", unsafe_allow_html=True)
 
+    if st.session_state.pending_submission:
+        # Un rerun cortó el envío anterior: se recupera su resultado.
+        process_message(st.session_state.pending_submission["content"])
+
+    if st.session_state.pending_interrupt:
+        sync_auto_resumed_thread()
+
     chat_container = st.container()
 
     with chat_container:
@@ -418,26 +711,25 @@ def render_chat():
 
             if isinstance(interrupt_value, dict):
                 if interrupt_value.get("type") == "slot_selection":
-                    slots = interrupt_value.get("slots", [])
-                    st.markdown("**Selecciona un horario disponible para tu cita:**")
-                    cols = st.columns(3)
-                    for i, slot in enumerate(slots):
-                        with cols[i % 3]:
-                            if st.button(
-                                f"📅 {slot.get('display', slot)} - {slot.get('doctor_name', '')}",
-                                key=f"slot_{slot.get('slot_id', i)}",
-                            ):
-                                resume_graph({"slot_id": slot["slot_id"]})
-                                st.rerun()
+                    render_slot_picker(interrupt_value)
 
                 elif interrupt_value.get("type") == "urgency_no_doctors":
                     st.warning(
                         "⏳ No hay doctores disponibles en este momento. "
-                        "Por favor, espera o verifica la disponibilidad."
+                        "Tu consulta se retomará sola en cuanto un doctor se libere."
                     )
                     if st.button("Verificar disponibilidad de doctores"):
                         resume_graph({"retry": True})
                         st.rerun()
+
+                elif interrupt_value.get("type") == "doctor_queue":
+                    st.info(
+                        f"⏳ {interrupt_value.get('message')} "
+                        "El chat se actualizará cuando un doctor se conecte."
+                    )
+                    if st.button("Verificar si ya hay un doctor"):
+                        resume_graph({"retry": True})
+                        st.rerun()
             else:
                 st.warning(
                     "⏳ Tu caso está siendo revisado. "
@@ -0,0 +1,51 @@
+from typing import Union
+
+from sqlalchemy.orm import Session
+
+from src.repositories.base import (
+    AppointmentRepository,
+    DoctorRepository,
+    PatientRepository,
+    Repositories,
+)
+from src.repositories.memory import (
+    InMemoryAppointmentRepository,
+    InMemoryDoctorRepository,
+    InMemoryPatientRepository,
+    InMemorySession,
+    InMemoryStore,
+)
+from src.repositories.sql import (
+    SqlAppointmentRepository,
+    SqlDoctorRepository,
+    SqlPatientRepository,
+)
+
+DataSession = Union[Session, InMemorySession]
+
+
+def get_repositories(session: DataSession) -> Repositories:
+    """Repositorios del backend correspondiente a la sesión."""
+    if isinstance(session, InMemorySession):
+        return Repositories(
+            patients=InMemoryPatientRepository(session),
+            doctors=InMemoryDoctorRepository(session),
+            appointments=InMemoryAppointmentRepository(session),
+        )
+    return Repositories(
+        patients=SqlPatientRepository(session),
+        doctors=SqlDoctorRepository(session),
+        appointments=SqlAppointmentRepository(session),
+    )
+
+
+__all__ = [
+    "AppointmentRepository",
+    "DataSession",
+    "DoctorRepository",
+    "InMemorySession",
+    "InMemoryStore",
+    "PatientRepository",
+    "Repositories",
+    "get_repositories",
+]
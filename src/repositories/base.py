@@ -0,0 +1,190 @@
+"""Contratos de repositorio que usan los servicios.
+
+Los servicios reciben una sesión y obtienen los repositorios con
+`get_repositories`; cada backend implementa estas interfaces con la misma
+semántica (orden, unicidad y valores por defecto).
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from src.database.models import (
+    Appointment,
+    Doctor,
+    DoctorSchedule,
+    MedicalHistory,
+    Patient,
+    PatientContext,
+)
+
+ACTIVE_APPOINTMENT_STATUSES = ("scheduled", "confirmed")
+
+
+class PatientRepository(ABC):
+    @abstractmethod
+    def get_by_id(self, patient_id: int) -> Optional[Patient]: ...
+
+    @abstractmethod
+    def get_by_phone(self, phone: str) -> Optional[Patient]: ...
+
+    @abstractmethod
+    def get_by_email(self, email: str) -> Optional[Patient]: ...
+
+    @abstractmethod
+    def get_with_history(self, patient_id: int) -> Optional[Patient]:
+        """Paciente con `medical_history` cargado."""
+
+    @abstractmethod
+    def add(self, patient: Patient) -> Patient:
+        """Persiste el paciente y le asigna id; falla si el teléfono o email existen."""
+
+    @abstractmethod
+    def list_by_phones(self, phones: Iterable[str]) -> list[Patient]: ...
+
+    @abstractmethod
+    def list_by_emails(self, emails: Iterable[str]) -> list[Patient]: ...
+
+    @abstractmethod
+    def add_many(self, patients: list[Patient]) -> list[Patient]:
+        """Inserta el lote en una sola escritura; mismas restricciones que `add`."""
+
+    @abstractmethod
+    def update(self, patient_id: int, **fields: Any) -> Optional[Patient]:
+        """Falla si el nuevo teléfono o email pertenecen a otro paciente."""
+
+    @abstractmethod
+    def update_many(self, changes: dict[int, dict[str, Any]]) -> None:
+        """Aplica `{id: campos}` en una sola escritura; mismas restricciones
+        que `update`. Todos los cambios deben tocar los mismos campos."""
+
+    @abstractmethod
+    def list_phones(self) -> list[tuple[int, str]]:
+        """(id, teléfono) de todos los pacientes ordenados por id."""
+
+    @abstractmethod
+    def merge(self, survivor_id: int, duplicate_ids: Iterable[int]) -> None:
+        """Pasa historial y citas de los duplicados al superviviente.
+
+        Los duplicados se eliminan junto con su snapshot de contexto.
+        """
+
+    @abstractmethod
+    def list_history(
+        self, patient_id: int, limit: Optional[int] = None
+    ) -> list[MedicalHistory]:
+        """Historial del paciente ordenado del más reciente al más antiguo."""
+
+    @abstractmethod
+    def search_history(
+        self, terms: list[str], patient_id: Optional[int] = None, limit: int = 5
+    ) -> list[MedicalHistory]:
+        """Registros que contienen algún término (por prefijo), más relevantes primero.
+
+        El diagnóstico pesa más que el tratamiento y este más que las notas.
+        """
+
+    @abstractmethod
+    def add_history(self, record: MedicalHistory) -> MedicalHistory: ...
+
+    @abstractmethod
+    def add_history_many(self, records: list[MedicalHistory]) -> list[MedicalHistory]: ...
+
+    @abstractmethod
+    def list_history_for(self, patient_ids: Iterable[int]) -> list[MedicalHistory]:
+        """Historial de varios pacientes en una lectura, sin orden garantizado."""
+
+    @abstractmethod
+    def get_context_by_phone(self, phone: str) -> Optional[PatientContext]:
+        """Lectura indexada del snapshot por teléfono."""
+
+    @abstractmethod
+    def get_context(self, patient_id: int) -> Optional[PatientContext]:
+        """Snapshot del paciente por su id."""
+
+    @abstractmethod
+    def save_context(
+        self, context: PatientContext, is_new: bool = False
+    ) -> PatientContext:
+        """Inserta o reemplaza el snapshot; `is_new` evita buscar el existente."""
+
+    @abstractmethod
+    def add_contexts(self, contexts: list[PatientContext]) -> None:
+        """Inserta snapshots de pacientes que aún no tienen uno."""
+
+    @abstractmethod
+    def replace_contexts(self, contexts: list[PatientContext]) -> None:
+        """Reemplaza los snapshots de esos pacientes en escrituras por lote."""
+
+    @abstractmethod
+    def list_ids_without_context(self) -> list[int]: ...
+
+
+class DoctorRepository(ABC):
+    @abstractmethod
+    def get_by_id(self, doctor_id: int) -> Optional[Doctor]: ...
+
+    @abstractmethod
+    def list_doctors(
+        self,
+        available_only: bool = False,
+        doctor_ids: Optional[Iterable[int]] = None,
+    ) -> list[Doctor]:
+        """Doctores ordenados por id."""
+
+    @abstractmethod
+    def add(self, doctor: Doctor) -> Doctor: ...
+
+    @abstractmethod
+    def update(self, doctor_id: int, **fields: Any) -> Optional[Doctor]: ...
+
+    @abstractmethod
+    def update_many(self, doctor_ids: Iterable[int], **fields: Any) -> int:
+        """Aplica los mismos campos a varios doctores; retorna cuántos cambió."""
+
+    @abstractmethod
+    def claim(self, doctor_id: int, chat_id: str) -> Optional[Doctor]:
+        """Asigna el chat solo si el doctor está disponible y libre (compare-and-set)."""
+
+    @abstractmethod
+    def list_schedules(self, doctor_ids: Iterable[int]) -> list[DoctorSchedule]:
+        """Horarios de los doctores indicados ordenados por id."""
+
+    @abstractmethod
+    def add_schedule(self, schedule: DoctorSchedule) -> DoctorSchedule: ...
+
+
+class AppointmentRepository(ABC):
+    @abstractmethod
+    def add(self, appointment: Appointment) -> Appointment: ...
+
+    @abstractmethod
+    def list_for_patient(
+        self, patient_id: int, since: Optional[datetime] = None
+    ) -> list[Appointment]:
+        """Citas del paciente (con `doctor` cargado), más recientes primero."""
+
+    @abstractmethod
+    def list_for_patients(
+        self, patient_ids: Iterable[int], since: Optional[datetime] = None
+    ) -> list[Appointment]:
+        """Citas de varios pacientes (con `doctor` cargado) en una lectura,
+        sin orden garantizado."""
+
+    @abstractmethod
+    def list_by_ids(self, appointment_ids: Iterable[int]) -> list[Appointment]:
+        """Citas indicadas (con `doctor` cargado), sin orden garantizado."""
+
+    @abstractmethod
+    def list_booked(
+        self, doctor_ids: Iterable[int], start: datetime, end: datetime
+    ) -> list[tuple[int, datetime]]:
+        """Pares (doctor_id, scheduled_at) de citas activas en [start, end)."""
+
+
+@dataclass(frozen=True)
+class Repositories:
+    patients: PatientRepository
+    doctors: DoctorRepository
+    appointments: AppointmentRepository
@@ -0,0 +1,523 @@
+"""Backend de repositorios en memoria.
+
+Guarda instancias transitorias de los modelos ORM en diccionarios e índices
+ordenados, con las mismas garantías que el backend SQL: unicidad de teléfono
+y email, orden de resultados y valores por defecto. Las escrituras se aplican
+al instante y se deshacen con `rollback()` si la transacción no se confirma.
+"""
+
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from src.database.fts import BM25_WEIGHTS, fold_text
+
+from src.database.models import (
+    Appointment,
+    Doctor,
+    DoctorSchedule,
+    MedicalHistory,
+    Patient,
+    PatientContext,
+)
+from src.repositories.base import (
+    ACTIVE_APPOINTMENT_STATUSES,
+    AppointmentRepository,
+    DoctorRepository,
+    PatientRepository,
+)
+
+
+class InMemoryStore:
+    """Tablas e índices compartidos por todas las sesiones en memoria."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.patients: dict[int, Patient] = {}
+        self.patient_ids_by_phone: dict[str, int] = {}
+        self.patient_ids_by_email: dict[str, int] = {}
+        self.history: dict[int, MedicalHistory] = {}
+        self.history_by_patient: dict[int, list[tuple[datetime, int]]] = defaultdict(list)
+        self.contexts: dict[int, PatientContext] = {}
+        self.context_ids_by_phone: dict[str, int] = {}
+        self.doctors: dict[int, Doctor] = {}
+        self.schedules_by_doctor: dict[int, list[DoctorSchedule]] = defaultdict(list)
+        self.appointments: dict[int, Appointment] = {}
+        self.appointments_by_doctor: dict[int, list[tuple[datetime, int]]] = defaultdict(list)
+        self.appointments_by_patient: dict[int, list[tuple[datetime, int]]] = defaultdict(list)
+        self._sequences: dict[str, int] = defaultdict(int)
+
+    def next_id(self, table: str) -> int:
+        self._sequences[table] += 1
+        return self._sequences[table]
+
+
+class InMemorySession:
+    """Unidad de trabajo sobre un `InMemoryStore` con la interfaz de `Session`.
+
+    `after_commit_hooks` y `after_rollback_hooks` equivalen a los eventos
+    `after_commit` y `after_soft_rollback` de SQLAlchemy.
+    """
+
+    after_commit_hooks: list[Callable[["InMemorySession"], None]] = []
+    after_rollback_hooks: list[Callable[["InMemorySession"], None]] = []
+
+    def __init__(self, store: InMemoryStore):
+        self.store = store
+        self.info: dict[str, Any] = {}
+        self._undo: list[Callable[[], None]] = []
+
+    def record_undo(self, action: Callable[[], None]) -> None:
+        self._undo.append(action)
+
+    def flush(self) -> None:
+        pass
+
+    def commit(self) -> None:
+        self._undo.clear()
+        for hook in self.after_commit_hooks:
+            hook(self)
+
+    def rollback(self) -> None:
+        with self.store.lock:
+            while self._undo:
+                self._undo.pop()()
+        for hook in self.after_rollback_hooks:
+            hook(self)
+
+    def close(self) -> None:
+        self.rollback()
+
+
+def _unique_violation(table: str, column: str, value: Any) -> IntegrityError:
+    return IntegrityError(
+        f"INSERT INTO {table}",
+        {column: value},
+        Exception(f"UNIQUE constraint failed: {table}.{column}"),
+    )
+
+
+def _remove_sorted(index: list, entry: tuple) -> None:
+    position = bisect_left(index, entry)
+    if position < len(index) and index[position] == entry:
+        index.pop(position)
+
+
+class InMemoryPatientRepository(PatientRepository):
+    def __init__(self, session: InMemorySession):
+        self.session = session
+        self.store = session.store
+
+    def get_by_id(self, patient_id: int) -> Optional[Patient]:
+        return self.store.patients.get(patient_id)
+
+    def get_by_phone(self, phone: str) -> Optional[Patient]:
+        patient_id = self.store.patient_ids_by_phone.get(phone)
+        return self.store.patients.get(patient_id) if patient_id else None
+
+    def get_by_email(self, email: str) -> Optional[Patient]:
+        patient_id = self.store.patient_ids_by_email.get(email)
+        return self.store.patients.get(patient_id) if patient_id else None
+
+    def get_with_history(self, patient_id: int) -> Optional[Patient]:
+        return self.get_by_id(patient_id)
+
+    def add(self, patient: Patient) -> Patient:
+        store = self.store
+        with store.lock:
+            if patient.phone in store.patient_ids_by_phone:
+                raise _unique_violation("patients", "phone", patient.phone)
+            if patient.email and patient.email in store.patient_ids_by_email:
+                raise _unique_violation("patients", "email", patient.email)
+            patient.id = store.next_id("patients")
+            if patient.created_at is None:
+                patient.created_at = datetime.utcnow()
+            store.patients[patient.id] = patient
+            store.patient_ids_by_phone[patient.phone] = patient.id
+            if patient.email:
+                store.patient_ids_by_email[patient.email] = patient.id
+
+        def undo() -> None:
+            store.patients.pop(patient.id, None)
+            store.patient_ids_by_phone.pop(patient.phone, None)
+            if patient.email:
+                store.patient_ids_by_email.pop(patient.email, None)
+
+        self.session.record_undo(undo)
+        return patient
+
+    def list_by_phones(self, phones: Iterable[str]) -> list[Patient]:
+        found = (self.get_by_phone(phone) for phone in set(phones))
+        return [patient for patient in found if patient is not None]
+
+    def list_by_emails(self, emails: Iterable[str]) -> list[Patient]:
+        found = (self.get_by_email(email) for email in set(emails))
+        return [patient for patient in found if patient is not None]
+
+    def add_many(self, patients: list[Patient]) -> list[Patient]:
+        with self.store.lock:
+            return [self.add(patient) for patient in patients]
+
+    def update(self, patient_id: int, **fields: Any) -> Optional[Patient]:
+        store = self.store
+        with store.lock:
+            patient = store.patients.get(patient_id)
+            if patient is None:
+                return None
+            for column, index in (
+                ("phone", store.patient_ids_by_phone),
+                ("email", store.patient_ids_by_email),
+            ):
+                value = fields.get(column)
+                if value and index.get(value, patient_id) != patient_id:
+                    raise _unique_violation("patients", column, value)
+            previous = {name: getattr(patient, name) for name in fields}
+            self._reindex(patient, previous, fields)
+            for name, value in fields.items():
+                setattr(patient, name, value)
+
+        def undo() -> None:
+            self._reindex(patient, fields, previous)
+            for name, value in previous.items():
+                setattr(patient, name, value)
+
+        self.session.record_undo(undo)
+        return patient
+
+    def update_many(self, changes: dict[int, dict[str, Any]]) -> None:
+        for patient_id, fields in changes.items():
+            self.update(patient_id, **fields)
+
+    def _reindex(self, patient: Patient, old: dict, new: dict) -> None:
+        for column, index in (
+            ("phone", self.store.patient_ids_by_phone),
+            ("email", self.store.patient_ids_by_email),
+        ):
+            if column not in new:
+                continue
+            if old.get(column):
+                index.pop(old[column], None)
+            if new[column]:
+                index[new[column]] = patient.id
+
+    def list_phones(self) -> list[tuple[int, str]]:
+        return [
+            (patient_id, self.store.patients[patient_id].phone)
+            for patient_id in sorted(self.store.patients)
+        ]
+
+    def merge(self, survivor_id: int, duplicate_ids: Iterable[int]) -> None:
+        store = self.store
+        moves = []
+        with store.lock:
+            if survivor_id not in store.patients:
+                return
+            for duplicate_id in set(duplicate_ids) - {survivor_id}:
+                duplicate = store.patients.pop(duplicate_id, None)
+                if duplicate is None:
+                    continue
+                store.patient_ids_by_phone.pop(duplicate.phone, None)
+                if duplicate.email:
+                    store.patient_ids_by_email.pop(duplicate.email, None)
+                context = store.contexts.pop(duplicate_id, None)
+                if context is not None:
+                    store.context_ids_by_phone.pop(context.phone, None)
+                history = store.history_by_patient.pop(duplicate_id, [])
+                appointments = store.appointments_by_patient.pop(duplicate_id, [])
+                for entry in history:
+                    insort(store.history_by_patient[survivor_id], entry)
+                    store.history[entry[1]].patient_id = survivor_id
+                for entry in appointments:
+                    insort(store.appointments_by_patient[survivor_id], entry)
+                    store.appointments[entry[1]].patient_id = survivor_id
+                moves.append((duplicate, context, history, appointments))
+
+        def undo() -> None:
+            for duplicate, context, history, appointments in moves:
+                store.patients[duplicate.id] = duplicate
+                store.patient_ids_by_phone[duplicate.phone] = duplicate.id
+                if duplicate.email:
+                    store.patient_ids_by_email[duplicate.email] = duplicate.id
+                if context is not None:
+                    store.contexts[duplicate.id] = context
+                    store.context_ids_by_phone[context.phone] = duplicate.id
+                for entry in history:
+                    _remove_sorted(store.history_by_patient[survivor_id], entry)
+                    store.history[entry[1]].patient_id = duplicate.id
+                for entry in appointments:
+                    _remove_sorted(store.appointments_by_patient[survivor_id], entry)
+                    store.appointments[entry[1]].patient_id = duplicate.id
+                store.history_by_patient[duplicate.id] = history
+                store.appointments_by_patient[duplicate.id] = appointments
+
+        self.session.record_undo(undo)
+
+    def list_history(
+        self, patient_id: int, limit: Optional[int] = None
+    ) -> list[MedicalHistory]:
+        index = self.store.history_by_patient.get(patient_id, [])
+        records = [self.store.history[record_id] for _, record_id in reversed(index)]
+        return records if limit is None else records[:limit]
+
+    def search_history(
+        self, terms: list[str], patient_id: Optional[int] = None, limit: int = 5
+    ) -> list[MedicalHistory]:
+        if not terms:
+            return []
+        if patient_id is not None:
+            candidates = self.list_history(patient_id)
+        else:
+            candidates = list(self.store.history.values())
+
+        weights = BM25_WEIGHTS[1:]
+        scored = []
+        for record in candidates:
+            score = 0.0
+            for weight, value in zip(
+                weights, (record.diagnosis, record.treatment, record.notes)
+            ):
+                tokens = re.findall(r"\w+", fold_text(value or ""))
+                score += weight * sum(
+                    1 for term in terms if any(t.startswith(term) for t in tokens)
+                )
+            if score:
+                scored.append((-score, -record.date.timestamp(), record.id, record))
+        scored.sort(key=lambda item: item[:3])
+        return [record for *_, record in scored[:limit]]
+
+    def add_history(self, record: MedicalHistory) -> MedicalHistory:
+        store = self.store
+        with store.lock:
+            record.id = store.next_id("medical_history")
+            if record.date is None:
+                record.date = datetime.utcnow()
+            store.history[record.id] = record
+            entry = (record.date, record.id)
+            insort(store.history_by_patient[record.patient_id], entry)
+            patient = store.patients.get(record.patient_id)
+            if patient is not None:
+                record.patient = patient
+
+        def undo() -> None:
+            store.history.pop(record.id, None)
+            _remove_sorted(store.history_by_patient[record.patient_id], entry)
+            if patient is not None and record in patient.medical_history:
+                patient.medical_history.remove(record)
+
+        self.session.record_undo(undo)
+        return record
+
+    def add_history_many(self, records: list[MedicalHistory]) -> list[MedicalHistory]:
+        with self.store.lock:
+            return [self.add_history(record) for record in records]
+
+    def list_history_for(self, patient_ids: Iterable[int]) -> list[MedicalHistory]:
+        return [
+            record
+            for patient_id in set(patient_ids)
+            for record in self.list_history(patient_id)
+        ]
+
+    def get_context_by_phone(self, phone: str) -> Optional[PatientContext]:
+        patient_id = self.store.context_ids_by_phone.get(phone)
+        return self.store.contexts.get(patient_id) if patient_id else None
+
+    def get_context(self, patient_id: int) -> Optional[PatientContext]:
+        return self.store.contexts.get(patient_id)
+
+    def save_context(
+        self, context: PatientContext, is_new: bool = False
+    ) -> PatientContext:
+        store = self.store
+        with store.lock:
+            if context.updated_at is None:
+                context.updated_at = datetime.utcnow()
+            previous = store.contexts.get(context.patient_id)
+            if previous is not None:
+                store.context_ids_by_phone.pop(previous.phone, None)
+            elif context.phone in store.context_ids_by_phone:
+                raise _unique_violation("patient_context", "phone", context.phone)
+            store.contexts[context.patient_id] = context
+            store.context_ids_by_phone[context.phone] = context.patient_id
+
+        def undo() -> None:
+            store.context_ids_by_phone.pop(context.phone, None)
+            if previous is None:
+                store.contexts.pop(context.patient_id, None)
+            else:
+                store.contexts[context.patient_id] = previous
+                store.context_ids_by_phone[previous.phone] = previous.patient_id
+
+        self.session.record_undo(undo)
+        return context
+
+    def add_contexts(self, contexts: list[PatientContext]) -> None:
+        with self.store.lock:
+            for context in contexts:
+                self.save_context(context, is_new=True)
+
+    def replace_contexts(self, contexts: list[PatientContext]) -> None:
+        with self.store.lock:
+            for context in contexts:
+                self.save_context(context)
+
+    def list_ids_without_context(self) -> list[int]:
+        return sorted(set(self.store.patients) - set(self.store.contexts))
+
+
+class InMemoryDoctorRepository(DoctorRepository):
+    def __init__(self, session: InMemorySession):
+        self.session = session
+        self.store = session.store
+
+    def get_by_id(self, doctor_id: int) -> Optional[Doctor]:
+        return self.store.doctors.get(doctor_id)
+
+    def list_doctors(
+        self,
+        available_only: bool = False,
+        doctor_ids: Optional[Iterable[int]] = None,
+    ) -> list[Doctor]:
+        if doctor_ids:
+            doctors = [
+                self.store.doctors[doctor_id]
+                for doctor_id in sorted(set(doctor_ids))
+                if doctor_id in self.store.doctors
+            ]
+        else:
+            doctors = [self.store.doctors[key] for key in sorted(self.store.doctors)]
+        if available_only:
+            doctors = [doctor for doctor in doctors if doctor.is_available]
+        return doctors
+
+    def add(self, doctor: Doctor) -> Doctor:
+        store = self.store
+        with store.lock:
+            doctor.id = store.next_id("doctors")
+            if doctor.is_available is None:
+                doctor.is_available = False
+            store.doctors[doctor.id] = doctor
+        self.session.record_undo(lambda: store.doctors.pop(doctor.id, None))
+        return doctor
+
+    def update(self, doctor_id: int, **fields: Any) -> Optional[Doctor]:
+        with self.store.lock:
+            doctor = self.store.doctors.get(doctor_id)
+            if doctor is None:
+                return None
+            previous = {name: getattr(doctor, name) for name in fields}
+            for name, value in fields.items():
+                setattr(doctor, name, value)
+
+        def undo() -> None:
+            for name, value in previous.items():
+                setattr(doctor, name, value)
+
+        self.session.record_undo(undo)
+        return doctor
+
+    def update_many(self, doctor_ids: Iterable[int], **fields: Any) -> int:
+        with self.store.lock:
+            return sum(
+                self.update(doctor_id, **fields) is not None
+                for doctor_id in set(doctor_ids)
+            )
+
+    def claim(self, doctor_id: int, chat_id: str) -> Optional[Doctor]:
+        with self.store.lock:
+            doctor = self.store.doctors.get(doctor_id)
+            if doctor is None or not doctor.is_available or doctor.current_chat_id:
+                return None
+            return self.update(doctor_id, current_chat_id=chat_id, is_available=False)
+
+    def list_schedules(self, doctor_ids: Iterable[int]) -> list[DoctorSchedule]:
+        schedules = [
+            schedule
+            for doctor_id in set(doctor_ids)
+            for schedule in self.store.schedules_by_doctor.get(doctor_id, [])
+        ]
+        return sorted(schedules, key=lambda schedule: schedule.id)
+
+    def add_schedule(self, schedule: DoctorSchedule) -> DoctorSchedule:
+        store = self.store
+        with store.lock:
+            schedule.id = store.next_id("doctor_schedule")
+            store.schedules_by_doctor[schedule.doctor_id].append(schedule)
+        self.session.record_undo(
+            lambda: store.schedules_by_doctor[schedule.doctor_id].remove(schedule)
+        )
+        return schedule
+
+
+class InMemoryAppointmentRepository(AppointmentRepository):
+    def __init__(self, session: InMemorySession):
+        self.session = session
+        self.store = session.store
+
+    def add(self, appointment: Appointment) -> Appointment:
+        store = self.store
+        with store.lock:
+            appointment.id = store.next_id("appointments")
+            if appointment.status is None:
+                appointment.status = "scheduled"
+            if appointment.created_at is None:
+                appointment.created_at = datetime.utcnow()
+            store.appointments[appointment.id] = appointment
+            entry = (appointment.scheduled_at, appointment.id)
+            insort(store.appointments_by_doctor[appointment.doctor_id], entry)
+            insort(store.appointments_by_patient[appointment.patient_id], entry)
+            doctor = store.doctors.get(appointment.doctor_id)
+            if doctor is not None:
+                appointment.doctor = doctor
+
+        def undo() -> None:
+            store.appointments.pop(appointment.id, None)
+            _remove_sorted(store.appointments_by_doctor[appointment.doctor_id], entry)
+            _remove_sorted(store.appointments_by_patient[appointment.patient_id], entry)
+            if doctor is not None and appointment in doctor.appointments:
+                doctor.appointments.remove(appointment)
+
+        self.session.record_undo(undo)
+        return appointment
+
+    def list_for_patient(
+        self, patient_id: int, since: Optional[datetime] = None
+    ) -> list[Appointment]:
+        index = self.store.appointments_by_patient.get(patient_id, [])
+        start = bisect_left(index, (since,)) if since is not None else 0
+        return [
+            self.store.appointments[appointment_id]
+            for _, appointment_id in reversed(index[start:])
+        ]
+
+    def list_for_patients(
+        self, patient_ids: Iterable[int], since: Optional[datetime] = None
+    ) -> list[Appointment]:
+        return [
+            appointment
+            for patient_id in set(patient_ids)
+            for appointment in self.list_for_patient(patient_id, since=since)
+        ]
+
+    def list_by_ids(self, appointment_ids: Iterable[int]) -> list[Appointment]:
+        found = (self.store.appointments.get(i) for i in set(appointment_ids))
+        return [appointment for appointment in found if appointment is not None]
+
+    def list_booked(
+        self, doctor_ids: Iterable[int], start: datetime, end: datetime
+    ) -> list[tuple[int, datetime]]:
+        booked = []
+        for doctor_id in set(doctor_ids):
+            index = self.store.appointments_by_doctor.get(doctor_id, [])
+            position = bisect_left(index, (start,))
+            while position < len(index) and index[position][0] < end:
+                appointment = self.store.appointments[index[position][1]]
+                if appointment.status in ACTIVE_APPOINTMENT_STATUSES:
+                    booked.append((doctor_id, appointment.scheduled_at))
+                position += 1
+        return booked
@@ -0,0 +1,392 @@
+"""Backend de repositorios sobre una sesión de SQLAlchemy."""
+
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import bindparam, or_, text, update
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.database.fts import BM25_WEIGHTS, FTS_TABLE, build_match_query, fts_available
+
+from src.database.models import (
+    Appointment,
+    Doctor,
+    DoctorSchedule,
+    MedicalHistory,
+    Patient,
+    PatientContext,
+)
+from src.repositories.base import (
+    ACTIVE_APPOINTMENT_STATUSES,
+    AppointmentRepository,
+    DoctorRepository,
+    PatientRepository,
+)
+
+
+def _insert_values(instance: Any) -> dict[str, Any]:
+    """Valores de columna para un INSERT masivo, con los defaults del modelo.
+
+    Todas las filas llevan las mismas claves, así el driver las envía en un
+    solo executemany.
+    """
+    values = {}
+    for column in instance.__table__.columns:
+        value = getattr(instance, column.key)
+        if value is None and column.primary_key and column.autoincrement is not False:
+            continue
+        if value is None and column.default is not None:
+            default = column.default
+            value = default.arg(None) if default.is_callable else default.arg
+        values[column.key] = value
+    return values
+
+
+def _bulk_insert(session: Session, model: type, instances: list) -> None:
+    """Inserta las instancias en un executemany, sin el unit of work del ORM.
+
+    Las instancias no quedan asociadas a la sesión ni reciben el id generado.
+    """
+    if instances:
+        session.execute(
+            model.__table__.insert(), [_insert_values(instance) for instance in instances]
+        )
+
+
+class SqlPatientRepository(PatientRepository):
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_by_id(self, patient_id: int) -> Optional[Patient]:
+        return self.session.query(Patient).filter(Patient.id == patient_id).first()
+
+    def get_by_phone(self, phone: str) -> Optional[Patient]:
+        return self.session.query(Patient).filter(Patient.phone == phone).first()
+
+    def get_by_email(self, email: str) -> Optional[Patient]:
+        return self.session.query(Patient).filter(Patient.email == email).first()
+
+    def get_with_history(self, patient_id: int) -> Optional[Patient]:
+        return (
+            self.session.query(Patient)
+            .options(joinedload(Patient.medical_history))
+            .filter(Patient.id == patient_id)
+            .first()
+        )
+
+    def add(self, patient: Patient) -> Patient:
+        self.session.add(patient)
+        self.session.flush()
+        return patient
+
+    def list_by_phones(self, phones: Iterable[str]) -> list[Patient]:
+        phones = list(phones)
+        if not phones:
+            return []
+        return self.session.query(Patient).filter(Patient.phone.in_(phones)).all()
+
+    def list_by_emails(self, emails: Iterable[str]) -> list[Patient]:
+        emails = list(emails)
+        if not emails:
+            return []
+        return self.session.query(Patient).filter(Patient.email.in_(emails)).all()
+
+    def add_many(self, patients: list[Patient]) -> list[Patient]:
+        _bulk_insert(self.session, Patient, patients)
+        if patients:
+            # El teléfono es único: una lectura recupera los ids generados.
+            ids = dict(
+                self.session.query(Patient.phone, Patient.id).filter(
+                    Patient.phone.in_([patient.phone for patient in patients])
+                )
+            )
+            for patient in patients:
+                patient.id = ids[patient.phone]
+        return patients
+
+    def update(self, patient_id: int, **fields: Any) -> Optional[Patient]:
+        patient = self.get_by_id(patient_id)
+        if patient:
+            for name, value in fields.items():
+                setattr(patient, name, value)
+            self.session.flush()
+        return patient
+
+    def update_many(self, changes: dict[int, dict[str, Any]]) -> None:
+        if not changes:
+            return
+        columns = next(iter(changes.values())).keys()
+        statement = (
+            update(Patient.__table__)
+            .where(Patient.__table__.c.id == bindparam("_id"))
+            .values({name: bindparam(name) for name in columns})
+        )
+        self.session.flush()
+        self.session.execute(
+            statement,
+            [{"_id": patient_id, **fields} for patient_id, fields in changes.items()],
+        )
+        # El UPDATE no pasa por el ORM: los pacientes ya cargados en la
+        # sesión reciben los valores nuevos sin quedar pendientes de escribir.
+        for patient_id, fields in changes.items():
+            patient = self.session.identity_map.get(
+                self.session.identity_key(Patient, patient_id)
+            )
+            if patient is not None:
+                for name, value in fields.items():
+                    set_committed_value(patient, name, value)
+
+    def list_phones(self) -> list[tuple[int, str]]:
+        rows = self.session.query(Patient.id, Patient.phone).order_by(Patient.id)
+        return [(patient_id, phone) for patient_id, phone in rows]
+
+    def merge(self, survivor_id: int, duplicate_ids: Iterable[int]) -> None:
+        duplicate_ids = list(duplicate_ids)
+        if not duplicate_ids:
+            return
+        for model in (MedicalHistory, Appointment):
+            self.session.query(model).filter(model.patient_id.in_(duplicate_ids)).update(
+                {model.patient_id: survivor_id}, synchronize_session="fetch"
+            )
+        for model, column in ((PatientContext, PatientContext.patient_id), (Patient, Patient.id)):
+            self.session.query(model).filter(column.in_(duplicate_ids)).delete(
+                synchronize_session="fetch"
+            )
+        self.session.flush()
+
+    def list_history(
+        self, patient_id: int, limit: Optional[int] = None
+    ) -> list[MedicalHistory]:
+        query = (
+            self.session.query(MedicalHistory)
+            .filter(MedicalHistory.patient_id == patient_id)
+            .order_by(MedicalHistory.date.desc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def search_history(
+        self, terms: list[str], patient_id: Optional[int] = None, limit: int = 5
+    ) -> list[MedicalHistory]:
+        if not terms:
+            return []
+        if fts_available(self.session.get_bind()):
+            weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+            statement = text(
+                f"SELECT medical_history.* FROM {FTS_TABLE} "
+                f"JOIN medical_history ON medical_history.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH :match "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit"
+            )
+            return (
+                self.session.query(MedicalHistory)
+                .from_statement(statement)
+                .params(match=build_match_query(terms, patient_id), limit=limit)
+                .all()
+            )
+
+        # Respaldo sin FTS5: coincidencia por LIKE, más recientes primero.
+        columns = (MedicalHistory.diagnosis, MedicalHistory.treatment, MedicalHistory.notes)
+        query = self.session.query(MedicalHistory).filter(
+            or_(*(column.ilike(f"%{term}%") for term in terms for column in columns))
+        )
+        if patient_id is not None:
+            query = query.filter(MedicalHistory.patient_id == patient_id)
+        return query.order_by(MedicalHistory.date.desc()).limit(limit).all()
+
+    def add_history(self, record: MedicalHistory) -> MedicalHistory:
+        self.session.add(record)
+        self.session.flush()
+        return record
+
+    def add_history_many(self, records: list[MedicalHistory]) -> list[MedicalHistory]:
+        _bulk_insert(self.session, MedicalHistory, records)
+        return records
+
+    def list_history_for(self, patient_ids: Iterable[int]) -> list[MedicalHistory]:
+        patient_ids = list(patient_ids)
+        if not patient_ids:
+            return []
+        return (
+            self.session.query(MedicalHistory)
+            .filter(MedicalHistory.patient_id.in_(patient_ids))
+            .all()
+        )
+
+    def get_context_by_phone(self, phone: str) -> Optional[PatientContext]:
+        return (
+            self.session.query(PatientContext)
+            .filter(PatientContext.phone == phone)
+            .first()
+        )
+
+    def get_context(self, patient_id: int) -> Optional[PatientContext]:
+        return self.session.get(PatientContext, patient_id)
+
+    def save_context(
+        self, context: PatientContext, is_new: bool = False
+    ) -> PatientContext:
+        if is_new:
+            self.session.add(context)
+        else:
+            context = self.session.merge(context)
+        self.session.flush()
+        return context
+
+    def add_contexts(self, contexts: list[PatientContext]) -> None:
+        _bulk_insert(self.session, PatientContext, contexts)
+
+    def replace_contexts(self, contexts: list[PatientContext]) -> None:
+        if not contexts:
+            return
+        self.session.query(PatientContext).filter(
+            PatientContext.patient_id.in_([context.patient_id for context in contexts])
+        ).delete(synchronize_session="fetch")
+        _bulk_insert(self.session, PatientContext, contexts)
+
+    def list_ids_without_context(self) -> list[int]:
+        rows = (
+            self.session.query(Patient.id)
+            .outerjoin(PatientContext, PatientContext.patient_id == Patient.id)
+            .filter(PatientContext.patient_id.is_(None))
+            .order_by(Patient.id)
+        )
+        return [patient_id for (patient_id,) in rows]
+
+
+class SqlDoctorRepository(DoctorRepository):
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_by_id(self, doctor_id: int) -> Optional[Doctor]:
+        return self.session.query(Doctor).filter(Doctor.id == doctor_id).first()
+
+    def list_doctors(
+        self,
+        available_only: bool = False,
+        doctor_ids: Optional[Iterable[int]] = None,
+    ) -> list[Doctor]:
+        query = self.session.query(Doctor)
+        if available_only:
+            query = query.filter(Doctor.is_available == True)
+        if doctor_ids:
+            query = query.filter(Doctor.id.in_(list(doctor_ids)))
+        return query.order_by(Doctor.id).all()
+
+    def add(self, doctor: Doctor) -> Doctor:
+        self.session.add(doctor)
+        self.session.flush()
+        return doctor
+
+    def update(self, doctor_id: int, **fields: Any) -> Optional[Doctor]:
+        doctor = self.get_by_id(doctor_id)
+        if doctor:
+            for name, value in fields.items():
+                setattr(doctor, name, value)
+            self.session.flush()
+        return doctor
+
+    def update_many(self, doctor_ids: Iterable[int], **fields: Any) -> int:
+        doctor_ids = list(doctor_ids)
+        if not doctor_ids:
+            return 0
+        return (
+            self.session.query(Doctor)
+            .filter(Doctor.id.in_(doctor_ids))
+            .update(
+                {getattr(Doctor, name): value for name, value in fields.items()},
+                synchronize_session="fetch",
+            )
+        )
+
+    def claim(self, doctor_id: int, chat_id: str) -> Optional[Doctor]:
+        claimed = (
+            self.session.query(Doctor)
+            .filter(
+                Doctor.id == doctor_id,
+                Doctor.is_available == True,
+                Doctor.current_chat_id.is_(None),
+            )
+            .update(
+                {Doctor.current_chat_id: chat_id, Doctor.is_available: False},
+                synchronize_session="fetch",
+            )
+        )
+        return self.get_by_id(doctor_id) if claimed else None
+
+    def list_schedules(self, doctor_ids: Iterable[int]) -> list[DoctorSchedule]:
+        return (
+            self.session.query(DoctorSchedule)
+            .filter(DoctorSchedule.doctor_id.in_(list(doctor_ids)))
+            .order_by(DoctorSchedule.id)
+            .all()
+        )
+
+    def add_schedule(self, schedule: DoctorSchedule) -> DoctorSchedule:
+        self.session.add(schedule)
+        self.session.flush()
+        return schedule
+
+
+class SqlAppointmentRepository(AppointmentRepository):
+    def __init__(self, session: Session):
+        self.session = session
+
+    def add(self, appointment: Appointment) -> Appointment:
+        self.session.add(appointment)
+        self.session.flush()
+        return appointment
+
+    def list_for_patient(
+        self, patient_id: int, since: Optional[datetime] = None
+    ) -> list[Appointment]:
+        query = (
+            self.session.query(Appointment)
+            .options(joinedload(Appointment.doctor))
+            .filter(Appointment.patient_id == patient_id)
+            .order_by(Appointment.scheduled_at.desc())
+        )
+        if since is not None:
+            query = query.filter(Appointment.scheduled_at >= since)
+        return query.all()
+
+    def list_for_patients(
+        self, patient_ids: Iterable[int], since: Optional[datetime] = None
+    ) -> list[Appointment]:
+        patient_ids = list(patient_ids)
+        if not patient_ids:
+            return []
+        query = (
+            self.session.query(Appointment)
+            .options(joinedload(Appointment.doctor))
+            .filter(Appointment.patient_id.in_(patient_ids))
+        )
+        if since is not None:
+            query = query.filter(Appointment.scheduled_at >= since)
+        return query.all()
+
+    def list_by_ids(self, appointment_ids: Iterable[int]) -> list[Appointment]:
+        appointment_ids = list(appointment_ids)
+        if not appointment_ids:
+            return []
+        return (
+            self.session.query(Appointment)
+            .options(joinedload(Appointment.doctor))
+            .filter(Appointment.id.in_(appointment_ids))
+            .all()
+        )
+
+    def list_booked(
+        self, doctor_ids: Iterable[int], start: datetime, end: datetime
+    ) -> list[tuple[int, datetime]]:
+        rows = self.session.query(
+            Appointment.doctor_id, Appointment.scheduled_at
+        ).filter(
+            Appointment.doctor_id.in_(list(doctor_ids)),
+            Appointment.scheduled_at >= start,
+            Appointment.scheduled_at < end,
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+        )
+        return [(doctor_id, scheduled_at) for doctor_id, scheduled_at in rows]
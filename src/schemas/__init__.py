@@ -1,13 +1,23 @@
 from src.schemas.models import (
     ClassificationResult,
     DoctorAvailability,
+    MedicalHistoryCreate,
+    PatientContextSnapshot,
     PatientCreate,
+    PatientImport,
     PatientResponse,
+    UpcomingAppointment,
 )
+from src.schemas.phone import normalize_phone
 
 __all__ = [
     "PatientCreate",
+    "PatientImport",
+    "MedicalHistoryCreate",
     "PatientResponse",
+    "PatientContextSnapshot",
+    "UpcomingAppointment",
     "DoctorAvailability",
     "ClassificationResult",
+    "normalize_phone",
 ]
@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from src.schemas.phone import normalize_phone
 
 
 class PatientCreate(BaseModel):
@@ -9,6 +11,35 @@ class PatientCreate(BaseModel):
     phone: str = Field(min_length=9, max_length=20)
     email: Optional[str] = Field(default=None, max_length=100)
 
+    @field_validator("phone")
+    @classmethod
+    def canonical_phone(cls, value: str) -> str:
+        phone = normalize_phone(value)
+        if not phone:
+            raise ValueError("el teléfono debe contener dígitos")
+        return phone
+
+
+class MedicalHistoryCreate(BaseModel):
+    diagnosis: str = Field(min_length=1, max_length=200)
+    treatment: str = Field(min_length=1)
+    notes: Optional[str] = None
+    date: Optional[datetime] = None
+
+    @field_validator("date")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """Las fechas se guardan sin zona horaria, en UTC."""
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class PatientImport(PatientCreate):
+    """Paciente de una importación masiva con su historial."""
+
+    history: list[MedicalHistoryCreate] = []
+
 
 class PatientResponse(BaseModel):
     id: int
@@ -33,6 +64,20 @@ class MedicalHistoryResponse(BaseModel):
         from_attributes = True
 
 
+class UpcomingAppointment(BaseModel):
+    scheduled_at: datetime
+    doctor_name: str
+    status: str
+
+
+class PatientContextSnapshot(BaseModel):
+    patient_id: int
+    name: str
+    phone: str
+    history_summary: str
+    upcoming_appointments: list[UpcomingAppointment] = []
+
+
 class DoctorResponse(BaseModel):
     id: int
     name: str
@@ -49,6 +94,7 @@ class DoctorAvailability(BaseModel):
     doctor_name: str
     specialty: str
     is_available: bool
+    current_chat_id: Optional[str] = None
 
 
 class ClassificationResult(BaseModel):
@@ -0,0 +1,34 @@
+"""Forma canónica de los teléfonos de pacientes.
+
+Los números peruanos se guardan con sus dígitos nacionales, sin espacios,
+guiones ni el código de país: "999 888 777", "+51 999-888-777" y
+"0051999888777" son todos "999888777". Los números de otros países
+conservan el prefijo internacional ("+1...") para no confundirlos con uno
+nacional.
+"""
+
+import re
+
+COUNTRY_CODE = "51"
+NATIONAL_MOBILE_LENGTH = 9
+
+
+def normalize_phone(phone: str) -> str:
+    """Teléfono canónico; cadena vacía si no contiene dígitos."""
+    text = phone.strip()
+    digits = re.sub(r"\D", "", text)
+    if text.startswith("+"):
+        international = digits
+    elif digits.startswith("00"):
+        international = digits[2:]
+    elif (
+        digits.startswith(COUNTRY_CODE)
+        and len(digits) == len(COUNTRY_CODE) + NATIONAL_MOBILE_LENGTH
+    ):
+        international = digits
+    else:
+        return digits
+
+    if international.startswith(COUNTRY_CODE):
+        return international[len(COUNTRY_CODE) :]
+    return f"+{international}" if international else ""
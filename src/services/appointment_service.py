@@ -1,52 +1,82 @@
 """Servicio para gestión de citas y slots disponibles."""
 
-from datetime import datetime, timedelta
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, timedelta
+from itertools import islice
 from typing import Optional
 
-from sqlalchemy.orm import Session
-
 from src.database.models import Appointment, Doctor, DoctorSchedule
+from src.repositories import DataSession, get_repositories
+from src.services.patient_service import PatientService
+from src.tracing import traced_service
 
 
+@traced_service
 class AppointmentService:
     """Servicio para citas y disponibilidad de doctores."""
 
     SLOT_DURATION_MINUTES = 60
     DAYS_AHEAD = 7
+    SLOT_PREVIEW_SIZE = 3
+    SLOT_PAGE_SIZE = 12
 
     @staticmethod
-    def get_available_slots(
-        session: Session, doctor_ids: Optional[list[int]] = None
-    ) -> list[dict]:
+    def _iter_open_slots(
+        session: DataSession,
+        doctor_ids: Optional[list[int]] = None,
+        day: Optional[date] = None,
+        chat_id: Optional[str] = None,
+    ) -> Iterator[tuple[Doctor, datetime]]:
         """
-        Genera slots disponibles para los próximos N días.
-        Usa DoctorSchedule y excluye citas existentes.
+        Recorre los slots libres de los próximos N días (o solo de `day`)
+        como pares (doctor, inicio), en orden cronológico dentro de cada día.
+        Usa DoctorSchedule y excluye citas existentes con un número
+        constante de consultas.
         """
         now = datetime.now()
         today = now.date()
-        slots = []
+        duration = timedelta(minutes=AppointmentService.SLOT_DURATION_MINUTES)
+
+        if day is not None and not 0 <= (day - today).days < AppointmentService.DAYS_AHEAD:
+            return
 
-        doctors_query = session.query(Doctor).filter(Doctor.is_available == True)
-        if doctor_ids:
-            doctors_query = doctors_query.filter(Doctor.id.in_(doctor_ids))
-        doctors = doctors_query.all()
+        repos = get_repositories(session)
+        # Un doctor retenido para `chat_id` (p. ej. el que un operador asignó
+        # a esa urgencia) sigue de turno para ese chat: sus horarios se le
+        # ofrecen solo a él. Uno retenido por otro chat o desactivado, no.
+        doctors = [
+            doctor
+            for doctor in repos.doctors.list_doctors(doctor_ids=doctor_ids)
+            if doctor.is_available or (chat_id and doctor.current_chat_id == chat_id)
+        ]
 
         if not doctors:
-            return []
+            return
+
+        # Horarios y citas del rango se cargan en bloque: el número de
+        # consultas no depende de la cantidad de doctores ni de slots.
+        loaded_ids = [doctor.id for doctor in doctors]
+        schedules: dict[tuple[int, int], DoctorSchedule] = {}
+        for schedule in repos.doctors.list_schedules(loaded_ids):
+            schedules.setdefault((schedule.doctor_id, schedule.day_of_week), schedule)
+
+        days = (
+            [day]
+            if day is not None
+            else [today + timedelta(days=offset) for offset in range(AppointmentService.DAYS_AHEAD)]
+        )
+        window_start = datetime.combine(days[0], datetime.min.time())
+        window_end = datetime.combine(days[-1], datetime.min.time()) + timedelta(days=1)
+        booked = set(
+            repos.appointments.list_booked(loaded_ids, window_start, window_end)
+        )
 
-        for day_offset in range(AppointmentService.DAYS_AHEAD):
-            slot_date = today + timedelta(days=day_offset)
+        for slot_date in days:
             day_of_week = slot_date.weekday()  # 0=lunes, 6=domingo
+            day_slots = []
 
             for doctor in doctors:
-                schedule = (
-                    session.query(DoctorSchedule)
-                    .filter(
-                        DoctorSchedule.doctor_id == doctor.id,
-                        DoctorSchedule.day_of_week == day_of_week,
-                    )
-                    .first()
-                )
+                schedule = schedules.get((doctor.id, day_of_week))
 
                 if not schedule:
                     continue
@@ -54,7 +84,7 @@ class AppointmentService:
                 start_dt = datetime.combine(slot_date, schedule.start_time)
                 end_dt = datetime.combine(slot_date, schedule.end_time)
 
-                if day_offset == 0 and now >= start_dt:
+                if slot_date == today and now >= start_dt:
                     mins = (
                         (now.minute // AppointmentService.SLOT_DURATION_MINUTES + 1)
                         * AppointmentService.SLOT_DURATION_MINUTES
@@ -63,47 +93,103 @@ class AppointmentService:
                     start_dt += timedelta(minutes=mins - now.minute)
 
                 current = start_dt
-                slot_end = current + timedelta(
-                    minutes=AppointmentService.SLOT_DURATION_MINUTES
-                )
-                while slot_end <= end_dt:
-                    existing = (
-                        session.query(Appointment)
-                        .filter(
-                            Appointment.doctor_id == doctor.id,
-                            Appointment.scheduled_at == current,
-                            Appointment.status.in_(["scheduled", "confirmed"]),
-                        )
-                        .first()
-                    )
-                    if not existing:
-                        slot_id = f"{doctor.id}|{current.isoformat()}"
-                        slots.append(
-                            {
-                                "slot_id": slot_id,
-                                "doctor_id": doctor.id,
-                                "doctor_name": doctor.name,
-                                "specialty": doctor.specialty,
-                                "scheduled_at": current,
-                                "display": current.strftime("%d/%m/%Y %H:%M"),
-                            }
-                        )
-                    current += timedelta(minutes=AppointmentService.SLOT_DURATION_MINUTES)
-                    slot_end = current + timedelta(
-                        minutes=AppointmentService.SLOT_DURATION_MINUTES
-                    )
+                while current + duration <= end_dt:
+                    if (doctor.id, current) not in booked:
+                        day_slots.append((current, doctor.id, doctor))
+                    current += duration
+
+            day_slots.sort(key=lambda slot: slot[:2])
+            for current, _, doctor in day_slots:
+                yield doctor, current
+
+    @staticmethod
+    def _slot_dict(doctor: Doctor, scheduled_at: datetime) -> dict:
+        return {
+            "slot_id": f"{doctor.id}|{scheduled_at.isoformat()}",
+            "doctor_id": doctor.id,
+            "doctor_name": doctor.name,
+            "specialty": doctor.specialty,
+            "scheduled_at": scheduled_at,
+            "display": scheduled_at.strftime("%d/%m/%Y %H:%M"),
+        }
+
+    @staticmethod
+    def get_available_slots(
+        session: DataSession,
+        doctor_ids: Optional[list[int]] = None,
+        chat_id: Optional[str] = None,
+    ) -> list[dict]:
+        """Genera todos los slots disponibles para los próximos N días."""
+        return [
+            AppointmentService._slot_dict(doctor, scheduled_at)
+            for doctor, scheduled_at in AppointmentService._iter_open_slots(
+                session, doctor_ids, chat_id=chat_id
+            )
+        ]
 
-        return slots
+    @staticmethod
+    def get_slot_summary(
+        session: DataSession,
+        doctor_ids: Optional[list[int]] = None,
+        preview_size: int = SLOT_PREVIEW_SIZE,
+        chat_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Resumen compacto de la disponibilidad: slots libres por día y los
+        `preview_size` más próximos. Su tamaño no depende de la cantidad de
+        doctores; el detalle se pide por páginas con `get_slot_page`.
+        """
+        per_day: dict[date, int] = {}
+        preview = []
+        for doctor, scheduled_at in AppointmentService._iter_open_slots(
+            session, doctor_ids, chat_id=chat_id
+        ):
+            slot_date = scheduled_at.date()
+            per_day[slot_date] = per_day.get(slot_date, 0) + 1
+            if len(preview) < preview_size:
+                preview.append(AppointmentService._slot_dict(doctor, scheduled_at))
+        return {
+            "days": [
+                {"date": slot_date.isoformat(), "count": count}
+                for slot_date, count in per_day.items()
+            ],
+            "total": sum(per_day.values()),
+            "slots": preview,
+        }
+
+    @staticmethod
+    def get_slot_page(
+        session: DataSession,
+        day: date,
+        doctor_ids: Optional[list[int]] = None,
+        offset: int = 0,
+        limit: int = SLOT_PAGE_SIZE,
+        chat_id: Optional[str] = None,
+    ) -> dict:
+        """Página de slots de un día, opcionalmente de un subconjunto de doctores."""
+        slots = AppointmentService._iter_open_slots(
+            session, doctor_ids, day=day, chat_id=chat_id
+        )
+        page = [
+            AppointmentService._slot_dict(doctor, scheduled_at)
+            for doctor, scheduled_at in islice(slots, offset, offset + limit + 1)
+        ]
+        return {
+            "date": day.isoformat(),
+            "offset": offset,
+            "slots": page[:limit],
+            "has_more": len(page) > limit,
+        }
 
     @staticmethod
     def create_appointment(
-        session: Session,
+        session: DataSession,
         patient_id: int,
         doctor_id: int,
         scheduled_at: datetime,
         reason: Optional[str] = None,
     ) -> Appointment:
-        """Crea una cita."""
+        """Crea una cita y actualiza el contexto del paciente."""
         appointment = Appointment(
             patient_id=patient_id,
             doctor_id=doctor_id,
@@ -111,23 +197,28 @@ class AppointmentService:
             status="scheduled",
             reason=reason,
         )
-        session.add(appointment)
-        session.flush()
+        appointment = get_repositories(session).appointments.add(appointment)
+        PatientService.add_appointment_to_context(
+            session,
+            appointment,
+            appointment.doctor.name if appointment.doctor else "Doctor",
+        )
         return appointment
 
+    @staticmethod
+    def get_appointments(
+        session: DataSession, appointment_ids: Iterable[int]
+    ) -> dict[int, Appointment]:
+        """Citas por id en una lectura; los ids inexistentes se omiten."""
+        appointments = get_repositories(session).appointments.list_by_ids(appointment_ids)
+        return {appointment.id: appointment for appointment in appointments}
+
     @staticmethod
     def get_patient_appointments(
-        session: Session, patient_id: int, include_past: bool = False
+        session: DataSession, patient_id: int, include_past: bool = False
     ) -> list[Appointment]:
         """Obtiene las citas de un paciente."""
-        from sqlalchemy.orm import joinedload
-
-        query = (
-            session.query(Appointment)
-            .options(joinedload(Appointment.doctor))
-            .filter(Appointment.patient_id == patient_id)
-            .order_by(Appointment.scheduled_at.desc())
+        since = None if include_past else datetime.now()
+        return get_repositories(session).appointments.list_for_patient(
+            patient_id, since=since
         )
-        if not include_past:
-            query = query.filter(Appointment.scheduled_at >= datetime.now())
-        return query.all()
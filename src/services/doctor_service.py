@@ -1,17 +1,21 @@
-from typing import Optional
-
-from sqlalchemy.orm import Session
+from typing import Iterable, Optional
 
 from src.database.models import Doctor
+from src.repositories import DataSession, get_repositories
 from src.schemas.models import DoctorAvailability
+from src.services.notifications import (
+    DoctorAvailable,
+    DoctorRosterChanged,
+    publish_after_commit,
+)
+from src.tracing import traced_service
 
 
+@traced_service
 class DoctorService:
     @staticmethod
-    def get_available_doctors(session: Session) -> list[DoctorAvailability]:
-        doctors = (
-            session.query(Doctor).filter(Doctor.is_available == True).all()
-        )
+    def get_available_doctors(session: DataSession) -> list[DoctorAvailability]:
+        doctors = get_repositories(session).doctors.list_doctors(available_only=True)
         return [
             DoctorAvailability(
                 doctor_id=doc.id,
@@ -23,48 +27,120 @@ class DoctorService:
         ]
 
     @staticmethod
-    def get_all_doctors(session: Session) -> list[DoctorAvailability]:
-        doctors = session.query(Doctor).all()
+    def get_all_doctors(session: DataSession) -> list[DoctorAvailability]:
+        doctors = get_repositories(session).doctors.list_doctors()
         return [
             DoctorAvailability(
                 doctor_id=doc.id,
                 doctor_name=doc.name,
                 specialty=doc.specialty,
                 is_available=doc.is_available,
+                current_chat_id=doc.current_chat_id,
             )
             for doc in doctors
         ]
 
     @staticmethod
     def set_doctor_availability(
-        session: Session, doctor_id: int, is_available: bool
+        session: DataSession, doctor_id: int, is_available: bool
     ) -> Optional[Doctor]:
-        doctor = session.query(Doctor).filter(Doctor.id == doctor_id).first()
+        doctor = get_repositories(session).doctors.update(
+            doctor_id, is_available=is_available
+        )
         if doctor:
-            doctor.is_available = is_available
-            session.flush()
+            publish_after_commit(session, DoctorRosterChanged())
+        if doctor and is_available:
+            publish_after_commit(session, DoctorAvailable(doctor_id))
         return doctor
 
+    @staticmethod
+    def set_availability_bulk(
+        session: DataSession, availability: dict[int, bool]
+    ) -> list[int]:
+        """Aplica varios cambios de disponibilidad en una sola transacción.
+
+        Usa un UPDATE por valor en lugar de uno por doctor y retorna los
+        doctores cuyo estado cambió; los ids desconocidos se ignoran.
+        """
+        if not availability:
+            return []
+        doctors = get_repositories(session).doctors.list_doctors(doctor_ids=availability)
+        return DoctorService._apply_availability(session, doctors, availability)
+
+    @staticmethod
+    def set_clinic_availability(session: DataSession, is_available: bool) -> list[int]:
+        """Abre o cierra la clínica: todos los doctores quedan en el mismo estado."""
+        doctors = get_repositories(session).doctors.list_doctors()
+        return DoctorService._apply_availability(
+            session, doctors, {doc.id: is_available for doc in doctors}
+        )
+
+    @staticmethod
+    def _apply_availability(
+        session: DataSession, doctors: list[Doctor], availability: dict[int, bool]
+    ) -> list[int]:
+        current = {doc.id: doc.is_available for doc in doctors}
+        changed = [
+            doctor_id
+            for doctor_id, is_available in availability.items()
+            if doctor_id in current and current[doctor_id] != is_available
+        ]
+        opened = [doctor_id for doctor_id in changed if availability[doctor_id]]
+        closed = [doctor_id for doctor_id in changed if not availability[doctor_id]]
+        repository = get_repositories(session).doctors
+        repository.update_many(opened, is_available=True)
+        repository.update_many(closed, is_available=False)
+        if changed:
+            publish_after_commit(session, DoctorRosterChanged())
+        for doctor_id in opened:
+            publish_after_commit(session, DoctorAvailable(doctor_id))
+        return changed
+
     @staticmethod
     def assign_doctor_to_chat(
-        session: Session, doctor_id: int, chat_id: str
+        session: DataSession, doctor_id: int, chat_id: str
     ) -> Optional[Doctor]:
-        doctor = session.query(Doctor).filter(Doctor.id == doctor_id).first()
+        doctor = get_repositories(session).doctors.update(
+            doctor_id, current_chat_id=chat_id, is_available=False
+        )
         if doctor:
-            doctor.current_chat_id = chat_id
-            doctor.is_available = False
-            session.flush()
+            publish_after_commit(session, DoctorRosterChanged())
         return doctor
 
     @staticmethod
-    def release_doctor(session: Session, doctor_id: int) -> Optional[Doctor]:
-        doctor = session.query(Doctor).filter(Doctor.id == doctor_id).first()
+    def claim_doctor(
+        session: DataSession, doctor_id: int, chat_id: str
+    ) -> Optional[Doctor]:
+        """Asigna el doctor al chat si nadie lo tomó antes; None si ya estaba ocupado."""
+        doctor = get_repositories(session).doctors.claim(doctor_id, chat_id)
         if doctor:
-            doctor.current_chat_id = None
-            doctor.is_available = True
-            session.flush()
+            publish_after_commit(session, DoctorRosterChanged())
         return doctor
 
     @staticmethod
-    def get_doctor_by_id(session: Session, doctor_id: int) -> Optional[Doctor]:
-        return session.query(Doctor).filter(Doctor.id == doctor_id).first()
+    def release_doctor(session: DataSession, doctor_id: int) -> Optional[Doctor]:
+        doctor = get_repositories(session).doctors.update(
+            doctor_id, current_chat_id=None, is_available=True
+        )
+        if doctor:
+            publish_after_commit(session, DoctorRosterChanged())
+            publish_after_commit(session, DoctorAvailable(doctor_id))
+        return doctor
+
+    @staticmethod
+    def release_chats(session: DataSession, chat_ids: Iterable[str]) -> list[int]:
+        """Libera a los doctores que atienden los chats indicados; retorna sus ids."""
+        chat_ids = set(chat_ids)
+        if not chat_ids:
+            return []
+        doctors = get_repositories(session).doctors.list_doctors()
+        return [
+            doctor.id
+            for doctor in doctors
+            if doctor.current_chat_id in chat_ids
+            and DoctorService.release_doctor(session, doctor.id) is not None
+        ]
+
+    @staticmethod
+    def get_doctor_by_id(session: DataSession, doctor_id: int) -> Optional[Doctor]:
+        return get_repositories(session).doctors.get_by_id(doctor_id)
@@ -0,0 +1,127 @@
+"""Eventos de dominio publicados después de confirmar la transacción.
+
+Los servicios encolan eventos en la sesión con `publish_after_commit`; solo
+se entregan a los suscriptores si la sesión hace commit y se descartan si
+hace rollback. Los suscriptores no deben usar la sesión que publicó.
+`run_after_commit` hace lo mismo con callbacks que actualizan estado en
+memoria ligado a la transacción.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.repositories import DataSession, InMemorySession
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "pending_events"
+_CALLBACKS_KEY = "pending_callbacks"
+
+
+@dataclass(frozen=True)
+class DoctorAvailable:
+    """Un doctor quedó libre para atender pacientes."""
+
+    doctor_id: int
+
+
+@dataclass(frozen=True)
+class DoctorRosterChanged:
+    """Cambió la disponibilidad o la asignación de algún doctor."""
+
+
+@dataclass(frozen=True)
+class PatientContextChanged:
+    """Se registró al paciente o cambió su historial o sus citas."""
+
+    phone: str
+
+
+Handler = Callable[[Any], None]
+
+
+class EventBus:
+    """Publicación síncrona por tipo de evento; los errores se registran."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._handlers: dict[type, list[Handler]] = defaultdict(list)
+
+    def subscribe(self, event_type: type, handler: Handler) -> None:
+        with self._lock:
+            self._handlers[event_type].append(handler)
+
+    def unsubscribe(self, event_type: type, handler: Handler) -> None:
+        with self._lock:
+            if handler in self._handlers[event_type]:
+                self._handlers[event_type].remove(handler)
+
+    def publish(self, domain_event: Any) -> None:
+        with self._lock:
+            handlers = list(self._handlers[type(domain_event)])
+        for handler in handlers:
+            try:
+                handler(domain_event)
+            except Exception:
+                logger.exception("Error entregando %r", domain_event)
+
+
+_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    global _bus
+    if _bus is None:
+        _bus = EventBus()
+    return _bus
+
+
+def publish_after_commit(session: DataSession, domain_event: Any) -> None:
+    """Encola el evento para entregarlo cuando la sesión haga commit."""
+    session.info.setdefault(_PENDING_KEY, []).append(domain_event)
+
+
+def run_after_commit(
+    session: DataSession,
+    on_commit: Callable[[], None],
+    on_rollback: Optional[Callable[[], None]] = None,
+) -> None:
+    """Ejecuta `on_commit` cuando la sesión haga commit, u `on_rollback` si
+    hace rollback. Los callbacks corren antes de entregar los eventos."""
+    session.info.setdefault(_CALLBACKS_KEY, []).append((on_commit, on_rollback))
+
+
+def _run_callbacks(callbacks: list[Optional[Callable[[], None]]]) -> None:
+    for callback in callbacks:
+        if callback is None:
+            continue
+        try:
+            callback()
+        except Exception:
+            logger.exception("Error en el callback de la transacción")
+
+
+def _deliver_pending(session: DataSession) -> None:
+    callbacks = session.info.pop(_CALLBACKS_KEY, None)
+    _run_callbacks([on_commit for on_commit, _ in callbacks or ()])
+    pending = session.info.pop(_PENDING_KEY, None)
+    for domain_event in pending or ():
+        get_event_bus().publish(domain_event)
+
+
+def _discard_pending(session: DataSession, *args: Any) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    callbacks = session.info.pop(_CALLBACKS_KEY, None)
+    _run_callbacks([on_rollback for _, on_rollback in callbacks or ()])
+
+
+event.listen(Session, "after_commit", _deliver_pending)
+event.listen(Session, "after_soft_rollback", _discard_pending)
+InMemorySession.after_commit_hooks.append(_deliver_pending)
+InMemorySession.after_rollback_hooks.append(_discard_pending)
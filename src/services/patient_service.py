@@ -1,66 +1,436 @@
-from typing import Optional
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
 
-from sqlalchemy.orm import Session, joinedload
+from src.database.fts import extract_search_terms
+from src.database.models import Appointment, MedicalHistory, Patient, PatientContext
+from src.repositories import DataSession, get_repositories
+from src.schemas.models import PatientContextSnapshot, PatientImport, UpcomingAppointment
+from src.schemas.phone import normalize_phone
+from src.services.notifications import PatientContextChanged, publish_after_commit
+from src.tracing import traced_service
 
-from src.database.models import MedicalHistory, Patient
+NO_HISTORY_SUMMARY = "El paciente no tiene historial médico registrado."
+HISTORY_SUMMARY_HEADER = "Historial médico del paciente:"
 
 
+@dataclass(frozen=True)
+class PatientImportResult:
+    created: int = 0
+    updated: int = 0
+    history_added: int = 0
+    emails_skipped: int = 0
+
+
+@traced_service
 class PatientService:
     @staticmethod
-    def get_patient_by_phone(session: Session, phone: str) -> Optional[Patient]:
-        return session.query(Patient).filter(Patient.phone == phone).first()
+    def get_patient_by_phone(session: DataSession, phone: str) -> Optional[Patient]:
+        """Busca por la forma canónica: acepta espacios, guiones y "+51"."""
+        return get_repositories(session).patients.get_by_phone(normalize_phone(phone))
 
     @staticmethod
-    def get_patient_by_email(session: Session, email: str) -> Optional[Patient]:
-        return session.query(Patient).filter(Patient.email == email).first()
+    def get_patient_by_email(session: DataSession, email: str) -> Optional[Patient]:
+        return get_repositories(session).patients.get_by_email(email)
 
     @staticmethod
     def get_patient_with_history(
-        session: Session, patient_id: int
+        session: DataSession, patient_id: int
     ) -> Optional[Patient]:
-        return (
-            session.query(Patient)
-            .options(joinedload(Patient.medical_history))
-            .filter(Patient.id == patient_id)
-            .first()
-        )
+        return get_repositories(session).patients.get_with_history(patient_id)
 
     @staticmethod
     def create_patient(
-        session: Session, name: str, phone: str, email: Optional[str] = None
+        session: DataSession, name: str, phone: str, email: Optional[str] = None
     ) -> Patient:
-        patient = Patient(name=name, phone=phone, email=email)
-        session.add(patient)
-        session.flush()
+        repos = get_repositories(session)
+        patient = repos.patients.add(
+            Patient(name=name, phone=normalize_phone(phone), email=email)
+        )
+        repos.patients.save_context(
+            PatientService._build_context(patient, [], []), is_new=True
+        )
+        publish_after_commit(session, PatientContextChanged(patient.phone))
         return patient
 
     @staticmethod
-    def get_medical_history_summary(session: Session, patient_id: int) -> str:
-        history_records = (
-            session.query(MedicalHistory)
-            .filter(MedicalHistory.patient_id == patient_id)
-            .order_by(MedicalHistory.date.desc())
-            .all()
+    def add_medical_history(
+        session: DataSession,
+        patient_id: int,
+        diagnosis: str,
+        treatment: str,
+        notes: Optional[str] = None,
+        date: Optional[datetime] = None,
+    ) -> MedicalHistory:
+        repos = get_repositories(session)
+        record = repos.patients.add_history(
+            MedicalHistory(
+                patient_id=patient_id,
+                diagnosis=diagnosis,
+                treatment=treatment,
+                notes=notes,
+                date=date,
+            )
+        )
+        context = repos.patients.get_context(patient_id)
+        if date is not None or context is None:
+            # Con fecha explícita el registro puede no ser el más reciente
+            # y el resumen debe reordenarse.
+            PatientService.refresh_patient_context(session, patient_id)
+            return record
+
+        # Un registro fechado ahora es el más reciente: va primero.
+        entries = context.history_summary.removeprefix(HISTORY_SUMMARY_HEADER)
+        if context.history_summary == NO_HISTORY_SUMMARY:
+            entries = ""
+        PatientService._save_context_update(
+            session,
+            context,
+            history_summary=HISTORY_SUMMARY_HEADER
+            + PatientService._render_history_entry(record)
+            + entries,
+        )
+        return record
+
+    @staticmethod
+    def get_medical_history_summary(session: DataSession, patient_id: int) -> str:
+        history_records = get_repositories(session).patients.list_history(patient_id)
+        return PatientService._render_history_summary(history_records)
+
+    @staticmethod
+    def search_medical_history(
+        session: DataSession,
+        query: str,
+        patient_id: Optional[int] = None,
+        limit: int = 5,
+    ) -> list[MedicalHistory]:
+        """Búsqueda de texto completo en diagnóstico, tratamiento y notas."""
+        terms = extract_search_terms(query)
+        return get_repositories(session).patients.search_history(
+            terms, patient_id=patient_id, limit=limit
+        )
+
+    @staticmethod
+    def get_relevant_history_summary(
+        session: DataSession, patient_id: int, message: str, limit: int = 3
+    ) -> str:
+        """Resumen con los `limit` registros más relevantes para el mensaje.
+
+        Si ningún registro coincide, usa los más recientes.
+        """
+        repos = get_repositories(session)
+        records = repos.patients.search_history(
+            extract_search_terms(message), patient_id=patient_id, limit=limit
         )
+        if not records:
+            records = repos.patients.list_history(patient_id, limit=limit)
+        return PatientService._render_history_summary(records)
 
+    @staticmethod
+    def _render_history_summary(history_records: list[MedicalHistory]) -> str:
         if not history_records:
-            return "El paciente no tiene historial médico registrado."
-
-        summary_parts = ["Historial médico del paciente:"]
-        for record in history_records:
-            date_str = record.date.strftime("%d/%m/%Y")
-            summary_parts.append(
-                f"\n- Fecha: {date_str}\n"
-                f"  Diagnóstico: {record.diagnosis}\n"
-                f"  Tratamiento: {record.treatment}"
+            return NO_HISTORY_SUMMARY
+
+        return HISTORY_SUMMARY_HEADER + "".join(
+            PatientService._render_history_entry(record) for record in history_records
+        )
+
+    @staticmethod
+    def _render_history_entry(record: MedicalHistory) -> str:
+        entry = (
+            f"\n- Fecha: {record.date.strftime('%d/%m/%Y')}\n"
+            f"  Diagnóstico: {record.diagnosis}\n"
+            f"  Tratamiento: {record.treatment}"
+        )
+        if record.notes:
+            entry += f"\n  Notas: {record.notes}"
+        return entry
+
+    @staticmethod
+    def patient_exists(session: DataSession, phone: str) -> bool:
+        return PatientService.get_patient_by_phone(session, phone) is not None
+
+    @staticmethod
+    def get_patient_context(
+        session: DataSession, phone: str
+    ) -> Optional[PatientContextSnapshot]:
+        """Contexto del paciente (nombre, historial y próximas citas) en una lectura."""
+        context = get_repositories(session).patients.get_context_by_phone(
+            normalize_phone(phone)
+        )
+        if context is None:
+            return None
+
+        now = datetime.now()
+        upcoming = [
+            UpcomingAppointment(
+                scheduled_at=datetime.fromisoformat(item["scheduled_at"]),
+                doctor_name=item["doctor_name"],
+                status=item["status"],
             )
-            if record.notes:
-                summary_parts.append(f"\n  Notas: {record.notes}")
+            for item in json.loads(context.appointments_digest)
+        ]
+        return PatientContextSnapshot(
+            patient_id=context.patient_id,
+            name=context.name,
+            phone=context.phone,
+            history_summary=context.history_summary,
+            upcoming_appointments=[
+                apt for apt in upcoming if apt.scheduled_at >= now
+            ],
+        )
 
-        return "".join(summary_parts)
+    @staticmethod
+    def refresh_patient_context(session: DataSession, patient_id: int) -> None:
+        """Reconstruye el snapshot tras una escritura de historial o citas."""
+        repos = get_repositories(session)
+        patient = repos.patients.get_by_id(patient_id)
+        if patient is None:
+            return
+        history = repos.patients.list_history(patient_id)
+        appointments = repos.appointments.list_for_patient(
+            patient_id, since=datetime.now()
+        )
+        repos.patients.save_context(
+            PatientService._build_context(patient, history, appointments)
+        )
+        publish_after_commit(session, PatientContextChanged(patient.phone))
+
+    @staticmethod
+    def add_appointment_to_context(
+        session: DataSession, appointment: Appointment, doctor_name: str
+    ) -> None:
+        """Agrega la cita nueva al digest sin releer historial ni citas.
+
+        Las citas ya pasadas salen del digest en la misma escritura.
+        """
+        context = get_repositories(session).patients.get_context(appointment.patient_id)
+        if context is None:
+            PatientService.refresh_patient_context(session, appointment.patient_id)
+            return
+        now = datetime.now().isoformat()
+        digest = [
+            item
+            for item in json.loads(context.appointments_digest)
+            if item["scheduled_at"] >= now
+        ]
+        digest.append(PatientService._digest_entry(appointment, doctor_name))
+        digest.sort(key=lambda item: item["scheduled_at"])
+        PatientService._save_context_update(
+            session, context, appointments_digest=json.dumps(digest)
+        )
 
     @staticmethod
-    def patient_exists(session: Session, phone: str) -> bool:
-        return (
-            session.query(Patient).filter(Patient.phone == phone).first() is not None
+    def _save_context_update(
+        session: DataSession, context: PatientContext, **changes: str
+    ) -> None:
+        # Se guarda una copia: en memoria el snapshot leído es el del store y
+        # modificarlo en su lugar no se desharía con un rollback.
+        updated = PatientContext(
+            patient_id=context.patient_id,
+            phone=context.phone,
+            name=context.name,
+            history_summary=context.history_summary,
+            appointments_digest=context.appointments_digest,
+            updated_at=datetime.utcnow(),
         )
+        for field_name, value in changes.items():
+            setattr(updated, field_name, value)
+        get_repositories(session).patients.save_context(updated)
+        publish_after_commit(session, PatientContextChanged(context.phone))
+
+    @staticmethod
+    def backfill_patient_contexts(session: DataSession) -> int:
+        """Crea el snapshot de los pacientes que aún no lo tienen."""
+        missing = get_repositories(session).patients.list_ids_without_context()
+        for patient_id in missing:
+            PatientService.refresh_patient_context(session, patient_id)
+        return len(missing)
+
+    @staticmethod
+    def normalize_patient_phones(session: DataSession) -> int:
+        """Migra los teléfonos a la forma canónica y fusiona los duplicados.
+
+        Los pacientes cuyo teléfono coincide al normalizarlo se fusionan en
+        el más antiguo, que recibe el historial y las citas de los demás (y
+        su email si no tenía). Retorna cuántos pacientes se fusionaron.
+        """
+        repos = get_repositories(session)
+        raw_phones = dict(repos.patients.list_phones())
+        groups: dict[str, list[int]] = defaultdict(list)
+        for patient_id, phone in raw_phones.items():
+            groups[normalize_phone(phone)].append(patient_id)
+
+        merged = 0
+        for phone, (survivor_id, *duplicate_ids) in groups.items():
+            if not duplicate_ids and raw_phones[survivor_id] == phone:
+                continue
+            fields = {"phone": phone}
+            if duplicate_ids:
+                survivor = repos.patients.get_by_id(survivor_id)
+                emails = [repos.patients.get_by_id(dup).email for dup in duplicate_ids]
+                repos.patients.merge(survivor_id, duplicate_ids)
+                merged += len(duplicate_ids)
+                if not survivor.email:
+                    fields["email"] = next((email for email in emails if email), None)
+            repos.patients.update(survivor_id, **fields)
+            PatientService.refresh_patient_context(session, survivor_id)
+        return merged
+
+    @staticmethod
+    def import_patients(
+        session: DataSession, records: Iterable[PatientImport]
+    ) -> PatientImportResult:
+        """Upsert por teléfono de un lote de pacientes con su historial.
+
+        Las lecturas y las escrituras son por lote, no por paciente: el
+        número de sentencias no depende del tamaño del lote. Los
+        registros con el mismo teléfono se combinan; un paciente existente
+        actualiza nombre y email. Se omite el historial idéntico (fecha,
+        diagnóstico y tratamiento) al ya guardado, así reimportar un lote no
+        lo duplica. Un email que ya pertenece a otro paciente no se asigna.
+        """
+        repos = get_repositories(session)
+        merged: dict[str, PatientImport] = {}
+        for record in records:
+            previous = merged.get(record.phone)
+            merged[record.phone] = (
+                record
+                if previous is None
+                else record.model_copy(
+                    update={
+                        "email": record.email or previous.email,
+                        "history": previous.history + record.history,
+                    }
+                )
+            )
+        if not merged:
+            return PatientImportResult()
+
+        existing = {p.phone: p for p in repos.patients.list_by_phones(merged)}
+        email_owners = {
+            p.email: p.phone
+            for p in repos.patients.list_by_emails(
+                {record.email for record in merged.values() if record.email}
+            )
+        }
+
+        created, changes, emails_skipped = [], {}, 0
+        for phone, record in merged.items():
+            email = record.email
+            if email and email_owners.setdefault(email, phone) != phone:
+                email, emails_skipped = None, emails_skipped + 1
+            patient = existing.get(phone)
+            if patient is None:
+                created.append(Patient(name=record.name, phone=phone, email=email))
+                continue
+            name, email = record.name or patient.name, email or patient.email
+            if (name, email) != (patient.name, patient.email):
+                changes[patient.id] = {"name": name, "email": email}
+        repos.patients.update_many(changes)
+        repos.patients.add_many(created)
+
+        patients = {**existing, **{patient.phone: patient for patient in created}}
+        stored_history = repos.patients.list_history_for(p.id for p in existing.values())
+        known = {
+            (item.patient_id, item.date, item.diagnosis, item.treatment)
+            for item in stored_history
+        }
+        now = datetime.utcnow()
+        new_history: dict[int, list[MedicalHistory]] = defaultdict(list)
+        for phone, record in merged.items():
+            patient_id = patients[phone].id
+            for item in record.history:
+                key = (patient_id, item.date or now, item.diagnosis, item.treatment)
+                if key in known:
+                    continue
+                known.add(key)
+                new_history[patient_id].append(
+                    MedicalHistory(
+                        patient_id=patient_id,
+                        date=key[1],
+                        diagnosis=item.diagnosis,
+                        treatment=item.treatment,
+                        notes=item.notes,
+                    )
+                )
+        repos.patients.add_history_many(
+            [item for items in new_history.values() for item in items]
+        )
+
+        repos.patients.add_contexts(
+            [
+                PatientService._build_context(
+                    patient,
+                    sorted(new_history[patient.id], key=lambda item: item.date, reverse=True),
+                    [],
+                )
+                for patient in created
+            ]
+        )
+
+        # Los snapshots de los existentes que cambiaron se reconstruyen en
+        # memoria con el historial ya leído y se reemplazan por lote.
+        refreshed = {
+            patient.id: patient
+            for patient in existing.values()
+            if patient.id in changes or patient.id in new_history
+        }
+        history = defaultdict(list)
+        for item in stored_history:
+            history[item.patient_id].append(item)
+        for patient_id in refreshed:
+            history[patient_id].extend(new_history[patient_id])
+        appointments = defaultdict(list)
+        for appointment in repos.appointments.list_for_patients(
+            refreshed, since=datetime.now()
+        ):
+            appointments[appointment.patient_id].append(appointment)
+        repos.patients.replace_contexts(
+            [
+                PatientService._build_context(
+                    patient,
+                    sorted(history[patient_id], key=lambda item: item.date, reverse=True),
+                    appointments[patient_id],
+                )
+                for patient_id, patient in refreshed.items()
+            ]
+        )
+        for patient in [*created, *refreshed.values()]:
+            publish_after_commit(session, PatientContextChanged(patient.phone))
+
+        return PatientImportResult(
+            created=len(created),
+            updated=len(changes),
+            history_added=sum(len(items) for items in new_history.values()),
+            emails_skipped=emails_skipped,
+        )
+
+    @staticmethod
+    def _build_context(
+        patient: Patient,
+        history: list[MedicalHistory],
+        appointments: list[Appointment],
+    ) -> PatientContext:
+        digest = [
+            PatientService._digest_entry(apt, apt.doctor.name if apt.doctor else "Doctor")
+            for apt in sorted(appointments, key=lambda apt: apt.scheduled_at)
+        ]
+        return PatientContext(
+            patient_id=patient.id,
+            phone=patient.phone,
+            name=patient.name,
+            history_summary=PatientService._render_history_summary(history),
+            appointments_digest=json.dumps(digest),
+            updated_at=datetime.utcnow(),
+        )
+
+    @staticmethod
+    def _digest_entry(appointment: Appointment, doctor_name: str) -> dict[str, str]:
+        return {
+            "scheduled_at": appointment.scheduled_at.isoformat(),
+            "doctor_name": doctor_name,
+            "status": appointment.status,
+        }
@@ -0,0 +1,231 @@
+"""Lecturas cacheadas del panel lateral con invalidación por escritura.
+
+El contexto del paciente se cachea por teléfono y la lista de doctores como
+un único roster; ambos se invalidan con los eventos que publican los
+servicios tras el commit (`PatientContextChanged`, `DoctorRosterChanged`).
+`PatientIdentityCache` resuelve teléfono → (id, nombre) para el nodo que
+verifica al paciente en cada turno. Las claves son teléfonos normalizados,
+así cualquier formato del mismo número comparte entrada.
+
+Las cachés viven en el proceso: escrituras hechas por otro proceso solo se
+ven tras reiniciar o llamar a `clear()`.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from src.database.connection import get_session, get_session_factory
+from src.schemas.models import DoctorAvailability, PatientContextSnapshot
+from src.schemas.phone import normalize_phone
+from src.services.doctor_service import DoctorService
+from src.services.notifications import (
+    DoctorRosterChanged,
+    PatientContextChanged,
+    get_event_bus,
+)
+from src.services.patient_service import PatientService
+
+_MISSING = object()
+
+
+class SidebarCache:
+    """Caché LRU de contextos de paciente y del roster de doctores.
+
+    Cada invalidación incrementa una generación; una lectura que empezó
+    antes de la invalidación no guarda su resultado, así un commit
+    concurrente nunca deja un valor viejo en la caché.
+    """
+
+    def __init__(self, max_patients: int = 1024) -> None:
+        self.max_patients = max_patients
+        self._lock = threading.Lock()
+        self._patients: OrderedDict[str, Optional[PatientContextSnapshot]] = OrderedDict()
+        self._roster: Optional[list[DoctorAvailability]] = None
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def install(self) -> "SidebarCache":
+        bus = get_event_bus()
+        bus.subscribe(PatientContextChanged, self.on_patient_changed)
+        bus.subscribe(DoctorRosterChanged, self.on_roster_changed)
+        return self
+
+    def uninstall(self) -> None:
+        bus = get_event_bus()
+        bus.unsubscribe(PatientContextChanged, self.on_patient_changed)
+        bus.unsubscribe(DoctorRosterChanged, self.on_roster_changed)
+
+    def patient_context(self, phone: str) -> Optional[PatientContextSnapshot]:
+        """Contexto del paciente; None si el teléfono no está registrado."""
+        phone = normalize_phone(phone)
+        with self._lock:
+            cached = self._patients.get(phone, _MISSING)
+            if cached is not _MISSING:
+                self._patients.move_to_end(phone)
+                self.hits += 1
+                return self._only_upcoming(cached)
+            self.misses += 1
+            generation = self._generation
+
+        with get_session() as session:
+            context = PatientService.get_patient_context(session, phone)
+
+        with self._lock:
+            if generation == self._generation:
+                self._patients[phone] = context
+                if len(self._patients) > self.max_patients:
+                    self._patients.popitem(last=False)
+        return context
+
+    def doctor_roster(self) -> list[DoctorAvailability]:
+        with self._lock:
+            if self._roster is not None:
+                self.hits += 1
+                return list(self._roster)
+            self.misses += 1
+            generation = self._generation
+
+        with get_session() as session:
+            roster = DoctorService.get_all_doctors(session)
+
+        with self._lock:
+            if generation == self._generation:
+                self._roster = roster
+        return list(roster)
+
+    def on_patient_changed(self, event: PatientContextChanged) -> None:
+        with self._lock:
+            self._generation += 1
+            self._patients.pop(normalize_phone(event.phone), None)
+
+    def on_roster_changed(self, event: DoctorRosterChanged) -> None:
+        with self._lock:
+            self._generation += 1
+            self._roster = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._patients.clear()
+            self._roster = None
+
+    @staticmethod
+    def _only_upcoming(
+        context: Optional[PatientContextSnapshot],
+    ) -> Optional[PatientContextSnapshot]:
+        """Quita las citas que pasaron desde que se cacheó el contexto."""
+        if context is None:
+            return None
+        now = datetime.now()
+        upcoming = [apt for apt in context.upcoming_appointments if apt.scheduled_at >= now]
+        if len(upcoming) == len(context.upcoming_appointments):
+            return context
+        return context.model_copy(update={"upcoming_appointments": upcoming})
+
+
+@dataclass(frozen=True)
+class PatientIdentity:
+    patient_id: int
+    name: str
+
+
+class PatientIdentityCache:
+    """Caché LRU acotada teléfono → identidad del paciente.
+
+    Solo guarda pacientes registrados: un teléfono desconocido se vuelve a
+    consultar, porque otro proceso (otro worker, el importador) puede darlo
+    de alta sin que este reciba el evento. Si cambia la base configurada
+    (otra fábrica de sesiones) la caché se vacía.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, PatientIdentity] = OrderedDict()
+        self._generation = 0
+        self._factory = None
+        self.hits = 0
+        self.misses = 0
+
+    def install(self) -> "PatientIdentityCache":
+        get_event_bus().subscribe(PatientContextChanged, self.on_patient_changed)
+        return self
+
+    def uninstall(self) -> None:
+        get_event_bus().unsubscribe(PatientContextChanged, self.on_patient_changed)
+
+    def resolve(self, phone: str) -> Optional[PatientIdentity]:
+        """Identidad del paciente; None si el teléfono no está registrado."""
+        phone = normalize_phone(phone)
+        if not phone:
+            return None
+        factory = get_session_factory()
+        with self._lock:
+            if factory is not self._factory:
+                self._factory = factory
+                self._generation += 1
+                self._entries.clear()
+            cached = self._entries.get(phone)
+            if cached is not None:
+                self._entries.move_to_end(phone)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            generation = self._generation
+
+        with get_session() as session:
+            patient = PatientService.get_patient_by_phone(session, phone)
+            identity = (
+                PatientIdentity(patient_id=patient.id, name=patient.name)
+                if patient
+                else None
+            )
+
+        with self._lock:
+            if identity is not None and generation == self._generation:
+                self._entries[phone] = identity
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return identity
+
+    def on_patient_changed(self, event: PatientContextChanged) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(normalize_phone(event.phone), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+_sidebar_cache: Optional[SidebarCache] = None
+_sidebar_cache_lock = threading.Lock()
+
+
+def get_sidebar_cache() -> SidebarCache:
+    """Caché del proceso, suscrita a los eventos de escritura."""
+    global _sidebar_cache
+    if _sidebar_cache is None:
+        with _sidebar_cache_lock:
+            if _sidebar_cache is None:
+                _sidebar_cache = SidebarCache().install()
+    return _sidebar_cache
+
+
+_identity_cache: Optional[PatientIdentityCache] = None
+_identity_cache_lock = threading.Lock()
+
+
+def get_identity_cache() -> PatientIdentityCache:
+    """Caché de identidades del proceso, suscrita a las escrituras de pacientes."""
+    global _identity_cache
+    if _identity_cache is None:
+        with _identity_cache_lock:
+            if _identity_cache is None:
+                _identity_cache = PatientIdentityCache().install()
+    return _identity_cache
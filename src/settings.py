@@ -17,6 +17,70 @@ class Settings(BaseSettings):
         default="gemini-2.5-flash",
         description="Gemini model to use",
     )
+    slow_query_threshold_ms: float = Field(
+        default=100.0,
+        description="Duration above which a SQL statement is logged as slow",
+    )
+    slow_query_log_size: int = Field(
+        default=200,
+        description="Number of slow queries kept in the ring buffer",
+    )
+    conversation_max_turns: int = Field(
+        default=20,
+        description="Conversation turns kept in the graph state; older ones are evicted",
+    )
+    tracing_jsonl_path: str | None = Field(
+        default=None,
+        description="JSONL file where trace spans are appended; tracing is off when unset",
+    )
+    api_max_concurrency: int = Field(
+        default=8,
+        description="Graph runs the HTTP API executes concurrently",
+    )
+    api_request_timeout_s: float = Field(
+        default=60.0,
+        description="Maximum time an HTTP API request may wait for or run the graph",
+    )
+    waitlist_resume_concurrency: int = Field(
+        default=4,
+        description="Waiting urgency threads resumed concurrently when doctors become available",
+    )
+    dispatch_assignment_ttl_s: float = Field(
+        default=600.0,
+        description="Time a doctor stays reserved for a queued urgency before being released",
+    )
+    dispatch_chat_timeout_s: float = Field(
+        default=1800.0,
+        description="Time a doctor stays connected to an urgency chat that is never ended",
+    )
+    checkpoint_db_path: str = Field(
+        default="./checkpoints.db",
+        description="SQLite file where conversation checkpoints are stored",
+    )
+    checkpoint_keep_last: int = Field(
+        default=3,
+        description="Checkpoints kept per thread; older ones are pruned",
+    )
+    checkpoint_ttl_hours: float = Field(
+        default=72.0,
+        description="Idle time after which a thread is deleted by compaction",
+    )
+    checkpoint_flush_interval_s: float = Field(
+        default=1.0,
+        description="Maximum delay before buffered checkpoint writes are flushed",
+    )
+    checkpoint_batch_size: int = Field(
+        default=64,
+        description="Buffered checkpoint writes that trigger an immediate flush",
+    )
+    checkpoint_compression_threshold: int | None = Field(
+        default=1024,
+        description="Serialized size in bytes above which checkpoints are zstd-compressed",
+    )
+    checkpoint_compaction_interval_s: float = Field(
+        default=3600.0,
+        description="Interval between background checkpoint compactions",
+    )
 
 
 def get_settings() -> Settings:
@@ -0,0 +1,210 @@
+"""Trazas por spans de nodos del grafo, llamadas al LLM y servicios.
+
+Cada span registra duración, atributos y su span padre, de modo que una
+conversación lenta puede desglosarse salto a salto. Los spans se exportan a
+un archivo JSONL local o a un colector en memoria; sin exportadores
+configurados el tracer no hace nada.
+"""
+
+import functools
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Generator, Optional, Protocol
+
+from src.database.instrumentation import get_query_monitor
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+_current_thread_id: ContextVar[Optional[str]] = ContextVar("trace_thread_id", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    thread_id: Optional[str]
+    started_at: datetime
+    duration_ms: float = 0.0
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "thread_id": self.thread_id,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Span descartable usado cuando no hay exportadores."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class InMemoryExporter:
+    """Colector en memoria, útil en tests y en la UI de depuración."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonlExporter:
+    """Agrega cada span como una línea JSON al archivo indicado."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+
+class Tracer:
+    """Crea spans anidados y los entrega a los exportadores configurados."""
+
+    def __init__(self, exporters: Optional[list[SpanExporter]] = None) -> None:
+        self.exporters: list[SpanExporter] = list(exporters or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.remove(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Generator[Span | _NoopSpan, None, None]:
+        """Abre un span hijo del activo; registra el error si el bloque falla."""
+        if not self.exporters:
+            yield _NOOP_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            thread_id=_current_thread_id.get(),
+            started_at=datetime.now(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as exc:
+            span.status = "error"
+            span.error = repr(exc)
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                exporter.export(span)
+
+
+@contextmanager
+def bind_thread_id(thread_id: Optional[str]) -> Generator[None, None, None]:
+    """Asocia los spans abiertos dentro del bloque a la conversación `thread_id`."""
+    token = _current_thread_id.set(thread_id)
+    try:
+        yield
+    finally:
+        _current_thread_id.reset(token)
+
+
+def current_span() -> Span | _NoopSpan:
+    return _current_span.get() or _NOOP_SPAN
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Tracer del proceso; exporta a `tracing_jsonl_path` si está configurado."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                from src.settings import get_settings
+
+                path = get_settings().tracing_jsonl_path
+                _tracer = Tracer([JsonlExporter(path)] if path else [])
+    return _tracer
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Envuelve la función en un span con las sentencias SQL que ejecuta."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name) as span, get_query_monitor().capture() as capture:
+                result = func(*args, **kwargs)
+                span.set_attribute("sql_statements", capture.count)
+                span.set_attribute("sql_ms", round(capture.total_ms, 3))
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def traced_service(cls: type) -> type:
+    """Traza cada método estático público del servicio como `service.<Clase>.<método>`."""
+    for attr, value in list(vars(cls).items()):
+        if isinstance(value, staticmethod) and not attr.startswith("_"):
+            wrapped = traced(f"service.{cls.__name__}.{attr}")(value.__func__)
+            setattr(cls, attr, staticmethod(wrapped))
+    return cls
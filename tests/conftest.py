@@ -0,0 +1,100 @@
+import uuid
+
+import pytest
+
+from src.database import connection
+from src.database.instrumentation import get_query_monitor
+from src.graph import dispatch
+from src.graph.graph import get_initial_state, get_turn_input
+from src.services.doctor_service import DoctorService
+
+URGENCY_MESSAGE = "Se me rompió un diente y me duele mucho"
+
+
+@pytest.fixture
+def seeded_db(tmp_path, monkeypatch):
+    """Base de datos SQLite temporal con los datos demo cargados."""
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(connection, "_engine", None)
+    monkeypatch.setattr(connection, "_SessionLocal", None)
+
+    connection.init_db()
+    connection.seed_demo_data()
+    yield connection.get_engine()
+    connection.get_engine().dispose()
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    """Backend en memoria con los datos demo cargados."""
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("DATABASE_URL", connection.MEMORY_DATABASE_URL)
+    monkeypatch.setattr(connection, "_SessionLocal", None)
+    monkeypatch.setattr(connection, "_memory_store", None)
+
+    connection.init_db()
+    connection.seed_demo_data()
+    yield connection.get_memory_store()
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def any_db(request):
+    """Ejecuta el test contra ambos backends de repositorio."""
+    yield request.getfixturevalue(f"{request.param}_db")
+
+
+@pytest.fixture
+def sqlite_db(seeded_db):
+    yield seeded_db
+
+
+@pytest.fixture
+def query_monitor():
+    return get_query_monitor()
+
+
+@pytest.fixture
+def isolated_dispatcher(monkeypatch):
+    """Despachador del proceso aislado: no escucha el bus y se descarta al final.
+
+    Evita que un `WaitlistResumer` creado en un test quede suscrito al
+    despachador global y reciba los `DoctorAvailable` de tests posteriores.
+    """
+    dispatcher = dispatch.DoctorDispatcher()
+    monkeypatch.setattr(dispatch, "_dispatcher", dispatcher)
+    return dispatcher
+
+
+@pytest.fixture
+def set_roster():
+    """Abre (`"open"`) o cierra (`"closed"`) la clínica completa."""
+
+    def apply(roster: str) -> None:
+        with connection.get_session() as session:
+            DoctorService.set_clinic_availability(session, roster == "open")
+
+    return apply
+
+
+@pytest.fixture
+def start_urgency():
+    """Abre un hilo nuevo con un mensaje de urgencia.
+
+    Retorna el config del hilo y el interrupt pendiente, que debe ser del
+    tipo `expected`.
+    """
+
+    def start(
+        graph,
+        phone: str = "70000001",
+        expected: str = "urgency_no_doctors",
+        message: str = URGENCY_MESSAGE,
+    ) -> tuple[dict, dict]:
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        graph_input = {**get_initial_state(phone), **get_turn_input(message)}
+        payload = graph.invoke(graph_input, config)["__interrupt__"][0].value
+        assert payload["type"] == expected
+        return config, payload
+
+    return start
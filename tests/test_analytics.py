@@ -0,0 +1,109 @@
+import json
+import time
+import uuid
+
+import pytest
+from langgraph.types import Command
+
+from src.agents.llm import set_llm_factory
+from src.analytics import ConversationExporter
+from src.graph.checkpointer import SqliteCheckpointer
+from src.graph.graph import create_dental_graph, get_initial_state, get_turn_input
+from src.loadtest.stub_llm import stub_llm_factory
+
+
+@pytest.fixture
+def exporter(memory_db, tmp_path):
+    set_llm_factory(stub_llm_factory())
+    saver = SqliteCheckpointer(tmp_path / "checkpoints.db", flush_interval=0)
+    yield ConversationExporter(create_dental_graph(saver), saver, chunk_size=2, idle_seconds=0)
+    saver.close()
+    set_llm_factory(None)
+
+
+def _turn(graph, message: str, thread_id: str | None = None, phone: str = "999888777"):
+    config = {"configurable": {"thread_id": thread_id or str(uuid.uuid4())}}
+    graph_input = get_turn_input(message)
+    if thread_id is None:
+        graph_input = {**get_initial_state(phone), **graph_input}
+    return config["configurable"]["thread_id"], graph.invoke(graph_input, config)
+
+
+def _rows(result):
+    return {row["thread_id"]: row for row in map(json.loads, result.path.read_text().splitlines())}
+
+
+class TestConversationExporter:
+    """Tests para la exportación incremental de conversaciones."""
+
+    def test_exports_ended_threads_with_outcomes(
+        self, exporter, tmp_path, set_roster, start_urgency
+    ):
+        graph = exporter.graph
+        set_roster("open")
+        general, _ = _turn(graph, "Hola, ¿qué horario tienen?")
+        _turn(graph, "¿Atienden sábados?", general)
+        config, payload = start_urgency(graph, "999888777", expected="slot_selection")
+        booked, slot = config["configurable"]["thread_id"], payload["slots"][0]
+        graph.invoke(Command(resume={"slot_id": slot["slot_id"]}), config)
+        set_roster("closed")
+        waiting = start_urgency(graph, "999777666")[0]["configurable"]["thread_id"]
+
+        result = exporter.export(tmp_path / "exports")
+
+        rows = _rows(result)
+        assert set(rows) == {general, booked, waiting}
+        assert result.threads_scanned == 3
+        assert rows[waiting]["pending_interrupt"] == "urgency_no_doctors"
+        assert rows[booked]["pending_interrupt"] is None
+        assert rows[general]["turn_count"] == 2
+        assert rows[general]["classified_general"] == 2
+        assert rows[general]["responses_measured"] == 2
+        assert rows[general]["response_mean_ms"] >= 0
+        assert rows[booked]["last_classification"] == "urgency"
+        assert rows[booked]["appointment_status"] == "scheduled"
+        assert rows[booked]["appointment_doctor_id"] == slot["doctor_id"]
+        assert rows[booked]["slot_scheduled_at"] == slot["scheduled_at"].isoformat()
+        assert rows[booked]["patient_id"] == 1
+        assert "patient_phone" not in rows[booked]
+
+    def test_incremental_runs_export_only_new_activity(self, exporter, tmp_path):
+        graph = exporter.graph
+        first, _ = _turn(graph, "Hola")
+        _turn(graph, "Hola")
+        output = tmp_path / "exports"
+        assert exporter.export(output).rows == 2
+
+        unchanged = exporter.export(output)
+        assert (unchanged.rows, unchanged.path) == (0, None)
+
+        _turn(graph, "Gracias", first)
+        again = exporter.export(output)
+        assert list(_rows(again)) == [first]
+        assert _rows(again)[first]["turn_count"] == 2
+
+    def test_active_threads_wait_for_the_idle_window(self, exporter, tmp_path):
+        thread_id, _ = _turn(exporter.graph, "Hola")
+        output = tmp_path / "exports"
+        exporter.idle_seconds = 3600
+
+        early = exporter.export(output)
+
+        assert (early.rows, early.path) == (0, None)
+        assert early.watermark < time.time() - 3000
+        exporter.idle_seconds = 0
+        assert list(_rows(exporter.export(output))) == [thread_id]
+
+    def test_columnar_formats(self, exporter, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        for _ in range(3):
+            _turn(exporter.graph, "Hola")
+
+        csv_result = exporter.export(tmp_path / "csv", "csv")
+        parquet_result = exporter.export(tmp_path / "parquet", "parquet")
+
+        assert len(csv_result.path.read_text().splitlines()) == 4
+        table = pq.read_table(parquet_result.path)
+        assert table.num_rows == 3
+        assert pq.ParquetFile(parquet_result.path).num_row_groups == 2
+        assert table.column("turn_count").to_pylist() == [1, 1, 1]
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from starlette.exceptions import HTTPException
+from starlette.testclient import TestClient
+
+from src.api import create_app
+from src.api.app import GraphRunner
+from src.graph import nodes
+from src.graph.graph import create_dental_graph
+
+
+@pytest.fixture
+def client(seeded_db):
+    classifier = MagicMock()
+    classifier.return_value.classify.side_effect = lambda message: (
+        "urgency" if "dolor" in message else "general"
+    )
+    responder = MagicMock()
+    responder.return_value.respond_general_query.return_value = "respuesta general"
+    responder.return_value.respond_urgency.return_value = "respuesta urgencia"
+    with patch.object(nodes, "MessageClassifier", classifier), patch.object(
+        nodes, "DentalResponder", responder
+    ):
+        app = create_app(graph=create_dental_graph(MemorySaver()), max_concurrency=2)
+        with TestClient(app) as client:
+            yield client
+
+
+class TestConversationApi:
+    """Tests para la API HTTP del grafo."""
+
+    def test_first_turn_requires_phone(self, client):
+        """El primer turno de un hilo necesita el teléfono del paciente."""
+        response = client.post("/threads/t1/turns", json={"message": "Hola"})
+        assert response.status_code == 422
+
+    def test_general_turn(self, client):
+        """Un turno general retorna solo los mensajes nuevos del asistente."""
+        body = {"message": "Hola", "patient_phone": "999888777"}
+        first = client.post("/threads/t1/turns", json=body).json()
+        second = client.post("/threads/t1/turns", json={"message": "¿Horarios?"}).json()
+
+        assert [m["content"] for m in first["messages"]] == ["respuesta general"]
+        assert [m["content"] for m in second["messages"]] == ["respuesta general"]
+        assert second["interrupts"] == []
+
+    def test_slot_selection_interrupt_and_resume(self, client):
+        """La urgencia queda pendiente de elegir horario y se reanuda con el slot."""
+        body = {"message": "Tengo dolor de muela", "patient_phone": "999888777"}
+        result = client.post("/threads/t2/turns", json=body).json()
+
+        payload = result["interrupts"][0]["value"]
+        assert payload["type"] == "slot_selection"
+        assert len(payload["slots"]) <= 3
+        assert payload["total"] == sum(day["count"] for day in payload["days"])
+        slot_id = payload["slots"][0]["slot_id"]
+
+        resumed = client.post("/threads/t2/resume", json={"slot_id": slot_id}).json()
+
+        assert "Cita agendada" in resumed["messages"][-2]["content"]
+        assert "Te he conectado con" in resumed["messages"][-1]["content"]
+        thread = client.get("/threads/t2").json()
+        assert thread["appointment_confirmed"]["id"] is not None
+        assert thread["interrupts"] == []
+
+    def test_slot_pages(self, client):
+        """Los horarios de un día se piden por páginas fuera del interrupt."""
+        body = {"message": "Tengo dolor de muela", "patient_phone": "999888777"}
+        result = client.post("/threads/t5/turns", json=body).json()
+        day = result["interrupts"][0]["value"]["days"][-1]
+
+        first = client.get(f"/threads/t5/slots?date={day['date']}&limit=2").json()
+        second = client.get(
+            f"/threads/t5/slots?date={day['date']}&limit=2&offset=2"
+        ).json()
+
+        assert len(first["slots"]) == 2
+        assert first["has_more"] is (day["count"] > 2)
+        assert not {s["slot_id"] for s in first["slots"]} & {
+            s["slot_id"] for s in second["slots"]
+        }
+        assert client.get("/threads/t5/slots?date=mañana").status_code == 400
+
+        resumed = client.post(
+            "/threads/t5/resume", json={"slot_id": second["slots"][0]["slot_id"]}
+        ).json()
+        assert "Cita agendada" in resumed["messages"][-2]["content"]
+
+    def test_idempotent_turn(self, client):
+        """Un reenvío con la misma clave retorna el primer resultado sin re-ejecutar."""
+        body = {"message": "Tengo dolor de muela", "patient_phone": "999888777"}
+        headers = {"Idempotency-Key": "envio-1"}
+        first = client.post("/threads/t6/turns", json=body, headers=headers).json()
+        classify = nodes.MessageClassifier.return_value.classify
+        calls = classify.call_count
+
+        second = client.post("/threads/t6/turns", json=body, headers=headers).json()
+        with client.stream(
+            "POST", "/threads/t6/turns/stream", json=body, headers=headers
+        ) as response:
+            events = [json.loads(line) for line in response.iter_lines() if line]
+
+        assert second == first
+        assert [event["event"] for event in events] == ["replay"]
+        assert events[0]["interrupts"] == first["interrupts"]
+        assert classify.call_count == calls
+        thread = client.get("/threads/t6").json()
+        assert [m["type"] for m in thread["messages"]].count("human") == 1
+
+    def test_retry_resumes_interrupted_turn(self, client):
+        """Si el turno se cortó antes de responder, el reenvío lo reanuda."""
+        body = {"message": "Hola", "patient_phone": "999888777"}
+        headers = {"Idempotency-Key": "envio-2"}
+        respond = nodes.DentalResponder.return_value.respond_general_query
+        respond.side_effect = [RuntimeError("LLM caído"), "respuesta general"]
+        with pytest.raises(RuntimeError):
+            client.post("/threads/t7/turns", json=body, headers=headers)
+        classify = nodes.MessageClassifier.return_value.classify
+        calls = classify.call_count
+
+        retried = client.post("/threads/t7/turns", json=body, headers=headers).json()
+
+        assert [m["content"] for m in retried["messages"]] == ["respuesta general"]
+        assert classify.call_count == calls
+        thread = client.get("/threads/t7").json()
+        assert [m["type"] for m in thread["messages"]].count("human") == 1
+
+    def test_idempotent_resume(self, client):
+        """Un reintento de la reanudación no agenda dos veces."""
+        body = {"message": "Tengo dolor de muela", "patient_phone": "999888777"}
+        result = client.post("/threads/t8/turns", json=body).json()
+        slot_id = result["interrupts"][0]["value"]["slots"][0]["slot_id"]
+        headers = {"Idempotency-Key": "reanudar-1"}
+
+        first = client.post(
+            "/threads/t8/resume", json={"slot_id": slot_id}, headers=headers
+        ).json()
+        client.post("/threads/t8/turns", json={"message": "Otra vez dolor de muela"})
+        retried = client.post(
+            "/threads/t8/resume", json={"slot_id": slot_id}, headers=headers
+        ).json()
+
+        assert retried == first
+        thread = client.get("/threads/t8").json()
+        assert thread["interrupts"][0]["value"]["type"] == "slot_selection"
+
+    def test_end_chat_releases_doctor(self, client):
+        """Terminar el chat libera al doctor conectado."""
+        body = {"message": "Tengo dolor de muela", "patient_phone": "999888777"}
+        result = client.post("/threads/t9/turns", json=body).json()
+        slot_id = result["interrupts"][0]["value"]["slots"][0]["slot_id"]
+        client.post("/threads/t9/resume", json={"slot_id": slot_id})
+
+        ended = client.post("/threads/t9/end").json()
+
+        assert len(ended["released_doctors"]) == 1
+        assert client.post("/threads/t9/end").json()["released_doctors"] == []
+
+    def test_resume_without_interrupt(self, client):
+        """Reanudar un hilo sin interrupt pendiente es un conflicto."""
+        client.post("/threads/t3/turns", json={"message": "Hola", "patient_phone": "999888777"})
+        assert client.post("/threads/t3/resume", json={"retry": True}).status_code == 409
+
+    def test_stream_emits_node_events(self, client):
+        """El endpoint de streaming emite un evento NDJSON por nodo."""
+        body = {"message": "Hola", "patient_phone": "999888777"}
+        with client.stream("POST", "/threads/t4/turns/stream", json=body) as response:
+            events = [json.loads(line) for line in response.iter_lines() if line]
+
+        nodes_run = [event["node"] for event in events]
+        assert nodes_run[0] == "trim_history"
+        assert nodes_run[-1] == "handle_general_query"
+
+    def test_unknown_thread(self, client):
+        assert client.get("/threads/missing").status_code == 404
+
+
+class _SlowGraph:
+    """Grafo cuyo único nodo bloquea su hilo hasta que se le libera."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.finished = threading.Event()
+
+    def stream(self, graph_input, config, stream_mode):
+        self.release.wait(5)
+        self.finished.set()
+        yield {"slow": {"messages": []}}
+
+
+class TestGraphRunner:
+    def test_permit_is_held_until_the_thread_ends(self):
+        """El timeout corta la petición, pero el permiso sigue ocupado por el hilo."""
+        graph = _SlowGraph()
+        runner = GraphRunner(graph, max_concurrency=1, timeout=0.05)
+
+        async def scenario():
+            with pytest.raises(HTTPException) as timed_out:
+                await runner.run({}, "t1")
+            with pytest.raises(HTTPException) as busy:
+                await runner.run({}, "t2")
+            graph.release.set()
+            await asyncio.to_thread(graph.finished.wait, 5)
+            for _ in range(100):
+                if not runner._semaphore.locked():
+                    break
+                await asyncio.sleep(0.01)
+            statuses = (timed_out.value.status_code, busy.value.status_code)
+            return statuses, runner._semaphore.locked()
+
+        try:
+            statuses, locked = asyncio.run(scenario())
+        finally:
+            runner.close()
+        assert statuses == (504, 503)
+        assert not locked
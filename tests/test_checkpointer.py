@@ -0,0 +1,177 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import TypedDict
+
+import pytest
+from langgraph.graph import END, StateGraph
+from langgraph.types import Command, interrupt
+
+from src.graph.checkpointer import SqliteCheckpointer
+from src.graph.dispatch import DoctorDispatcher
+from src.graph.waitlist import AvailabilityWaitlist, WaitlistResumer
+
+
+class _State(TypedDict):
+    value: int
+    answer: str | None
+
+
+def _ask(state: _State) -> _State:
+    return {"value": state["value"] + 1, "answer": interrupt("¿confirmar?")}
+
+
+def _build_graph(checkpointer):
+    graph = StateGraph(_State)
+    graph.add_node("ask", _ask)
+    graph.set_entry_point("ask")
+    graph.add_edge("ask", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "checkpoints.db"
+
+
+class TestSqliteCheckpointer:
+    """Tests para el checkpointer durable en SQLite."""
+
+    def test_interrupt_survives_restart(self, db_path):
+        """Un hilo interrumpido se reanuda desde otra instancia del proceso."""
+        saver = SqliteCheckpointer(db_path)
+        _build_graph(saver).invoke({"value": 1, "answer": None}, _config("t1"))
+        saver.close()
+
+        restarted = SqliteCheckpointer(db_path)
+        graph = _build_graph(restarted)
+        assert graph.get_state(_config("t1")).next == ("ask",)
+
+        result = graph.invoke(Command(resume="sí"), _config("t1"))
+        assert result == {"value": 2, "answer": "sí"}
+        restarted.close()
+
+    def test_writes_are_batched_until_read(self, db_path):
+        """Las escrituras quedan en el buffer hasta el flush."""
+        saver = SqliteCheckpointer(db_path, flush_interval=0)
+        _build_graph(saver).invoke({"value": 1, "answer": None}, _config("t1"))
+
+        assert saver._pending_checkpoints
+        assert saver.get_tuple(_config("t1")) is not None
+        assert not saver._pending_checkpoints
+        saver.close()
+
+    def test_keeps_only_last_checkpoints(self, db_path):
+        """La retención conserva solo los últimos N checkpoints del hilo."""
+        saver = SqliteCheckpointer(db_path, keep_last=2)
+        graph = _build_graph(saver)
+        for _ in range(3):
+            graph.invoke({"value": 1, "answer": None}, _config("t1"))
+            graph.invoke(Command(resume="ok"), _config("t1"))
+
+        history = list(saver.list(_config("t1")))
+        assert len(history) == 2
+        assert graph.get_state(_config("t1")).values["answer"] == "ok"
+        saver.close()
+
+    def test_prune_idle_threads(self, db_path):
+        """La compactación elimina los hilos sin actividad más allá del TTL."""
+        saver = SqliteCheckpointer(db_path, ttl_seconds=60)
+        graph = _build_graph(saver)
+        graph.invoke({"value": 1, "answer": None}, _config("old"))
+        saver.flush()
+        saver._conn.execute("UPDATE threads SET updated_at = ?", (time.time() - 120,))
+        graph.invoke({"value": 1, "answer": None}, _config("new"))
+
+        stats = saver.compact()
+
+        assert stats["pruned_threads"] == 1
+        assert saver.get_tuple(_config("old")) is None
+        assert saver.get_tuple(_config("new")) is not None
+        saver.close()
+
+    def test_prune_discards_waitlist_entry(self, db_path):
+        """La compactación avisa los hilos podados y el resumer los saca de la espera."""
+        saver = SqliteCheckpointer(db_path, ttl_seconds=60)
+        graph = _build_graph(saver)
+        waitlist = AvailabilityWaitlist()
+        resumer = WaitlistResumer(graph, waitlist, dispatcher=DoctorDispatcher()).install()
+        graph.invoke({"value": 1, "answer": None}, _config("old"))
+        waitlist.register("old")
+        saver.flush()
+        saver._conn.execute("UPDATE threads SET updated_at = ?", (time.time() - 120,))
+
+        assert saver.compact()["pruned_threads"] == 1
+        assert "old" not in waitlist
+        resumer.uninstall()
+        saver.close()
+
+    def test_vacuum_runs_outside_the_lock(self, db_path, monkeypatch):
+        """Mientras corre el VACUUM las escrituras no esperan al lock."""
+        saver = SqliteCheckpointer(db_path)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_vacuum():
+            started.set()
+            release.wait(5)
+
+        monkeypatch.setattr(saver, "_vacuum", slow_vacuum)
+        compaction = threading.Thread(target=saver.compact)
+        compaction.start()
+        assert started.wait(5)
+
+        graph = _build_graph(saver)
+        graph.invoke({"value": 1, "answer": None}, _config("t1"))
+        assert saver.get_tuple(_config("t1")) is not None
+        release.set()
+        compaction.join()
+        saver.close()
+
+    def test_failed_flush_keeps_the_batch(self, db_path, monkeypatch):
+        """Si la base sigue bloqueada, el lote vuelve al buffer y no se pierde."""
+        saver = SqliteCheckpointer(db_path, flush_interval=0)
+        _build_graph(saver).invoke({"value": 1, "answer": None}, _config("t1"))
+        write_batch = saver._write_batch
+
+        def locked(*args):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(saver, "_write_batch", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            saver.flush()
+        monkeypatch.setattr(saver, "_write_batch", write_batch)
+
+        saver.flush()
+        assert saver._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0] == 1
+        saver.close()
+
+    def test_async_writes_run_off_the_event_loop(self, db_path):
+        """`aput` y `aput_writes` no bloquean el event loop con SQLite."""
+        saver = SqliteCheckpointer(db_path)
+        threads = set()
+        for name in ("put", "put_writes"):
+            method = getattr(saver, name)
+            setattr(
+                saver,
+                name,
+                lambda *args, _method=method, **kwargs: threads.add(threading.get_ident())
+                or _method(*args, **kwargs),
+            )
+
+        asyncio.run(_build_graph(saver).ainvoke({"value": 1, "answer": None}, _config("t1")))
+
+        assert threads and threading.get_ident() not in threads
+        saver.close()
+
+    def test_delete_thread(self, db_path):
+        """Borrar un hilo elimina sus checkpoints persistidos."""
+        saver = SqliteCheckpointer(db_path)
+        _build_graph(saver).invoke({"value": 1, "answer": None}, _config("t1"))
+        saver.delete_thread("t1")
+        assert saver.get_tuple(_config("t1")) is None
+        saver.close()
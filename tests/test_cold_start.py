@@ -0,0 +1,40 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from src.database import connection
+
+ROOT = Path(__file__).parent.parent
+
+LLM_STACK = ("langgraph", "langchain_core", "langchain_google_genai")
+
+
+class TestColdStart:
+    """Abrir la página no debe cargar la pila del LLM ni repetir el bootstrap."""
+
+    def test_main_does_not_import_llm_stack(self):
+        code = (
+            "import sys, src.main\n"
+            f"print(','.join(p for p in {LLM_STACK!r} if p in sys.modules))"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert completed.stdout.strip() == ""
+
+    def test_bootstrap_runs_once_per_database(self, seeded_db, monkeypatch, query_monitor):
+        monkeypatch.setattr(connection, "_bootstrapped_factory", None)
+        connection.ensure_database()
+
+        with query_monitor.capture() as capture:
+            connection.ensure_database()
+        assert capture.count == 0
+
+        monkeypatch.setattr(connection, "_SessionLocal", None)
+        with query_monitor.capture() as capture:
+            connection.ensure_database()
+        assert capture.count > 0
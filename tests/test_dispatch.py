@@ -0,0 +1,272 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import ANY
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from src.agents.llm import set_llm_factory
+from src.database.connection import get_session
+from src.graph.dispatch import (
+    DispatchQueue,
+    DoctorDispatcher,
+    UrgentCase,
+    infer_specialty,
+)
+from src.graph.graph import create_dental_graph
+from src.graph.graph import get_turn_input
+from src.graph.waitlist import AvailabilityWaitlist, WaitlistResumer
+from src.loadtest.stub_llm import stub_llm_factory
+from src.services.doctor_service import DoctorService
+
+
+class TestDispatchQueue:
+    """Tests para el orden y el borrado perezoso de la cola de despacho."""
+
+    def test_orders_by_severity_then_arrival(self):
+        queue = DispatchQueue()
+        queue.push(UrgentCase("a", severity=1, enqueued_at=1.0))
+        queue.push(UrgentCase("b", severity=1, enqueued_at=2.0))
+        queue.push(UrgentCase("c", severity=0, enqueued_at=3.0))
+
+        assert [queue.pop().thread_id for _ in range(3)] == ["c", "a", "b"]
+        assert queue.pop() is None
+
+    def test_repush_escalates_without_losing_arrival(self):
+        queue = DispatchQueue()
+        queue.push(UrgentCase("a", severity=1, enqueued_at=1.0))
+        queue.push(UrgentCase("b", severity=0, enqueued_at=2.0))
+        queue.push(UrgentCase("a", severity=0, enqueued_at=5.0))
+
+        assert len(queue) == 2
+        assert queue.position("a") == 1
+        assert queue.pop() == UrgentCase("a", severity=0, enqueued_at=1.0)
+
+    def test_removed_entries_are_skipped_and_compacted(self):
+        queue = DispatchQueue()
+        for index in range(200):
+            queue.push(UrgentCase(f"t{index}", enqueued_at=float(index)))
+        for index in range(199):
+            queue.remove(f"t{index}")
+        queue.push(UrgentCase("late", enqueued_at=500.0))
+
+        assert len(queue._heap) < 50
+        assert [queue.pop().thread_id, queue.pop().thread_id] == ["t199", "late"]
+
+
+class TestClaimDoctor:
+    """Tests para el compare-and-set sobre `current_chat_id`."""
+
+    def test_second_claim_fails(self, any_db):
+        with get_session() as session:
+            assert DoctorService.claim_doctor(session, 1, "chat-a") is not None
+            assert DoctorService.claim_doctor(session, 1, "chat-b") is None
+            doctor = DoctorService.get_doctor_by_id(session, 1)
+            assert (doctor.current_chat_id, doctor.is_available) == ("chat-a", False)
+
+    def test_concurrent_claims_assign_doctor_once(self, seeded_db):
+        def claim(chat_id: str) -> bool:
+            with get_session() as session:
+                return DoctorService.claim_doctor(session, 1, chat_id) is not None
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(claim, [f"chat-{i}" for i in range(16)]))
+
+        assert results.count(True) == 1
+
+
+class TestDoctorDispatcher:
+    """Tests para el reparto de doctores entre casos urgentes."""
+
+    @pytest.fixture
+    def dispatcher(self, memory_db):
+        dispatcher = DoctorDispatcher().install()
+        yield dispatcher
+        dispatcher.uninstall()
+
+    def test_prefers_matching_specialty(self, dispatcher):
+        assert infer_specialty("Se me rompió un diente") == "Cirugía Oral"
+        with get_session() as session:
+            doctor = dispatcher.request_doctor(
+                session, UrgentCase("t1", specialty="Cirugía Oral")
+            )
+        assert doctor["specialty"] == "Cirugía Oral"
+
+    def test_balances_load_across_doctors(self, dispatcher, set_roster):
+        set_roster("open")
+        assigned = []
+        for index in range(3):
+            with get_session() as session:
+                doctor = dispatcher.request_doctor(session, UrgentCase(f"t{index}"))
+                assigned.append(doctor["doctor_id"])
+                DoctorService.release_doctor(session, doctor["doctor_id"])
+        assert sorted(assigned) == [1, 2, 3]
+
+    def test_release_dispatches_head_of_queue(self, dispatcher, set_roster):
+        set_roster("closed")
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("low", severity=1)) is None
+            assert dispatcher.request_doctor(session, UrgentCase("high", severity=0)) is None
+
+        with get_session() as session:
+            DoctorService.release_doctor(session, 2)
+
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("high"))["doctor_id"] == 2
+            assert DoctorService.get_doctor_by_id(session, 2).current_chat_id == "high"
+        assert dispatcher.position("low") == 1
+
+    def test_release_drops_pending_assignment(self, dispatcher, set_roster):
+        set_roster("closed")
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("a")) is None
+        with get_session() as session:
+            DoctorService.release_doctor(session, 2)
+        assert "a" in dispatcher._assigned
+
+        with get_session() as session:
+            DoctorService.release_doctor(session, 2)
+
+        assert dispatcher._assigned == {}
+
+    def test_unclaimed_assignment_expires(self, memory_db, set_roster):
+        dispatcher = DoctorDispatcher(assignment_ttl_s=0).install()
+        set_roster("closed")
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("a")) is None
+        with get_session() as session:
+            DoctorService.release_doctor(session, 2)
+
+        with get_session() as session:
+            doctor = dispatcher.request_doctor(session, UrgentCase("b"))
+        dispatcher.uninstall()
+
+        assert doctor["doctor_id"] == 2
+        assert "a" not in dispatcher._assigned
+
+
+    def test_end_chat_hands_doctor_to_queue(self, dispatcher, set_roster):
+        set_roster("closed")
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 2, True)
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("a"))["doctor_id"] == 2
+            assert dispatcher.request_doctor(session, UrgentCase("b")) is None
+
+        assert dispatcher.end_chat("a") == [2]
+
+        with get_session() as session:
+            assert DoctorService.get_doctor_by_id(session, 2).current_chat_id == "b"
+        assert "b" in dispatcher._assigned
+
+    def test_connected_chat_times_out(self, memory_db, set_roster):
+        dispatcher = DoctorDispatcher(chat_timeout_s=0)
+        with get_session() as session:
+            doctor = dispatcher.request_doctor(session, UrgentCase("a"))
+
+        dispatcher.release_expired()
+
+        with get_session() as session:
+            released = DoctorService.get_doctor_by_id(session, doctor["doctor_id"])
+        assert (released.current_chat_id, released.is_available) == (None, True)
+
+    def _queue_behind_free_doctor(self, dispatcher, set_roster):
+        """Deja "a" en cola con el doctor 2 libre sin que nadie lo despache."""
+        set_roster("closed")
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("a", severity=0)) is None
+        dispatcher.uninstall()
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 2, True)
+
+    def test_new_case_notifies_other_dispatched_threads(self, dispatcher, set_roster):
+        self._queue_behind_free_doctor(dispatcher, set_roster)
+        notified = []
+        dispatcher.add_listener(lambda event, thread_ids: notified.append((event, thread_ids)))
+
+        with get_session() as session:
+            assert dispatcher.request_doctor(session, UrgentCase("b")) is None
+            assert notified == []
+
+        assert notified == [(None, ["a"])]
+        assert "a" in dispatcher._assigned
+
+    def test_rollback_discards_the_dispatch(self, dispatcher, set_roster):
+        self._queue_behind_free_doctor(dispatcher, set_roster)
+
+        with pytest.raises(RuntimeError), get_session() as session:
+            dispatcher.request_doctor(session, UrgentCase("b"))
+            raise RuntimeError("fallo tras despachar")
+
+        assert dispatcher._assigned == {}
+        assert dispatcher.position("a") == 1
+        with get_session() as session:
+            assert DoctorService.get_doctor_by_id(session, 2).is_available
+
+
+class TestConnectDoctor:
+    """Tests para la conexión con un doctor tras confirmar la cita."""
+
+    @pytest.fixture
+    def resumer(self, memory_db, monkeypatch):
+        set_llm_factory(stub_llm_factory())
+        dispatcher = DoctorDispatcher(assignment_ttl_s=60).install()
+        monkeypatch.setattr("src.graph.nodes.get_dispatcher", lambda: dispatcher)
+        graph = create_dental_graph(InMemorySaver())
+        resumer = WaitlistResumer(graph, AvailabilityWaitlist(), dispatcher=dispatcher).install()
+        yield resumer
+        resumer.uninstall()
+        dispatcher.uninstall()
+        set_llm_factory(None)
+
+    def test_claims_doctor_after_slot_confirmation(self, resumer, start_urgency):
+        config, payload = start_urgency(resumer.graph, expected="slot_selection")
+        slot_id = payload["slots"][0]["slot_id"]
+
+        result = resumer.graph.invoke(Command(resume={"slot_id": slot_id}), config)
+
+        doctor_id = result["assigned_doctor"]["doctor_id"]
+        with get_session() as session:
+            doctor = DoctorService.get_doctor_by_id(session, doctor_id)
+        assert doctor.current_chat_id == config["configurable"]["thread_id"]
+        assert "Te he conectado con" in result["messages"][-1].content
+
+    def test_queued_thread_resumes_when_doctor_released(self, resumer, start_urgency):
+        config, payload = start_urgency(resumer.graph, expected="slot_selection")
+        slot_id = payload["slots"][0]["slot_id"]
+        with get_session() as session:
+            DoctorService.claim_doctor(session, 3, "otro")
+        resumer.dispatcher.queue.push(UrgentCase("emergencia", severity=0))
+
+        result = resumer.graph.invoke(Command(resume={"slot_id": slot_id}), config)
+        payload = result["__interrupt__"][0].value
+        assert (payload["type"], payload["position"]) == ("doctor_queue", 1)
+        assert "Cita agendada" in result["messages"][-1].content
+
+        with get_session() as session:
+            DoctorService.release_doctor(session, 3)
+        resumer.wait(timeout=10)
+
+        state = resumer.graph.get_state(config)
+        assert state.next == ()
+        assert state.values["assigned_doctor"]["doctor_id"] == 3
+        assert resumer.dispatcher._assigned == {"emergencia": ANY}
+
+    def test_later_urgency_dispatches_again(self, resumer, start_urgency):
+        config, payload = start_urgency(resumer.graph, expected="slot_selection")
+        first = resumer.graph.invoke(
+            Command(resume={"slot_id": payload["slots"][0]["slot_id"]}), config
+        )["assigned_doctor"]
+        resumer.dispatcher.end_chat(config["configurable"]["thread_id"])
+
+        result = resumer.graph.invoke(get_turn_input("Ahora me sangra la encía"), config)
+        assert result["appointment_confirmed"] is None
+        slot_id = result["__interrupt__"][0].value["slots"][-1]["slot_id"]
+        result = resumer.graph.invoke(Command(resume={"slot_id": slot_id}), config)
+
+        assert result["assigned_doctor"] is not None
+        assert "Te he conectado con" in result["messages"][-1].content
+        with get_session() as session:
+            doctor = DoctorService.get_doctor_by_id(session, result["assigned_doctor"]["doctor_id"])
+            assert doctor.current_chat_id == config["configurable"]["thread_id"]
+        assert first is not None
@@ -113,3 +113,153 @@ class TestEdgeRouting:
         state = {"classification": "emergency"}
         result = route_after_classification(state)
         assert result == "handle_medical_emergency"
+
+
+class TestNodeDeltas:
+    """Tests para los nodos que retornan solo las claves modificadas."""
+
+    @pytest.fixture
+    def stub_llm(self):
+        from src.graph import nodes
+
+        classifier = MagicMock()
+        classifier.return_value.classify.return_value = "general"
+        responder = MagicMock()
+        responder.return_value.respond_general_query.return_value = "respuesta"
+        responder.return_value.respond_emergency.return_value = "respuesta"
+        with patch.object(nodes, "MessageClassifier", classifier), patch.object(
+            nodes, "DentalResponder", responder
+        ):
+            yield
+
+    def test_node_returns_only_changed_keys(self, stub_llm):
+        """El nodo de emergencia solo retorna sus claves y el mensaje nuevo."""
+        from src.graph.graph import get_initial_state
+        from src.graph.nodes import handle_medical_emergency
+
+        state = get_initial_state("999888777")
+        state["messages"] = [HumanMessage(content="Hola")]
+
+        update = handle_medical_emergency(state)
+
+        assert set(update) == {"emergency_contacts_provided", "messages"}
+        assert len(update["messages"]) == 1
+
+    def test_history_grows_by_appended_messages(self, seeded_db, stub_llm):
+        """Cada turno añade sus mensajes sin duplicar el historial."""
+        from langgraph.checkpoint.memory import MemorySaver
+
+        from src.graph.graph import create_dental_graph, get_initial_state, get_turn_input
+
+        graph = create_dental_graph(MemorySaver())
+        config = {"configurable": {"thread_id": "t1"}}
+        state = get_initial_state("999888777")
+        state["messages"] = [HumanMessage(content="Hola")]
+        result = graph.invoke(state, config)
+
+        result = graph.invoke(get_turn_input("¿Horarios?"), config)
+
+        assert [type(m) for m in result["messages"]] == [
+            HumanMessage,
+            AIMessage,
+            HumanMessage,
+            AIMessage,
+        ]
+
+
+class TestMessageRetention:
+    """Tests para la política de retención de mensajes."""
+
+    def _conversation(self, turns: int) -> list:
+        messages = []
+        for i in range(turns):
+            messages.append(HumanMessage(content=f"pregunta {i}", id=f"h{i}"))
+            messages.append(AIMessage(content=f"respuesta {i}", id=f"a{i}"))
+        return messages
+
+    def test_evicts_turns_beyond_limit(self):
+        """Solo se conservan los últimos N turnos."""
+        from langgraph.graph.message import add_messages
+
+        from src.graph.state import evict_old_turns
+
+        messages = self._conversation(5)
+        kept = add_messages(messages, evict_old_turns(messages, max_turns=2))
+
+        assert [m.id for m in kept] == ["h3", "a3", "h4", "a4"]
+
+    def test_pinned_messages_are_kept(self):
+        """Los mensajes fijados sobreviven a la poda."""
+        from langchain_core.messages import SystemMessage
+        from langgraph.graph.message import add_messages
+
+        from src.graph.state import PINNED_KEY, evict_old_turns
+
+        messages = self._conversation(3)
+        messages.insert(0, SystemMessage(content="alergia a penicilina", id="s0"))
+        messages[2].additional_kwargs[PINNED_KEY] = True
+
+        kept = add_messages(messages, evict_old_turns(messages, max_turns=1))
+
+        assert [m.id for m in kept] == ["s0", "a0", "h2", "a2"]
+
+    def test_state_is_bounded_across_turns(self, seeded_db, monkeypatch):
+        """El historial del hilo no crece más allá del límite configurado."""
+        from langgraph.checkpoint.memory import MemorySaver
+
+        from src.graph import nodes
+        from src.graph.graph import create_dental_graph, get_initial_state, get_turn_input
+
+        monkeypatch.setenv("CONVERSATION_MAX_TURNS", "2")
+        classifier = MagicMock()
+        classifier.return_value.classify.return_value = "general"
+        responder = MagicMock()
+        responder.return_value.respond_general_query.return_value = "respuesta"
+        monkeypatch.setattr(nodes, "MessageClassifier", classifier)
+        monkeypatch.setattr(nodes, "DentalResponder", responder)
+
+        graph = create_dental_graph(MemorySaver())
+        config = {"configurable": {"thread_id": "t1"}}
+        state = get_initial_state("999888777")
+        state["messages"] = [HumanMessage(content="turno 0")]
+        graph.invoke(state, config)
+        for i in range(1, 6):
+            result = graph.invoke(get_turn_input(f"turno {i}"), config)
+
+        humans = [m.content for m in result["messages"] if isinstance(m, HumanMessage)]
+        assert humans == ["turno 4", "turno 5"]
+
+
+class TestSharedGraph:
+    """Tests para el grafo compartido por el proceso."""
+
+    def test_compiled_once_under_concurrent_first_use(self, monkeypatch, isolated_dispatcher):
+        """Varias sesiones simultáneas obtienen la misma instancia."""
+        import threading
+        import time
+
+        from src.graph import graph as graph_module
+
+        calls = []
+
+        def slow_create():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        monkeypatch.setattr(graph_module, "_dental_graph", None)
+        monkeypatch.setattr(graph_module, "create_dental_graph", slow_create)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(graph_module.get_dental_graph()))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert len(isolated_dispatcher._listeners) == 1
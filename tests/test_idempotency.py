@@ -0,0 +1,100 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.graph.graph import get_turn_input
+from src.graph.idempotency import (
+    SUBMISSION_KEY,
+    SubmissionGuard,
+    find_submission,
+    submission_input,
+)
+
+
+class TestFindSubmission:
+    """Tests para la búsqueda de envíos ya procesados."""
+
+    def test_turn_input_stores_key(self):
+        message = get_turn_input("Hola", "k1")["messages"][0]
+        assert message.additional_kwargs[SUBMISSION_KEY] == "k1"
+        assert SUBMISSION_KEY not in get_turn_input("Hola")["messages"][0].additional_kwargs
+
+    def test_returns_replies_of_the_keyed_turn(self):
+        history = [
+            *get_turn_input("Hola", "k1")["messages"],
+            AIMessage(content="respuesta 1"),
+            *get_turn_input("Hola", "k2")["messages"],
+            AIMessage(content="respuesta 2"),
+        ]
+
+        first = find_submission(history, "k1")
+        second = find_submission(history, "k2")
+
+        assert [m.content for m in first.replies] == ["respuesta 1"]
+        assert not first.is_latest
+        assert [m.content for m in second.replies] == ["respuesta 2"]
+        assert second.is_latest
+        assert find_submission(history, "k3") is None
+        assert find_submission([HumanMessage(content="Hola")], "k1") is None
+
+    def test_unanswered_turn_is_not_done(self):
+        """Sin respuesta, el último turno solo cuenta si quedó en un interrupt."""
+        turn = get_turn_input("Hola", "k1")
+        history = turn["messages"]
+
+        assert find_submission(history, "k1") is None
+        assert find_submission(history, "k1", paused=True).replies == []
+
+        cut = SimpleNamespace(values={"messages": history}, next=("classify",), interrupts=())
+        paused = SimpleNamespace(values={"messages": history}, next=("x",), interrupts=("i",))
+        done = SimpleNamespace(values={"messages": history}, next=(), interrupts=())
+        assert submission_input(cut, "k1", turn) is None
+        assert submission_input(cut, "k2", turn) is turn
+        assert submission_input(paused, "k1", turn) is turn
+        assert submission_input(done, "k1", turn) is turn
+
+
+class TestSubmissionGuard:
+    """Tests para los envíos concurrentes con la misma clave."""
+
+    def test_concurrent_duplicates_execute_once(self):
+        guard = SubmissionGuard()
+        results: dict[str, str] = {}
+        executions = []
+
+        def execute():
+            executions.append(1)
+            time.sleep(0.05)
+            results["k"] = "resultado"
+            return "resultado"
+
+        outcomes = []
+        threads = [
+            threading.Thread(
+                target=lambda: outcomes.append(
+                    guard.run("t1", "k", lambda: results.get("k"), execute)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert executions == [1]
+        assert outcomes == ["resultado"] * 5
+
+    def test_failed_run_releases_the_key(self):
+        guard = SubmissionGuard()
+
+        def fail():
+            raise RuntimeError("falla")
+
+        try:
+            guard.run("t1", "k", lambda: None, fail)
+        except RuntimeError:
+            pass
+        assert guard.run("t1", "k", lambda: None, lambda: "ok") == "ok"
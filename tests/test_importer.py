@@ -0,0 +1,148 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database.connection import get_session
+from src.importer import PatientImporter
+from src.repositories import get_repositories
+from src.schemas.models import PatientImport
+from src.services.appointment_service import AppointmentService
+from src.services.patient_service import PatientService
+
+CSV_HEADER = "name,phone,email,diagnosis,treatment,notes,date\n"
+
+
+def _write(tmp_path, name: str, content: str):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def _interrupt(progress) -> None:
+    raise KeyboardInterrupt
+
+
+def _history(phone: str) -> list[str]:
+    with get_session() as session:
+        patient = PatientService.get_patient_by_phone(session, phone)
+        return sorted(
+            record.diagnosis
+            for record in get_repositories(session).patients.list_history(patient.id)
+        )
+
+
+class TestPatientImporter:
+    """Tests para la importación masiva por lotes."""
+
+    def test_csv_rows_are_grouped_by_phone(self, any_db, tmp_path):
+        source = _write(
+            tmp_path,
+            "pacientes.csv",
+            CSV_HEADER
+            + "Ana Ruiz,+51 955 111 222,ana@email.com,Caries,Empaste,,2024-01-10\n"
+            + "Ana Ruiz,955111222,,Limpieza,Profilaxis,Control,2024-06-01\n"
+            + "Luis Paz,955 333 444,,,,,\n",
+        )
+
+        progress = PatientImporter(batch_size=2).run(source)
+
+        assert (progress.records, progress.created, progress.history_added) == (3, 2, 2)
+        assert _history("955111222") == ["Caries", "Limpieza"]
+        with get_session() as session:
+            context = PatientService.get_patient_context(session, "955111222")
+            assert "Limpieza" in context.history_summary
+            assert PatientService.get_patient_context(session, "955333444").name == "Luis Paz"
+            ana = PatientService.get_patient_by_phone(session, "955111222")
+            found = PatientService.search_medical_history(session, "profilaxis", ana.id)
+            assert [record.notes for record in found] == ["Control"]
+
+    def test_jsonl_upsert_and_rejections(self, any_db, tmp_path):
+        lines = [
+            {
+                "name": "María García Soto",
+                "phone": "+51 999 888 777",
+                "history": [
+                    {"diagnosis": "Bruxismo", "treatment": "Férula", "date": "2024-02-01"}
+                ],
+            },
+            {"name": "X", "phone": "123"},
+            {"name": "Otra María", "phone": "955000111", "email": "maria.garcia@email.com"},
+        ]
+        source = _write(
+            tmp_path,
+            "pacientes.jsonl",
+            "\n".join(json.dumps(line) for line in lines[:2]) + "\n{roto\n" + json.dumps(lines[2]),
+        )
+
+        progress = PatientImporter().run(source)
+
+        assert (progress.created, progress.updated, progress.rejected) == (1, 1, 2)
+        assert [number for number, _ in progress.errors] == [2, 3]
+        assert progress.emails_skipped == 1
+        with get_session() as session:
+            maria = PatientService.get_patient_by_phone(session, "999888777")
+            assert maria.name == "María García Soto"
+            assert PatientService.get_patient_by_phone(session, "955000111").email is None
+        assert "Bruxismo" in _history("999888777")
+
+        again = PatientImporter().run(source)
+        assert (again.created, again.updated, again.history_added) == (0, 0, 0)
+
+    def test_updated_contexts_match_full_rebuild(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999888777").id
+            AppointmentService.create_appointment(
+                session, patient_id, 2, datetime.now() + timedelta(days=2)
+            )
+        record = PatientImport(
+            name="María Renombrada",
+            phone="999888777",
+            history=[{"diagnosis": "Bruxismo", "treatment": "Férula"}],
+        )
+
+        with get_session() as session:
+            result = PatientService.import_patients(session, [record])
+        with get_session() as session:
+            imported = PatientService.get_patient_context(session, "999888777")
+            PatientService.refresh_patient_context(session, patient_id)
+        with get_session() as session:
+            rebuilt = PatientService.get_patient_context(session, "999888777")
+
+        assert (result.updated, result.history_added) == (1, 1)
+        assert imported == rebuilt
+        assert imported.name == "María Renombrada"
+        assert "Bruxismo" in imported.history_summary
+        assert imported.upcoming_appointments
+
+    def test_resumes_from_checkpoint(self, any_db, tmp_path):
+        source = _write(
+            tmp_path,
+            "pacientes.csv",
+            CSV_HEADER
+            + "".join(
+                f"Paciente {i},95500{i:04d},,Caries,Empaste,,2024-01-0{i + 1}\n"
+                for i in range(5)
+            ),
+        )
+        checkpoint = tmp_path / "import.checkpoint.json"
+
+        with pytest.raises(KeyboardInterrupt):
+            PatientImporter(2, checkpoint, on_progress=_interrupt).run(source)
+        assert json.loads(checkpoint.read_text())["records"] == 2
+
+        progress = PatientImporter(2, checkpoint).run(source)
+
+        assert (progress.records, progress.created, progress.history_added) == (5, 5, 5)
+        assert not checkpoint.exists()
+        assert _history("955000000") == ["Caries"]
+
+    def test_checkpoint_of_another_file_is_rejected(self, any_db, tmp_path):
+        first = _write(tmp_path, "a.csv", CSV_HEADER + "Ana Ruiz,955111222,,,,,\n")
+        second = _write(tmp_path, "b.csv", CSV_HEADER)
+        checkpoint = tmp_path / "import.checkpoint.json"
+        with pytest.raises(KeyboardInterrupt):
+            PatientImporter(1, checkpoint, on_progress=_interrupt).run(first)
+
+        with pytest.raises(ValueError):
+            PatientImporter(1, checkpoint).run(second)
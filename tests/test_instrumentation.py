@@ -0,0 +1,78 @@
+import gc
+import json
+
+from sqlalchemy import create_engine, text
+
+from src.database.instrumentation import QueryMonitor, track_section
+
+
+def _engine_with_monitor(monitor: QueryMonitor):
+    engine = create_engine("sqlite://")
+    monitor.install(engine)
+    return engine
+
+
+class TestQueryMonitor:
+    """Tests para la instrumentación de SQL por sección."""
+
+    def test_attributes_statements_to_active_section(self):
+        monitor = QueryMonitor()
+        engine = _engine_with_monitor(monitor)
+
+        with engine.connect() as conn:
+            with track_section("node.verify_patient"):
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+            conn.execute(text("SELECT 3"))
+
+        summary = {s["section"]: s for s in monitor.summary()}
+        assert summary["node.verify_patient"]["statement_count"] == 2
+        assert summary["unattributed"]["statement_count"] == 1
+
+    def test_install_is_per_engine(self):
+        """Reinstalar no duplica conteos y cada engine nuevo queda instrumentado."""
+        monitor = QueryMonitor()
+        for _ in range(3):
+            engine = _engine_with_monitor(monitor)
+            monitor.install(engine)
+            with engine.connect() as conn, track_section("per_engine"):
+                conn.execute(text("SELECT 1"))
+            engine.dispose()
+            del engine
+            gc.collect()
+
+        summary = {s["section"]: s for s in monitor.summary()}
+        assert summary["per_engine"]["statement_count"] == 3
+
+    def test_slow_log_is_ring_buffer(self):
+        monitor = QueryMonitor(slow_threshold_ms=0.0, slow_log_size=3)
+        engine = _engine_with_monitor(monitor)
+
+        with engine.connect() as conn:
+            for i in range(5):
+                conn.execute(text(f"SELECT {i}"))
+
+        slow = monitor.slow_queries()
+        assert len(slow) == 3
+        assert slow[-1]["statement"] == "SELECT 4"
+
+    def test_capture_counts_statements(self):
+        monitor = QueryMonitor()
+        engine = _engine_with_monitor(monitor)
+
+        with engine.connect() as conn, monitor.capture() as capture:
+            conn.execute(text("SELECT 1"))
+
+        assert capture.count == 1
+
+    def test_export_report(self, tmp_path):
+        monitor = QueryMonitor(slow_threshold_ms=0.0)
+        engine = _engine_with_monitor(monitor)
+        with engine.connect() as conn, track_section("sidebar.patient"):
+            conn.execute(text("SELECT 1"))
+
+        path = monitor.export_report(tmp_path / "report.json")
+        report = json.loads(path.read_text(encoding="utf-8"))
+
+        assert report["sections"][0]["section"] == "sidebar.patient"
+        assert len(report["slow_queries"]) == 1
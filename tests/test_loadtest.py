@@ -0,0 +1,48 @@
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.agents.llm import set_llm_factory
+from src.graph.graph import create_dental_graph
+from src.loadtest.runner import ConversationReplayer, percentile
+from src.loadtest.stub_llm import classify_by_keywords, stub_llm_factory
+
+
+@pytest.fixture
+def replayer(memory_db):
+    set_llm_factory(stub_llm_factory())
+    yield ConversationReplayer(create_dental_graph(InMemorySaver()), seed=7)
+    set_llm_factory(None)
+
+
+class TestLoadReplay:
+    """Tests para el generador de carga con conversaciones guionadas."""
+
+    def test_percentile(self):
+        values = [i / 100 for i in range(1, 101)]
+        assert percentile(values, 50) == 0.5
+        assert percentile(values, 99) == 0.99
+        assert percentile([], 95) == 0.0
+
+    def test_stub_classifier(self):
+        assert classify_by_keywords("Tengo dolor de muela") == "urgency"
+        assert classify_by_keywords("No puedo respirar") == "emergency"
+        assert classify_by_keywords("¿Precio de limpieza?") == "general"
+
+    def test_open_roster_books_slots(self, replayer):
+        """Con doctores disponibles se recorre la selección de horario."""
+        report = replayer.run_phase("open", conversations=12, rate=0, concurrency=3).report()
+
+        assert report["errors"] == 0
+        assert report["conversations"] == 12
+        nodes = {row["name"] for row in report["nodes"]}
+        assert {"select_slot", "connect_doctor"} <= nodes
+
+    def test_closed_roster_waits_for_doctors(self, replayer):
+        """Sin doctores la urgencia se interrumpe y el reintento termina el turno."""
+        report = replayer.run_phase("closed", conversations=12, rate=0, concurrency=3).report()
+
+        assert report["errors"] == 0
+        nodes = {row["name"] for row in report["nodes"]}
+        assert "check_availability" in nodes
+        assert "select_slot" not in nodes
+        assert report["turn_latency"][0]["name"] == "all"
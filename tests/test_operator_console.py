@@ -0,0 +1,99 @@
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from src.agents.llm import set_llm_factory
+from src.database.connection import get_session
+from src.graph.graph import create_dental_graph
+from src.graph.operator_console import OperatorConsole
+from src.graph.waitlist import AvailabilityWaitlist
+from src.loadtest.stub_llm import stub_llm_factory
+from src.services.doctor_service import DoctorService
+from src.services.read_cache import SidebarCache
+
+
+@pytest.fixture
+def console(memory_db, monkeypatch):
+    set_llm_factory(stub_llm_factory())
+    waitlist = AvailabilityWaitlist()
+    monkeypatch.setattr("src.graph.nodes.get_waitlist", lambda: waitlist)
+    cache = SidebarCache().install()
+    yield OperatorConsole(create_dental_graph(InMemorySaver()), waitlist, cache)
+    cache.uninstall()
+    set_llm_factory(None)
+
+
+class TestOperatorConsole:
+    """Tests para la consola de urgencias en espera."""
+
+    def test_snapshot_lists_waiting_and_busy(self, console, set_roster, start_urgency):
+        set_roster("closed")
+        config, _ = start_urgency(console.graph)
+        thread_id = config["configurable"]["thread_id"]
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, True)
+            DoctorService.claim_doctor(session, 1, "chat-1")
+
+        snapshot = console.snapshot()
+
+        assert [(c.thread_id, c.patient_phone) for c in snapshot.waiting] == [
+            (thread_id, "70000001")
+        ]
+        assert snapshot.waiting[0].waited_s >= 0
+        assert [(d.doctor_id, d.current_chat_id) for d in snapshot.busy_doctors] == [
+            (1, "chat-1")
+        ]
+        assert snapshot.free_doctors == []
+
+    def test_release_doctors_in_bulk(self, console):
+        with get_session() as session:
+            DoctorService.claim_doctor(session, 1, "chat-1")
+            DoctorService.claim_doctor(session, 3, "chat-3")
+
+        assert console.release_doctors([1, 3, 99]) == [1, 3]
+        snapshot = console.snapshot()
+        assert snapshot.busy_doctors == []
+        assert [d.doctor_id for d in snapshot.free_doctors] == [1, 3]
+
+    def test_assign_resumes_with_chosen_doctor(self, console, set_roster, start_urgency):
+        set_roster("closed")
+        first, second = (
+            start_urgency(console.graph, phone)[0]["configurable"]["thread_id"]
+            for phone in ("70000001", "70000002")
+        )
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 3, True)
+
+        assert console.assign({first: 3, second: 2}) == [first]
+
+        state = console.graph.get_state({"configurable": {"thread_id": first}})
+        payload = state.tasks[0].interrupts[0].value
+        assert payload["type"] == "slot_selection"
+        assert {slot["doctor_id"] for slot in payload["slots"]} == {3}
+        assert state.values["assigned_doctor"]["doctor_id"] == 3
+        assert [c.thread_id for c in console.snapshot().waiting] == [second]
+
+    def test_assign_claims_each_doctor_once(self, console, set_roster, start_urgency):
+        set_roster("closed")
+        first, second = (
+            start_urgency(console.graph, phone)[0]["configurable"]["thread_id"]
+            for phone in ("70000001", "70000002")
+        )
+        with get_session() as session:
+            DoctorService.set_availability_bulk(session, {1: True, 3: True})
+
+        assert console.assign({first: 3, second: 3}) == [first]
+
+        config = {"configurable": {"thread_id": first}}
+        payload = console.graph.get_state(config).tasks[0].interrupts[0].value
+        assert {slot["doctor_id"] for slot in payload["slots"]} == {3}
+        assert [c.thread_id for c in console.snapshot().waiting] == [second]
+        assert [d.doctor_id for d in console.snapshot().free_doctors] == [1]
+
+        result = console.graph.invoke(
+            Command(resume={"slot_id": payload["slots"][0]["slot_id"]}), config
+        )
+        assert result["assigned_doctor"]["doctor_id"] == 3
+        with get_session() as session:
+            assert DoctorService.get_doctor_by_id(session, 3).current_chat_id == first
+            assert DoctorService.get_doctor_by_id(session, 1).current_chat_id is None
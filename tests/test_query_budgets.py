@@ -0,0 +1,352 @@
+"""Presupuestos de consultas SQL por nodo del grafo y por método de servicio.
+
+Cada ruta declara el número máximo de sentencias que puede emitir contra
+la base demo. Si un cambio introduce un N+1, el test correspondiente falla.
+Las escrituras incluyen el mantenimiento del snapshot de contexto del
+paciente: crear un paciente inserta también su snapshot, y una cita o un
+registro de historial lee el snapshot por id y actualiza solo su parte.
+"""
+
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.database.connection import get_session, seed_demo_data
+from src.database.models import Doctor
+from src.graph import nodes
+from src.graph.graph import get_initial_state
+from src.schemas.models import PatientImport
+from src.services.appointment_service import AppointmentService
+from src.services.doctor_service import DoctorService
+from src.services.patient_service import PatientService
+
+NODE_BUDGETS = {
+    "trim_history": 0,
+    "verify_patient": 1,
+    # INSERT del paciente + INSERT de su snapshot.
+    "register_patient": 2,
+    "classify_message": 0,
+    "handle_general_query": 2,
+    "handle_dental_urgency": 1,
+    "check_doctor_availability": 1,
+    # Resumen de slots (3) + create_appointment (4).
+    "select_appointment_slot": 7,
+    # Doctores libres + compare-and-set del reclamo + lectura del doctor.
+    "connect_doctor": 3,
+    "handle_medical_emergency": 0,
+}
+
+SERVICE_BUDGETS = {
+    "get_patient_by_phone": 1,
+    "get_patient_with_history": 1,
+    "get_medical_history_summary": 1,
+    # INSERT del paciente + INSERT de su snapshot.
+    "create_patient": 2,
+    "get_available_doctors": 1,
+    "get_all_doctors": 1,
+    "set_doctor_availability": 2,
+    "set_availability_bulk": 3,
+    "set_clinic_availability": 3,
+    "get_available_slots": 3,
+    "get_slot_summary": 3,
+    "get_slot_page": 3,
+    # INSERT de la cita, doctor para el digest, snapshot por id y su UPDATE.
+    "create_appointment": 4,
+    # INSERT del registro, snapshot por id y su UPDATE.
+    "add_medical_history": 3,
+    "get_patient_appointments": 1,
+    "get_appointments": 1,
+    "get_patient_context": 1,
+    "search_medical_history": 1,
+    "import_patients": 6,
+    # Reimportar pacientes existentes: lecturas, un UPDATE por lote, el
+    # historial nuevo y el reemplazo de sus snapshots (citas, DELETE, INSERT).
+    "reimport_patients": 7,
+}
+
+
+class _StubClassifier:
+    def classify(self, message):
+        return "general"
+
+
+class _StubResponder:
+    def respond_general_query(self, **kwargs):
+        return "respuesta"
+
+    def respond_urgency(self, **kwargs):
+        return "respuesta"
+
+    def respond_emergency(self, **kwargs):
+        return "respuesta"
+
+
+@pytest.fixture
+def stub_llm():
+    with patch.object(nodes, "MessageClassifier", _StubClassifier), patch.object(
+        nodes, "DentalResponder", _StubResponder
+    ):
+        yield
+
+
+@pytest.fixture
+def patient_state(seeded_db):
+    state = get_initial_state("999888777")
+    state["messages"] = [HumanMessage(content="Hola")]
+    with get_session() as session:
+        patient = PatientService.get_patient_by_phone(session, "999888777")
+        state.update(
+            patient_exists=True, patient_id=patient.id, patient_name=patient.name
+        )
+    return state
+
+
+def _assert_budget(capture, budget: int, path: str) -> None:
+    assert capture.count <= budget, (
+        f"{path} emitió {capture.count} sentencias (presupuesto {budget}):\n"
+        + "\n".join(capture.statements)
+    )
+
+
+def _add_doctors(count: int) -> None:
+    with get_session() as session:
+        for i in range(count):
+            session.add(
+                Doctor(
+                    name=f"Dr. Extra {i}",
+                    specialty="Odontología General",
+                    phone=f"900000{i:03d}",
+                    is_available=True,
+                )
+            )
+    seed_demo_data()
+
+
+class TestNodeQueryBudgets:
+    """Presupuesto de consultas por nodo del grafo."""
+
+    def _run(self, query_monitor, name, state, **patches):
+        node = getattr(nodes, name)
+        with patch.multiple(nodes, **patches) if patches else nullcontext():
+            with query_monitor.capture() as capture:
+                node(state)
+        _assert_budget(capture, NODE_BUDGETS[name], name)
+        return capture
+
+    def test_trim_history(self, query_monitor, patient_state):
+        self._run(query_monitor, "trim_history", patient_state)
+
+    def test_verify_patient(self, query_monitor, patient_state):
+        self._run(query_monitor, "verify_patient", patient_state)
+
+    def test_register_patient(self, query_monitor, seeded_db):
+        state = get_initial_state("911222333")
+        self._run(query_monitor, "register_patient", state)
+
+    def test_classify_message(self, query_monitor, patient_state, stub_llm):
+        self._run(query_monitor, "classify_message", patient_state)
+
+    def test_handle_general_query(self, query_monitor, patient_state, stub_llm):
+        self._run(query_monitor, "handle_general_query", patient_state)
+
+    def test_handle_dental_urgency(self, query_monitor, patient_state, stub_llm):
+        self._run(query_monitor, "handle_dental_urgency", patient_state)
+
+    def test_check_doctor_availability(self, query_monitor, patient_state):
+        self._run(query_monitor, "check_doctor_availability", patient_state)
+
+    def test_handle_medical_emergency(self, query_monitor, patient_state, stub_llm):
+        self._run(query_monitor, "handle_medical_emergency", patient_state)
+
+    def test_select_appointment_slot(self, query_monitor, patient_state):
+        with get_session() as session:
+            slot = AppointmentService.get_available_slots(session)[0]
+        self._run(
+            query_monitor,
+            "select_appointment_slot",
+            patient_state,
+            interrupt=lambda payload: {"slot_id": slot["slot_id"]},
+        )
+
+    def test_connect_doctor(self, query_monitor, patient_state):
+        self._run(query_monitor, "connect_doctor", patient_state)
+
+    def test_select_appointment_slot_independent_of_doctor_count(
+        self, query_monitor, patient_state
+    ):
+        resume = {"slot_id": None}
+        patches = {"interrupt": lambda payload: resume}
+        baseline = self._run(
+            query_monitor, "select_appointment_slot", patient_state, **patches
+        )
+        _add_doctors(20)
+        scaled = self._run(
+            query_monitor, "select_appointment_slot", patient_state, **patches
+        )
+        assert scaled.count == baseline.count
+
+
+class TestServiceQueryBudgets:
+    """Presupuesto de consultas por método de servicio."""
+
+    def _measure(self, query_monitor, name, fn):
+        with get_session() as session:
+            with query_monitor.capture() as capture:
+                fn(session)
+        _assert_budget(capture, SERVICE_BUDGETS[name], name)
+        return capture
+
+    def test_patient_service(self, query_monitor, patient_state):
+        patient_id = patient_state["patient_id"]
+        self._measure(
+            query_monitor,
+            "get_patient_by_phone",
+            lambda s: PatientService.get_patient_by_phone(s, "999888777"),
+        )
+        self._measure(
+            query_monitor,
+            "get_patient_with_history",
+            lambda s: PatientService.get_patient_with_history(s, patient_id),
+        )
+        self._measure(
+            query_monitor,
+            "get_medical_history_summary",
+            lambda s: PatientService.get_medical_history_summary(s, patient_id),
+        )
+        self._measure(
+            query_monitor,
+            "search_medical_history",
+            lambda s: PatientService.search_medical_history(s, "dolor de caries"),
+        )
+        self._measure(
+            query_monitor,
+            "get_patient_context",
+            lambda s: PatientService.get_patient_context(s, "999888777"),
+        )
+        self._measure(
+            query_monitor,
+            "create_patient",
+            lambda s: PatientService.create_patient(s, "Nuevo", "911000111"),
+        )
+        self._measure(
+            query_monitor,
+            "add_medical_history",
+            lambda s: PatientService.add_medical_history(s, patient_id, "Caries", "Empaste"),
+        )
+
+    def test_doctor_service(self, query_monitor, seeded_db):
+        self._measure(
+            query_monitor,
+            "get_available_doctors",
+            DoctorService.get_available_doctors,
+        )
+        self._measure(query_monitor, "get_all_doctors", DoctorService.get_all_doctors)
+        self._measure(
+            query_monitor,
+            "set_doctor_availability",
+            lambda s: DoctorService.set_doctor_availability(s, 2, True),
+        )
+
+    def test_appointment_service(self, query_monitor, patient_state):
+        patient_id = patient_state["patient_id"]
+        self._measure(
+            query_monitor,
+            "create_appointment",
+            lambda s: AppointmentService.create_appointment(
+                s, patient_id, 1, datetime.now() + timedelta(days=1)
+            ),
+        )
+        self._measure(
+            query_monitor,
+            "get_patient_appointments",
+            lambda s: AppointmentService.get_patient_appointments(s, patient_id),
+        )
+        self._measure(
+            query_monitor,
+            "get_appointments",
+            lambda s: AppointmentService.get_appointments(s, [1, 2, 3]),
+        )
+
+    @pytest.mark.parametrize("extra_doctors", [0, 25])
+    def test_bulk_availability_is_constant(self, query_monitor, seeded_db, extra_doctors):
+        _add_doctors(extra_doctors)
+        self._measure(
+            query_monitor,
+            "set_clinic_availability",
+            lambda s: DoctorService.set_clinic_availability(s, True),
+        )
+        self._measure(
+            query_monitor,
+            "set_availability_bulk",
+            lambda s: DoctorService.set_availability_bulk(s, {1: False, 2: False}),
+        )
+
+    @pytest.mark.parametrize("extra_doctors", [0, 25])
+    def test_slot_listing_is_constant(self, query_monitor, seeded_db, extra_doctors):
+        _add_doctors(extra_doctors)
+        capture = self._measure(
+            query_monitor,
+            "get_available_slots",
+            AppointmentService.get_available_slots,
+        )
+        assert capture.count == SERVICE_BUDGETS["get_available_slots"]
+
+    @pytest.mark.parametrize("extra_doctors", [0, 25])
+    def test_slot_summary_and_page_are_constant(
+        self, query_monitor, seeded_db, extra_doctors
+    ):
+        _add_doctors(extra_doctors)
+        day = datetime.now().date() + timedelta(days=1)
+        summary = self._measure(
+            query_monitor, "get_slot_summary", AppointmentService.get_slot_summary
+        )
+        page = self._measure(
+            query_monitor,
+            "get_slot_page",
+            lambda s: AppointmentService.get_slot_page(s, day),
+        )
+        assert summary.count == SERVICE_BUDGETS["get_slot_summary"]
+        assert page.count == SERVICE_BUDGETS["get_slot_page"]
+
+    @pytest.mark.parametrize("patients", [5, 200])
+    def test_import_batch_is_constant(self, query_monitor, seeded_db, patients):
+        records = [
+            PatientImport(
+                name=f"Importado {i}",
+                phone=f"95{i:07d}",
+                email=f"importado{i}@email.com",
+                history=[{"diagnosis": "Caries", "treatment": "Empaste"}],
+            )
+            for i in range(patients)
+        ]
+        capture = self._measure(
+            query_monitor,
+            "import_patients",
+            lambda s: PatientService.import_patients(s, records),
+        )
+        assert capture.count == SERVICE_BUDGETS["import_patients"]
+
+    @pytest.mark.parametrize("patients", [5, 200])
+    def test_reimport_batch_is_constant(self, query_monitor, seeded_db, patients):
+        def batch(name: str, diagnosis: str) -> list[PatientImport]:
+            return [
+                PatientImport(
+                    name=f"{name} {i}",
+                    phone=f"95{i:07d}",
+                    history=[{"diagnosis": diagnosis, "treatment": "Empaste"}],
+                )
+                for i in range(patients)
+            ]
+
+        with get_session() as session:
+            PatientService.import_patients(session, batch("Importado", "Caries"))
+        records = batch("Renombrado", "Gingivitis")
+        capture = self._measure(
+            query_monitor,
+            "reimport_patients",
+            lambda s: PatientService.import_patients(s, records),
+        )
+        assert capture.count == SERVICE_BUDGETS["reimport_patients"]
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database.connection import get_session
+from src.services.appointment_service import AppointmentService
+from src.services.doctor_service import DoctorService
+from src.services.patient_service import PatientService
+from src.services.read_cache import PatientIdentityCache, SidebarCache
+
+
+@pytest.fixture
+def cache(any_db):
+    cache = SidebarCache(max_patients=2).install()
+    yield cache
+    cache.uninstall()
+
+
+class TestSidebarCache:
+    """Tests para la caché del panel lateral y su invalidación."""
+
+    def test_repeated_reads_do_not_query(self, cache, query_monitor):
+        phone = "999888777"
+        first = cache.patient_context(phone)
+        cache.doctor_roster()
+
+        with query_monitor.capture() as capture:
+            assert cache.patient_context(phone) == first
+            cache.doctor_roster()
+
+        assert capture.count == 0
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_appointment_invalidates_patient(self, cache):
+        phone = "999888777"
+        before = cache.patient_context(phone)
+
+        with get_session() as session:
+            AppointmentService.create_appointment(
+                session, before.patient_id, 1, datetime.now() + timedelta(days=2)
+            )
+
+        after = cache.patient_context(phone)
+        assert len(after.upcoming_appointments) == len(before.upcoming_appointments) + 1
+
+    def test_registration_invalidates_unknown_phone(self, cache):
+        assert cache.patient_context("70000003") is None
+
+        with get_session() as session:
+            PatientService.create_patient(session, "Nuevo", "70000003")
+
+        assert cache.patient_context("70000003").name == "Nuevo"
+
+    def test_availability_toggle_invalidates_roster(self, cache):
+        available = {d.doctor_id: d.is_available for d in cache.doctor_roster()}
+
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, not available[1])
+
+        roster = {d.doctor_id: d.is_available for d in cache.doctor_roster()}
+        assert roster[1] is not available[1]
+
+    def test_rolled_back_write_keeps_cache(self, cache):
+        cache.doctor_roster()
+        with pytest.raises(RuntimeError):
+            with get_session() as session:
+                DoctorService.set_doctor_availability(session, 1, False)
+                raise RuntimeError("falla")
+
+        misses = cache.misses
+        cache.doctor_roster()
+        assert cache.misses == misses
+
+    def test_patients_are_bounded(self, cache):
+        for phone in ("1", "2", "3"):
+            cache.patient_context(phone)
+        assert list(cache._patients) == ["2", "3"]
+
+
+@pytest.fixture
+def identity_cache(any_db):
+    cache = PatientIdentityCache(max_entries=2).install()
+    yield cache
+    cache.uninstall()
+
+
+class TestPatientIdentityCache:
+    """Tests para la caché teléfono → identidad del paciente."""
+
+    def test_formats_share_one_entry(self, identity_cache, query_monitor):
+        identity = identity_cache.resolve("999888777")
+        assert identity.name == "María García"
+
+        with query_monitor.capture() as capture:
+            assert identity_cache.resolve("+51 999 888 777") == identity
+            assert identity_cache.resolve("999-888-777") == identity
+
+        assert capture.count == 0
+        assert (identity_cache.hits, identity_cache.misses) == (2, 1)
+
+    def test_registration_invalidates_unknown_phone(self, identity_cache):
+        assert identity_cache.resolve("70000003") is None
+
+        with get_session() as session:
+            patient_id = PatientService.create_patient(session, "Nuevo", "+51 70000003").id
+
+        assert identity_cache.resolve("70000003").patient_id == patient_id
+
+    def test_unknown_phone_is_not_cached(self, identity_cache):
+        """Un alta que este proceso no vio (otro worker) se encuentra igual."""
+        assert identity_cache.resolve("70000005") is None
+        identity_cache.uninstall()
+        try:
+            with get_session() as session:
+                patient_id = PatientService.create_patient(session, "Otro", "70000005").id
+        finally:
+            identity_cache.install()
+
+        assert identity_cache.resolve("70000005").patient_id == patient_id
+
+    def test_lru_is_bounded(self, identity_cache):
+        with get_session() as session:
+            PatientService.create_patient(session, "Tercero", "70000004")
+        for phone in ("999888777", "999777666", "70000004"):
+            identity_cache.resolve(phone)
+
+        identity_cache.resolve("999777666")
+        identity_cache.resolve("999888777")
+        assert identity_cache.misses == 4
@@ -0,0 +1,372 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from src.database import connection
+from src.database.connection import get_session
+from src.database.models import Appointment, MedicalHistory, Patient
+from src.repositories import get_repositories
+from src.schemas.phone import normalize_phone
+from src.services.appointment_service import AppointmentService
+from src.services.doctor_service import DoctorService
+from src.services.patient_service import PatientService
+
+
+class TestRepositoryBackends:
+    """Los backends SQL y en memoria deben comportarse igual."""
+
+    def test_get_patient_by_phone(self, any_db):
+        with get_session() as session:
+            patient = PatientService.get_patient_by_phone(session, "999888777")
+            assert patient.name == "María García"
+            assert PatientService.get_patient_by_phone(session, "000") is None
+
+    def test_phone_is_unique(self, any_db):
+        with pytest.raises(IntegrityError):
+            with get_session() as session:
+                PatientService.create_patient(session, "Duplicado", "999888777")
+
+    def test_rollback_discards_writes(self, any_db):
+        with pytest.raises(RuntimeError):
+            with get_session() as session:
+                PatientService.create_patient(session, "Temporal", "911555444")
+                raise RuntimeError("abort")
+
+        with get_session() as session:
+            assert not PatientService.patient_exists(session, "911555444")
+
+    def test_history_newest_first(self, any_db):
+        with get_session() as session:
+            patient = PatientService.get_patient_by_phone(session, "999777666")
+            get_repositories(session).patients.add_history(
+                MedicalHistory(
+                    patient_id=patient.id,
+                    date=datetime(2000, 1, 1),
+                    diagnosis="Control antiguo",
+                    treatment="Ninguno",
+                )
+            )
+            summary = PatientService.get_medical_history_summary(session, patient.id)
+
+        assert summary.index("Gingivitis") < summary.index("Control antiguo")
+
+    def test_booked_slot_is_excluded(self, any_db):
+        with get_session() as session:
+            slots = AppointmentService.get_available_slots(session)
+            patient_id = PatientService.get_patient_by_phone(session, "999888777").id
+            first = slots[0]
+            AppointmentService.create_appointment(
+                session, patient_id, first["doctor_id"], first["scheduled_at"]
+            )
+
+        with get_session() as session:
+            remaining = AppointmentService.get_available_slots(session)
+            appointments = AppointmentService.get_patient_appointments(
+                session, patient_id
+            )
+            assert len(remaining) == len(slots) - 1
+            assert first["slot_id"] not in {slot["slot_id"] for slot in remaining}
+            assert appointments[0].doctor.id == first["doctor_id"]
+
+    def test_held_doctor_slots_only_for_its_chat(self, any_db):
+        with get_session() as session:
+            assert DoctorService.claim_doctor(session, 1, "chat-1") is not None
+
+        with get_session() as session:
+            offered = {
+                chat_id: {
+                    slot["doctor_id"]
+                    for slot in AppointmentService.get_available_slots(
+                        session, chat_id=chat_id
+                    )
+                }
+                for chat_id in ("chat-1", "chat-2", None)
+            }
+
+        assert 1 in offered["chat-1"]
+        assert 1 not in offered["chat-2"]
+        assert 1 not in offered[None]
+
+    def test_slot_summary_matches_full_listing(self, any_db):
+        with get_session() as session:
+            slots = AppointmentService.get_available_slots(session)
+            summary = AppointmentService.get_slot_summary(session, preview_size=2)
+
+        assert summary["total"] == len(slots)
+        assert summary["slots"] == slots[:2]
+        per_day = {}
+        for slot in slots:
+            day = slot["scheduled_at"].date().isoformat()
+            per_day[day] = per_day.get(day, 0) + 1
+        assert {d["date"]: d["count"] for d in summary["days"]} == per_day
+
+    def test_slot_pages_cover_the_day(self, any_db):
+        day = datetime.now().date() + timedelta(days=1)
+        with get_session() as session:
+            expected = [
+                slot["slot_id"]
+                for slot in AppointmentService.get_available_slots(session)
+                if slot["scheduled_at"].date() == day
+            ]
+            seen, offset, has_more = [], 0, True
+            while has_more:
+                page = AppointmentService.get_slot_page(
+                    session, day, offset=offset, limit=5
+                )
+                seen += [slot["slot_id"] for slot in page["slots"]]
+                offset += 5
+                has_more = page["has_more"]
+            outside = AppointmentService.get_slot_page(
+                session, day + timedelta(days=30)
+            )
+
+        assert seen == expected
+        assert outside["slots"] == []
+
+    def test_bulk_availability(self, any_db):
+        with get_session() as session:
+            changed = DoctorService.set_availability_bulk(
+                session, {1: False, 2: True, 3: True, 99: True}
+            )
+        assert changed == [1, 2]
+
+        with get_session() as session:
+            available = DoctorService.get_available_doctors(session)
+            assert [doc.doctor_id for doc in available] == [2, 3]
+            assert DoctorService.set_clinic_availability(session, False) == [2, 3]
+            assert DoctorService.get_available_doctors(session) == []
+
+    def test_doctor_availability(self, any_db):
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 2, True)
+
+        with get_session() as session:
+            available = DoctorService.get_available_doctors(session)
+            assert [doc.doctor_id for doc in available] == [1, 2, 3]
+
+
+def test_backends_produce_identical_slots(sqlite_db, memory_db):
+    with get_session() as session:
+        memory_slots = AppointmentService.get_available_slots(session)
+
+    session = sessionmaker(bind=sqlite_db)()
+    try:
+        sqlite_slots = AppointmentService.get_available_slots(session)
+    finally:
+        session.close()
+
+    assert [s["slot_id"] for s in sqlite_slots] == [s["slot_id"] for s in memory_slots]
+    assert sqlite_slots[0]["scheduled_at"] > datetime.now() - timedelta(hours=1)
+
+
+class TestPatientContextSnapshot:
+    """El snapshot de contexto se mantiene con las escrituras."""
+
+    def test_seeded_patients_have_context(self, any_db):
+        with get_session() as session:
+            context = PatientService.get_patient_context(session, "999888777")
+
+        assert context.name == "María García"
+        assert "Caries" in context.history_summary
+        assert context.upcoming_appointments == []
+
+    def test_history_write_refreshes_summary(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999777666").id
+            PatientService.add_medical_history(
+                session, patient_id, "Bruxismo", "Férula de descarga"
+            )
+
+        with get_session() as session:
+            context = PatientService.get_patient_context(session, "999777666")
+        assert "Bruxismo" in context.history_summary
+
+    def test_appointment_write_refreshes_digest(self, any_db):
+        scheduled_at = datetime.now().replace(microsecond=0) + timedelta(days=2)
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999777666").id
+            AppointmentService.create_appointment(session, patient_id, 1, scheduled_at)
+
+        with get_session() as session:
+            context = PatientService.get_patient_context(session, "999777666")
+        assert [apt.scheduled_at for apt in context.upcoming_appointments] == [
+            scheduled_at
+        ]
+        assert context.upcoming_appointments[0].doctor_name == "Dr. Roberto Mendoza"
+
+    def test_incremental_updates_match_full_rebuild(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999777666").id
+            PatientService.add_medical_history(session, patient_id, "Bruxismo", "Férula")
+            PatientService.add_medical_history(session, patient_id, "Gingivitis", "Limpieza")
+            for days in (3, 1):
+                AppointmentService.create_appointment(
+                    session, patient_id, 2, datetime.now() + timedelta(days=days)
+                )
+
+        with get_session() as session:
+            incremental = PatientService.get_patient_context(session, "999777666")
+            PatientService.refresh_patient_context(session, patient_id)
+        with get_session() as session:
+            rebuilt = PatientService.get_patient_context(session, "999777666")
+        assert incremental == rebuilt
+        assert incremental.history_summary.index("Gingivitis") < incremental.history_summary.index("Bruxismo")
+
+    def test_new_patient_gets_empty_context(self, any_db):
+        with get_session() as session:
+            PatientService.create_patient(session, "Nueva", "911444333")
+
+        with get_session() as session:
+            context = PatientService.get_patient_context(session, "911444333")
+        assert context.name == "Nueva"
+
+
+@pytest.mark.parametrize(
+    "raw, canonical",
+    [
+        ("999 888 777", "999888777"),
+        ("+51 999-888-777", "999888777"),
+        ("0051999888777", "999888777"),
+        ("51999888777", "999888777"),
+        ("70000001", "70000001"),
+        ("+1 (555) 123-4567", "+15551234567"),
+        ("  ", ""),
+    ],
+)
+def test_normalize_phone(raw, canonical):
+    assert normalize_phone(raw) == canonical
+
+
+class TestPhoneNormalization:
+    """Un mismo número en distintos formatos es un solo paciente."""
+
+    def test_lookup_accepts_any_format(self, any_db):
+        with get_session() as session:
+            for phone in ("999 888 777", "+51999888777", "999-888-777"):
+                assert PatientService.get_patient_by_phone(session, phone).name == "María García"
+            assert PatientService.get_patient_context(session, "+51 999 888 777").name == "María García"
+
+    def test_create_stores_canonical_phone(self, any_db):
+        with get_session() as session:
+            patient = PatientService.create_patient(session, "Nuevo", "+51 988 777 666")
+            assert patient.phone == "988777666"
+
+        with pytest.raises(IntegrityError):
+            with get_session() as session:
+                PatientService.create_patient(session, "Duplicado", "988 777 666")
+
+    def _add_legacy_patient(self, phone: str, email=None) -> int:
+        """Paciente guardado sin normalizar, como antes de la migración."""
+        with get_session() as session:
+            repos = get_repositories(session)
+            patient = repos.patients.add(Patient(name="Legado", phone=phone, email=email))
+            repos.patients.add_history(
+                MedicalHistory(patient_id=patient.id, diagnosis="Bruxismo", treatment="Férula")
+            )
+            repos.appointments.add(
+                Appointment(
+                    patient_id=patient.id,
+                    doctor_id=1,
+                    scheduled_at=datetime.now() + timedelta(days=3),
+                )
+            )
+            return patient.id
+
+    def test_migration_merges_duplicates(self, any_db):
+        with get_session() as session:
+            survivor_id = PatientService.get_patient_by_phone(session, "999888777").id
+            history_count = len(get_repositories(session).patients.list_history(survivor_id))
+        duplicate_id = self._add_legacy_patient("+51 999 888 777")
+        lone_id = self._add_legacy_patient("+51 955-444-333", email="legado@email.com")
+
+        with get_session() as session:
+            assert PatientService.normalize_patient_phones(session) == 1
+
+        with get_session() as session:
+            repos = get_repositories(session)
+            assert repos.patients.get_by_id(duplicate_id) is None
+            history = repos.patients.list_history(survivor_id)
+            assert len(history) == history_count + 1
+            assert {record.patient_id for record in history} == {survivor_id}
+            context = PatientService.get_patient_context(session, "999 888 777")
+            assert context.patient_id == survivor_id
+            assert len(context.upcoming_appointments) == 1
+            assert "Bruxismo" in context.history_summary
+            assert PatientService.get_patient_by_phone(session, "955444333").id == lone_id
+
+        with get_session() as session:
+            assert PatientService.normalize_patient_phones(session) == 0
+
+    def test_migration_runs_once_per_database(self, sqlite_db):
+        legacy_id = self._add_legacy_patient("+51 955-444-333")
+
+        connection.init_db()
+        with get_session() as session:
+            assert get_repositories(session).patients.get_by_id(legacy_id).phone != "955444333"
+
+        with sqlite_db.begin() as conn:
+            conn.exec_driver_sql("PRAGMA user_version = 0")
+        connection.init_db()
+        with get_session() as session:
+            assert get_repositories(session).patients.get_by_id(legacy_id).phone == "955444333"
+        with sqlite_db.connect() as conn:
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        assert version == connection.DATA_VERSION
+
+    def test_migration_rolls_back(self, any_db):
+        duplicate_id = self._add_legacy_patient("+51 999 888 777")
+
+        with pytest.raises(RuntimeError):
+            with get_session() as session:
+                PatientService.normalize_patient_phones(session)
+                raise RuntimeError("fallo")
+
+        with get_session() as session:
+            repos = get_repositories(session)
+            assert repos.patients.get_by_phone("+51 999 888 777").id == duplicate_id
+            assert len(repos.patients.list_history(duplicate_id)) == 1
+            assert len(repos.appointments.list_for_patient(duplicate_id)) == 1
+
+
+class TestMedicalHistorySearch:
+    """Búsqueda de texto completo sobre el historial."""
+
+    def test_relevant_record_first(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999888777").id
+            records = PatientService.search_medical_history(
+                session, "me duele por la sensibilidad al frio", patient_id=patient_id
+            )
+            assert [r.diagnosis for r in records] == ["Caries en molar superior derecho"]
+
+    def test_search_is_scoped_to_patient(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999777666").id
+            records = PatientService.search_medical_history(
+                session, "caries", patient_id=patient_id
+            )
+            assert records == []
+            assert PatientService.search_medical_history(session, "caries")
+
+    def test_new_records_are_indexed(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999777666").id
+            PatientService.add_medical_history(
+                session, patient_id, "Fractura de incisivo", "Reconstrucción"
+            )
+
+        with get_session() as session:
+            records = PatientService.search_medical_history(
+                session, "fractura", patient_id=patient_id
+            )
+            assert [r.diagnosis for r in records] == ["Fractura de incisivo"]
+
+    def test_relevant_summary_falls_back_to_recent(self, any_db):
+        with get_session() as session:
+            patient_id = PatientService.get_patient_by_phone(session, "999888777").id
+            summary = PatientService.get_relevant_history_summary(
+                session, patient_id, "¿cuánto cuesta un blanqueamiento?", limit=1
+            )
+        assert summary.count("Diagnóstico:") == 1
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.types import Interrupt
+
+from src.graph.serde import TYPE_COMPACT, TYPE_COMPACT_ZSTD, CompactSerializer, zstandard
+
+
+def _slot(doctor_id: int, scheduled_at: datetime) -> dict:
+    return {
+        "slot_id": f"{doctor_id}|{scheduled_at.isoformat()}",
+        "doctor_id": doctor_id,
+        "doctor_name": f"Dr. {doctor_id}",
+        "specialty": "Odontología General",
+        "scheduled_at": scheduled_at,
+        "display": scheduled_at.strftime("%d/%m/%Y %H:%M"),
+    }
+
+
+@pytest.fixture
+def state():
+    start = datetime(2026, 3, 2, 9, 0)
+    return {
+        "messages": [
+            HumanMessage(content="Me duele la muela", id="h1"),
+            AIMessage(content="Te ayudo a agendar", id="a1", name="asistente"),
+        ],
+        "available_slots": [
+            _slot(i % 2 + 1, start + timedelta(minutes=30 * i)) for i in range(40)
+        ],
+        "appointment_confirmed": {"scheduled_at": start},
+        "patient_id": 7,
+    }
+
+
+class TestCompactSerializer:
+    """Tests para el serializador compacto de checkpoints."""
+
+    def test_round_trip(self, state):
+        """El estado decodificado es idéntico al original."""
+        serde = CompactSerializer(compression_threshold=None)
+        typed = serde.dumps_typed(state)
+
+        assert typed[0] == TYPE_COMPACT
+        assert serde.loads_typed(typed) == state
+
+    def test_smaller_than_default(self, state):
+        """La codificación compacta ocupa menos que la por defecto."""
+        compact = CompactSerializer(compression_threshold=None).dumps_typed(state)
+        default = JsonPlusSerializer().dumps_typed(state)
+        assert len(compact[1]) < len(default[1]) / 2
+
+    @pytest.mark.skipif(zstandard is None, reason="zstandard no instalado")
+    def test_compresses_large_payloads(self, state):
+        """Los payloads por encima del umbral se comprimen con zstd."""
+        serde = CompactSerializer(compression_threshold=256)
+        typed = serde.dumps_typed(state)
+
+        assert typed[0] == TYPE_COMPACT_ZSTD
+        assert serde.loads_typed(typed) == state
+
+    def test_unknown_types_use_default_encoding(self):
+        """Los tipos sin codificación propia se delegan en JsonPlusSerializer."""
+        serde = CompactSerializer()
+        value = {"interrupt": [Interrupt(value={"type": "slot_selection"}, id="i1")]}
+
+        assert serde.loads_typed(serde.dumps_typed(value)) == value
+
+    def test_reads_default_checkpoints(self, state):
+        """Los checkpoints guardados con el serializador anterior siguen legibles."""
+        typed = JsonPlusSerializer().dumps_typed(state)
+        assert CompactSerializer().loads_typed(typed) == state
+
+    def test_irregular_slots_are_not_packed(self, state):
+        """Un dict con campos extra se conserva tal cual."""
+        slot = {**state["available_slots"][0], "note": "extra"}
+        serde = CompactSerializer(compression_threshold=None)
+        assert serde.loads_typed(serde.dumps_typed([slot])) == [slot]
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.agents.llm import set_llm_factory
+from src.graph.graph import create_dental_graph, get_initial_state, get_turn_input
+from src.loadtest.stub_llm import stub_llm_factory
+from src.tracing import InMemoryExporter, JsonlExporter, Tracer, get_tracer
+
+
+@pytest.fixture
+def exporter(memory_db):
+    exporter = InMemoryExporter()
+    tracer = get_tracer()
+    tracer.add_exporter(exporter)
+    set_llm_factory(stub_llm_factory())
+    yield exporter
+    set_llm_factory(None)
+    tracer.remove_exporter(exporter)
+
+
+class TestTracer:
+    """Tests para el tracer por spans."""
+
+    def test_nested_spans(self):
+        """Los spans anidados comparten traza y apuntan a su padre."""
+        exporter = InMemoryExporter()
+        tracer = Tracer([exporter])
+
+        with tracer.span("outer"):
+            with tracer.span("inner", size=3):
+                pass
+
+        inner, outer = exporter.spans
+        assert inner.parent_id == outer.span_id
+        assert inner.trace_id == outer.trace_id
+        assert inner.attributes == {"size": 3}
+
+    def test_error_is_recorded(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer([exporter])
+
+        with pytest.raises(ValueError), tracer.span("falla"):
+            raise ValueError("boom")
+
+        assert exporter.spans[0].status == "error"
+
+    def test_jsonl_exporter(self, tmp_path):
+        """Cada span se agrega como una línea JSON."""
+        path = tmp_path / "spans.jsonl"
+        tracer = Tracer([JsonlExporter(path)])
+        with tracer.span("a"), tracer.span("b"):
+            pass
+
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["name"] for line in lines] == ["b", "a"]
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        with tracer.span("a") as span:
+            span.set_attribute("ignored", True)
+        assert not tracer.enabled
+
+
+class TestGraphTracing:
+    """Tests para los spans emitidos por un turno del grafo."""
+
+    def test_turn_spans(self, exporter):
+        """Un turno genera spans de nodos, LLM y servicios con el thread_id."""
+        graph = create_dental_graph(InMemorySaver())
+        config = {"configurable": {"thread_id": "hilo-1"}}
+        state = {**get_initial_state("999888777"), **get_turn_input("Hola")}
+        graph.invoke(state, config)
+
+        spans = {span.name: span for span in exporter.spans}
+        classify_node = spans["node.classify_message"]
+        assert classify_node.attributes["classification"] == "general"
+        assert spans["llm.classify"].parent_id == classify_node.span_id
+        assert spans["llm.classify"].attributes["prompt_messages"] == 2
+
+        service = spans["service.PatientService.get_patient_by_phone"]
+        assert service.parent_id == spans["node.verify_patient"].span_id
+        assert "sql_statements" in service.attributes
+        assert {span.thread_id for span in exporter.spans} == {"hilo-1"}
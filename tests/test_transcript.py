@@ -0,0 +1,71 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.graph.state import evict_old_turns
+from src.graph.transcript import TranscriptSync
+
+
+def _turn(n: int, reply: str = "respuesta") -> list:
+    return [
+        HumanMessage(content=f"pregunta {n}", id=f"h{n}"),
+        AIMessage(content=reply, id=f"a{n}"),
+    ]
+
+
+class TestTranscriptSync:
+    """Tests para la sincronización incremental del chat."""
+
+    def test_only_new_assistant_messages_are_returned(self):
+        sync = TranscriptSync()
+        history = _turn(1)
+        assert sync.new_assistant_entries(history) == [
+            {"role": "assistant", "content": "respuesta"}
+        ]
+
+        history += _turn(2, "otra respuesta")
+        assert sync.new_assistant_entries(history) == [
+            {"role": "assistant", "content": "otra respuesta"}
+        ]
+        assert sync.new_assistant_entries(history) == []
+
+    def test_repeated_content_is_shown_again(self):
+        sync = TranscriptSync()
+        history = _turn(1)
+        sync.new_assistant_entries(history)
+
+        history += _turn(2)
+        assert len(sync.new_assistant_entries(history)) == 1
+
+    def test_stops_at_last_seen_message(self):
+        sync = TranscriptSync()
+        history = [m for n in range(50) for m in _turn(n)]
+        sync.new_messages(history)
+
+        class CountingList(list):
+            visited = 0
+
+            def __reversed__(self):
+                for item in super().__reversed__():
+                    CountingList.visited += 1
+                    yield item
+
+        history = CountingList(history + _turn(50))
+        assert len(sync.new_messages(history)) == 2
+        assert CountingList.visited == 3
+
+    def test_evicted_turns_do_not_resurface(self):
+        sync = TranscriptSync()
+        history = _turn(1) + _turn(2)
+        sync.new_assistant_entries(history)
+
+        history += _turn(3, "nueva")
+        removed = {m.id for m in evict_old_turns(history, max_turns=1)}
+        history = [m for m in history if m.id not in removed]
+
+        assert sync.new_assistant_entries(history) == [
+            {"role": "assistant", "content": "nueva"}
+        ]
+
+    def test_blank_replies_are_skipped(self):
+        sync = TranscriptSync()
+        assert sync.new_assistant_entries([AIMessage(content="  ", id="a1")]) == []
+        assert len(sync) == 1
@@ -0,0 +1,170 @@
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from src.agents.llm import set_llm_factory
+from src.database.connection import get_session
+from src.graph.graph import create_dental_graph
+from src.graph.waitlist import AvailabilityWaitlist, WaitlistResumer, get_waitlist
+from src.loadtest.stub_llm import stub_llm_factory
+from src.services.doctor_service import DoctorService
+from src.services.notifications import DoctorAvailable, get_event_bus
+
+
+@pytest.fixture
+def received():
+    events = []
+    get_event_bus().subscribe(DoctorAvailable, events.append)
+    yield events
+    get_event_bus().unsubscribe(DoctorAvailable, events.append)
+
+
+class TestAvailabilityEvents:
+    """Tests para la publicación de DoctorAvailable tras el commit."""
+
+    def test_published_after_commit(self, any_db, received):
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, True)
+            assert received == []
+        assert received == [DoctorAvailable(1)]
+
+    def test_discarded_on_rollback(self, any_db, received):
+        with pytest.raises(RuntimeError):
+            with get_session() as session:
+                DoctorService.release_doctor(session, 1)
+                raise RuntimeError("falla")
+        assert received == []
+
+    def test_not_published_when_marked_unavailable(self, any_db, received):
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, False)
+        assert received == []
+
+
+class TestAvailabilityWaitlist:
+    """Tests para el orden de atención de los hilos en espera."""
+
+    def test_orders_by_priority_then_wait_time(self):
+        waitlist = AvailabilityWaitlist()
+        waitlist.register("a", priority=1)
+        waitlist.register("b", priority=0)
+        waitlist.register("c", priority=1)
+
+        assert [e.thread_id for e in waitlist.ordered()] == ["b", "a", "c"]
+
+    def test_register_keeps_original_position(self):
+        waitlist = AvailabilityWaitlist()
+        waitlist.register("a")
+        waitlist.register("b")
+        waitlist.register("a")
+
+        assert [e.thread_id for e in waitlist.ordered()] == ["a", "b"]
+        waitlist.discard("a")
+        assert "a" not in waitlist and len(waitlist) == 1
+
+
+class TestWaitlistResumer:
+    """Tests para la reanudación automática de urgencias."""
+
+    @pytest.fixture
+    def resumer(self, memory_db):
+        set_llm_factory(stub_llm_factory())
+        get_waitlist().clear()
+        resumer = WaitlistResumer(create_dental_graph(InMemorySaver())).install()
+        yield resumer
+        resumer.uninstall()
+        get_waitlist().clear()
+        set_llm_factory(None)
+
+    def test_doctor_release_resumes_waiting_thread(
+        self, resumer, set_roster, start_urgency
+    ):
+        set_roster("closed")
+        config = start_urgency(resumer.graph)[0]
+        assert config["configurable"]["thread_id"] in get_waitlist()
+
+        with get_session() as session:
+            DoctorService.release_doctor(session, 1)
+        resumer.wait(timeout=10)
+
+        snapshot = resumer.graph.get_state(config)
+        assert snapshot.tasks[0].interrupts[0].value["type"] == "slot_selection"
+        assert len(get_waitlist()) == 0
+
+    def test_manual_retry_with_doctors_leaves_waitlist(
+        self, resumer, set_roster, start_urgency
+    ):
+        set_roster("closed")
+        config = start_urgency(resumer.graph)[0]
+        resumer.uninstall()
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, True)
+
+        resumer.graph.invoke(Command(resume={"retry": True}), config)
+
+        snapshot = resumer.graph.get_state(config)
+        assert snapshot.tasks[0].interrupts[0].value["type"] == "slot_selection"
+        assert len(get_waitlist()) == 0
+
+    def test_drain_discards_threads_no_longer_waiting(self, resumer, set_roster):
+        set_roster("closed")
+        get_waitlist().register("sin-checkpoint")
+
+        with get_session() as session:
+            DoctorService.release_doctor(session, 1)
+        resumer.wait(timeout=10)
+
+        assert "sin-checkpoint" not in get_waitlist()
+
+    def test_resumes_in_priority_order_up_to_capacity(
+        self, resumer, set_roster, start_urgency
+    ):
+        set_roster("closed")
+        first = start_urgency(resumer.graph)[0]
+        second = start_urgency(resumer.graph)[0]
+
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, True)
+        resumer.wait(timeout=10)
+
+        waiting = [e.thread_id for e in get_waitlist().ordered()]
+        assert waiting == [second["configurable"]["thread_id"]]
+        assert first["configurable"]["thread_id"] not in get_waitlist()
+
+    def test_red_flags_jump_the_waitlist(self, resumer, set_roster, start_urgency):
+        set_roster("closed")
+        mild = start_urgency(resumer.graph)[0]
+        severe = start_urgency(
+            resumer.graph, message="Tengo la cara hinchada y me duele mucho"
+        )[0]
+        priorities = {e.thread_id: e.priority for e in get_waitlist().ordered()}
+        assert priorities[severe["configurable"]["thread_id"]] < priorities[
+            mild["configurable"]["thread_id"]
+        ]
+
+        with get_session() as session:
+            DoctorService.set_doctor_availability(session, 1, True)
+        resumer.wait(timeout=10)
+
+        waiting = [e.thread_id for e in get_waitlist().ordered()]
+        assert waiting == [mild["configurable"]["thread_id"]]
+
+    def test_bulk_opening_resumes_in_one_batched_drain(
+        self, resumer, set_roster, start_urgency, monkeypatch
+    ):
+        set_roster("closed")
+        configs = [start_urgency(resumer.graph)[0] for _ in range(3)]
+        drains = []
+        drain = resumer.drain
+        monkeypatch.setattr(resumer, "drain", lambda: drains.append(1) or drain())
+        resumer._max_concurrency = 2
+
+        with get_session() as session:
+            DoctorService.set_clinic_availability(session, True)
+        resumer.wait(timeout=10)
+
+        assert len(drains) <= 2
+        assert len(get_waitlist()) == 0
+        for config in configs:
+            snapshot = resumer.graph.get_state(config)
+            assert snapshot.tasks[0].interrupts[0].value["type"] == "slot_selection"